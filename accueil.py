@@ -10,7 +10,6 @@ from PIL import Image, ImageFile
 import numpy as np
 import pandas as pd
 import json
-import ast
 try:
     from transformers import CLIPModel, CLIPTokenizer, CLIPProcessor
 except ImportError as e:
@@ -19,15 +18,18 @@ except ImportError as e:
     raise
 from sklearn.preprocessing import LabelEncoder
 import random
+import sys
 import torch.nn as nn
 
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), 'azure_ml_api'))
+from model_weights import find_checkpoint, load_weights_into, skip_weight_init
+from product_data import get_products
+
 # Configuration
 SEED = 42
 device = torch.device('cuda' if torch.cuda.is_available() else 'cpu')
 MODEL_NAME = 'openai/clip-vit-base-patch32'
 CHECKPOINT_PATH = 'clip_product_classifier.pth'
-CSV_PATH = 'produits_original.csv'
-IMAGE_FOLDER = 'images_original'
 
 ImageFile.LOAD_TRUNCATED_IMAGES = True
 Image.MAX_IMAGE_PIXELS = None
@@ -55,7 +57,7 @@ class CLIPClassifier:
 def load_clip_classifier():
     """Charge le classificateur CLIP fine-tuné"""
     try:
-        from transformers import CLIPModel, CLIPProcessor, CLIPTokenizer
+        from transformers import CLIPConfig, CLIPModel, CLIPProcessor, CLIPTokenizer
         from sklearn.preprocessing import LabelEncoder
         
         # Définir les catégories (basées sur les données)
@@ -73,11 +75,19 @@ def load_clip_classifier():
         label_encoder = LabelEncoder()
         label_encoder.fit(categories)
         
+        # Checkpoint fine-tuné (le .safetensors voisin est prioritaire sur le .pth)
+        checkpoint_path = find_checkpoint(CHECKPOINT_PATH)
+        
         # Créer le modèle CLIP pour classification
         class CLIPForClassification(torch.nn.Module):
-            def __init__(self, num_labels):
+            def __init__(self, num_labels, pretrained=True):
                 super().__init__()
-                self.clip = CLIPModel.from_pretrained(MODEL_NAME)
+                if pretrained:
+                    self.clip = CLIPModel.from_pretrained(MODEL_NAME)
+                else:
+                    # Squelette seul, sans initialisation : les poids viennent du checkpoint
+                    with skip_weight_init():
+                        self.clip = CLIPModel(CLIPConfig.from_pretrained(MODEL_NAME))
                 self.classifier = torch.nn.Linear(self.clip.config.projection_dim * 2, num_labels)
                 
             def forward(self, pixel_values, input_ids, attention_mask, labels=None):
@@ -86,17 +96,24 @@ def load_clip_classifier():
                 logits = self.classifier(pooled_output)
                 return logits
         
-        # Charger le modèle
-        model = CLIPForClassification(num_labels=len(categories)).to(device)
-        
-        # Charger les poids fine-tunés si disponibles
-        if os.path.exists(CHECKPOINT_PATH):
-            state_dict = torch.load(CHECKPOINT_PATH, map_location=device)
-            model.load_state_dict(state_dict, strict=False)
-            st.success(f"✅ Modèle fine-tuné chargé depuis {CHECKPOINT_PATH}")
+        # Charger les poids fine-tunés si disponibles (checkpoint complet exigé)
+        model = None
+        if checkpoint_path:
+            try:
+                model = CLIPForClassification(num_labels=len(categories), pretrained=False)
+                load_weights_into(model, checkpoint_path, device=device)
+                st.success(f"✅ Modèle fine-tuné chargé depuis {checkpoint_path}")
+            except Exception as e:
+                st.warning(f"⚠️ Checkpoint inutilisable ({str(e)}). Utilisation du modèle pré-entraîné.")
+                model = None
         else:
             st.warning(f"⚠️ Fichier de modèle non trouvé: {CHECKPOINT_PATH}. Utilisation du modèle pré-entraîné.")
         
+        if model is None:
+            model = CLIPForClassification(num_labels=len(categories), pretrained=True)
+        model = model.to(device)
+        model.eval()
+        
         # Charger le processeur et tokenizer
         processor = CLIPProcessor.from_pretrained(MODEL_NAME)
         tokenizer = CLIPTokenizer.from_pretrained(MODEL_NAME)
@@ -110,62 +127,10 @@ def load_clip_classifier():
         st.error(f"❌ Erreur lors du chargement du classificateur: {str(e)}")
         return None
 
-@st.cache_data
 def load_and_process_data():
-    """Charge et traite les données pour l'EDA"""
+    """Charge les données pour l'EDA depuis le jeu de données précalculé"""
     try:
-        # Charger le CSV original
-        df = pd.read_csv(CSV_PATH)
-        
-        # Traiter la colonne product_category_tree pour extraire main_category et sub_categories
-        def extract_categories(category_tree):
-            if pd.isna(category_tree):
-                return None, None
-            try:
-                # Parser la chaîne JSON
-                categories = ast.literal_eval(category_tree)
-                if isinstance(categories, list) and len(categories) > 0:
-                    full_path = categories[0]
-                    parts = full_path.split(' >> ')
-                    main_category = parts[0] if len(parts) > 0 else None
-                    sub_categories = ' >> '.join(parts[1:]) if len(parts) > 1 else None
-                    return main_category, sub_categories
-            except:
-                pass
-            return None, None
-        
-        # Appliquer l'extraction des catégories
-        category_data = df['product_category_tree'].apply(extract_categories)
-        df['main_category'] = [x[0] for x in category_data]
-        df['sub_categories'] = [x[1] for x in category_data]
-        
-        # Créer le chemin des images
-        df['image_path'] = df['image'].apply(lambda x: os.path.join(IMAGE_FOLDER, x) if pd.notna(x) else None)
-        
-        # Vérifier l'existence des images et calculer leurs propriétés
-        def check_image_properties(image_path):
-            if pd.isna(image_path) or not os.path.exists(image_path):
-                return False, 0, 0.0
-            try:
-                with Image.open(image_path) as img:
-                    width, height = img.size
-                    num_pixels = width * height
-                    aspect_ratio = height / width if width > 0 else 0.0
-                    return True, num_pixels, aspect_ratio
-            except:
-                return False, 0, 0.0
-        
-        # Appliquer la vérification des images
-        image_data = df['image_path'].apply(check_image_properties)
-        df['image_exists'] = [x[0] for x in image_data]
-        df['num_pixels'] = [x[1] for x in image_data]
-        df['aspect_ratio'] = [x[2] for x in image_data]
-        
-        # Filtrer les lignes avec des catégories principales valides
-        df = df[df['main_category'].notna()]
-        
-        return df
-        
+        return get_products()
     except Exception as e:
         st.error(f"❌ Erreur lors du chargement des données: {str(e)}")
         return pd.DataFrame()
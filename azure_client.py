@@ -3,13 +3,73 @@ Client Azure ML pour l'inférence du modèle CLIP
 """
 
 import os
+import sys
 import json
+import math
+import time
 import base64
+import threading
 import requests
 import streamlit as st
 from PIL import Image
 import io
+from urllib.parse import urlparse
 from typing import Dict, Any, Optional
+from collections import Counter, deque
+
+# Hôtes considérés comme le serveur de scoring local (azure_ml_api/local_server.py)
+LOCAL_HOSTS = {'localhost', '127.0.0.1', '0.0.0.0', '::1'}
+
+# Réponses HTTP pour lesquelles un nouvel essai a un sens (surcharge, redémarrage)
+RETRY_STATUSES = {429, 502, 503, 504}
+
+
+def percentile(values, q):
+    """Percentile par rang le plus proche (None si aucune valeur)"""
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, max(0, math.ceil(q * len(ordered)) - 1))]
+
+
+class ClientTelemetry:
+    """Mesures des derniers appels de prédiction (fenêtre glissante, partagée entre les sessions)"""
+    
+    def __init__(self, window=100):
+        self.calls = deque(maxlen=window)
+        self.total_calls = 0
+        self.total_errors = 0
+        self._lock = threading.Lock()
+    
+    def record(self, call):
+        """Enregistrer un appel : durée, tailles, statut HTTP, nouveaux essais, erreur"""
+        with self._lock:
+            self.calls.append(call)
+            self.total_calls += 1
+            self.total_errors += not call['success']
+    
+    def stats(self):
+        """Résumé : totaux, taux d'erreur et percentiles de latence sur la fenêtre"""
+        with self._lock:
+            calls = list(self.calls)
+            total_calls, total_errors = self.total_calls, self.total_errors
+        wall_times = [call['wall_ms'] for call in calls]
+        payloads = [call['payload_bytes'] for call in calls if call['payload_bytes'] is not None]
+        errors = [call for call in calls if not call['success']]
+        return {
+            'total_calls': total_calls,
+            'total_errors': total_errors,
+            'window': len(calls),
+            'error_rate': len(errors) / len(calls) if calls else 0.0,
+            'p50_ms': percentile(wall_times, 0.50),
+            'p95_ms': percentile(wall_times, 0.95),
+            'max_ms': max(wall_times) if wall_times else None,
+            'mean_payload_bytes': sum(payloads) / len(payloads) if payloads else None,
+            'retries': sum(call['retries'] for call in calls),
+            'http_statuses': dict(Counter(call['status'] for call in calls if call['status'] is not None)),
+            'error_types': dict(Counter(call['error_type'] for call in errors)),
+            'last_call': calls[-1] if calls else None
+        }
 
 class AzureMLClient:
     """Client pour interagir avec l'API Azure ML"""
@@ -17,11 +77,26 @@ class AzureMLClient:
     def __init__(self):
         self.endpoint_url = os.getenv('AZURE_ML_ENDPOINT_URL')
         self.api_key = os.getenv('AZURE_ML_API_KEY')
-        self.use_local = os.getenv('USE_LOCAL_MODEL', 'false').lower() == 'true'
+        # USE_LOCAL_MODEL : 'true' (démonstration), 'inprocess' (modèle dans le processus) ou 'false'
+        local_mode = os.getenv('USE_LOCAL_MODEL', 'false').lower()
+        self.use_local = local_mode == 'true'
+        self.use_inprocess = local_mode == 'inprocess'
         
-        if not self.use_local and not self.endpoint_url:
+        if not self.use_local and not self.use_inprocess and not self.endpoint_url:
             st.warning("⚠️ AZURE_ML_ENDPOINT_URL non configuré. Utilisation du mode démonstration.")
             self.use_local = True
+        
+        # Source des prédictions : endpoint Azure ML ou serveur de scoring local
+        self.source = 'azure_ml'
+        if self.endpoint_url and urlparse(self.endpoint_url).hostname in LOCAL_HOSTS:
+            self.source = 'local_server'
+        
+        # Nouveaux essais sur timeout, erreur de connexion ou 429/5xx (aucun par défaut)
+        self.max_retries = int(os.getenv('AZURE_ML_MAX_RETRIES', '0'))
+        self.retry_backoff = float(os.getenv('AZURE_ML_RETRY_BACKOFF', '0.5'))
+        
+        # Latences et erreurs des derniers appels (voir stats())
+        self.telemetry = ClientTelemetry(window=int(os.getenv('AZURE_ML_STATS_WINDOW', '100')))
     
     def encode_image_to_base64(self, image: Image.Image) -> str:
         """Convertir une image PIL en base64"""
@@ -41,13 +116,84 @@ class AzureMLClient:
         Returns:
             Dict contenant les résultats de prédiction
         """
-        if self.use_local:
-            return self._predict_local(image, text_description)
+        # Mesures de l'appel, complétées par _predict_azure (taille, statut HTTP, essais)
+        call = {'payload_bytes': None, 'response_bytes': None, 'status': None, 'retries': 0, 'error_type': None}
+        start = time.perf_counter()
+        if self.use_inprocess:
+            result = self._predict_inprocess(image, text_description)
+        elif self.use_local:
+            result = self._predict_local(image, text_description)
         else:
-            return self._predict_azure(image, text_description)
+            result = self._predict_azure(image, text_description, call)
+        call.update({
+            'timestamp': time.time(),
+            'source': result.get('source'),
+            'wall_ms': (time.perf_counter() - start) * 1000,
+            'success': result['success']
+        })
+        if not result['success'] and call['error_type'] is None:
+            call['error_type'] = 'exception'
+        self.telemetry.record(call)
+        return result
     
-    def _predict_azure(self, image: Image.Image, text_description: str) -> Dict[str, Any]:
-        """Prédiction via l'API Azure ML"""
+    def stats(self) -> Dict[str, Any]:
+        """Télémétrie des derniers appels de prédiction (latences p50/p95, erreurs, tailles)"""
+        return self.telemetry.stats()
+    
+    def _predict_inprocess(self, image: Image.Image, text_description: str) -> Dict[str, Any]:
+        """Prédiction directe avec le modèle chargé dans le processus (sans HTTP ni base64)"""
+        try:
+            classifier = get_inprocess_classifier()
+            result = classifier.predict_category(image, text_description)
+            return {
+                'success': True,
+                'predicted_category': result['predicted_category'],
+                'confidence': result['confidence'],
+                'category_scores': result['category_scores'],
+                'keywords': result['keywords'],
+                'method': result.get('method', 'head'),
+                'source': 'inprocess'
+            }
+        except Exception as e:
+            return {
+                'success': False,
+                'error': f'Erreur du modèle local: {str(e)}',
+                'source': 'inprocess'
+            }
+    
+    def find_similar(self, image: Image.Image, text_description: str, k: int = 5) -> Dict[str, Any]:
+        """
+        Produits du catalogue les plus proches (index d'embeddings, mode 'inprocess' uniquement)
+        
+        Returns:
+            Dict avec 'success' et la liste 'similar' de {'uniq_id', 'score'}
+        """
+        if not self.use_inprocess:
+            return {
+                'success': False,
+                'error': 'Recherche de produits similaires disponible en mode inprocess uniquement'
+            }
+        try:
+            classifier = get_inprocess_classifier()
+            return {
+                'success': True,
+                'similar': classifier.find_similar(image=image, text=text_description, k=k)
+            }
+        except FileNotFoundError:
+            return {
+                'success': False,
+                'error': "Index d'embeddings absent (python azure_ml_api/embedding_index.py)"
+            }
+        except Exception as e:
+            return {
+                'success': False,
+                'error': f'Erreur de la recherche de produits similaires: {str(e)}'
+            }
+    
+    def _predict_azure(self, image: Image.Image, text_description: str,
+                       call: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        """Prédiction via l'API Azure ML (call reçoit les mesures de l'appel)"""
+        call = call if call is not None else {}
         try:
             # Encoder l'image
             image_base64 = self.encode_image_to_base64(image)
@@ -66,13 +212,28 @@ class AzureMLClient:
             if self.api_key:
                 headers['Authorization'] = f'Bearer {self.api_key}'
             
-            # Appel à l'API
-            response = requests.post(
-                self.endpoint_url,
-                data=json.dumps(data),
-                headers=headers,
-                timeout=30
-            )
+            # Appel à l'API (avec nouveaux essais si AZURE_ML_MAX_RETRIES > 0)
+            payload = json.dumps(data)
+            call['payload_bytes'] = len(payload)
+            for attempt in range(self.max_retries + 1):
+                if attempt:
+                    time.sleep(self.retry_backoff * 2 ** (attempt - 1))
+                    call['retries'] = attempt
+                try:
+                    response = requests.post(
+                        self.endpoint_url,
+                        data=payload,
+                        headers=headers,
+                        timeout=30
+                    )
+                except (requests.exceptions.Timeout, requests.exceptions.ConnectionError):
+                    if attempt < self.max_retries:
+                        continue
+                    raise
+                if response.status_code not in RETRY_STATUSES or attempt == self.max_retries:
+                    break
+            call['status'] = response.status_code
+            call['response_bytes'] = len(response.content)
             
             if response.status_code == 200:
                 result = response.json()
@@ -82,38 +243,43 @@ class AzureMLClient:
                         'predicted_category': result['predicted_category'],
                         'confidence': result['confidence'],
                         'category_scores': result['category_scores'],
-                        'source': 'azure_ml'
+                        'method': result.get('method', 'head'),
+                        'source': self.source
                     }
                 else:
+                    call['error_type'] = 'api'
                     return {
                         'success': False,
                         'error': result.get('error', 'Erreur inconnue de l\'API'),
-                        'source': 'azure_ml'
+                        'source': self.source
                     }
             else:
+                call['error_type'] = 'http'
                 return {
                     'success': False,
                     'error': f'Erreur HTTP {response.status_code}: {response.text}',
-                    'source': 'azure_ml'
+                    'source': self.source
                 }
                 
         except requests.exceptions.Timeout:
+            call['error_type'] = 'timeout'
             return {
                 'success': False,
                 'error': 'Timeout lors de l\'appel à l\'API Azure ML',
-                'source': 'azure_ml'
+                'source': self.source
             }
         except requests.exceptions.RequestException as e:
+            call['error_type'] = 'connection'
             return {
                 'success': False,
                 'error': f'Erreur de connexion: {str(e)}',
-                'source': 'azure_ml'
+                'source': self.source
             }
         except Exception as e:
             return {
                 'success': False,
                 'error': f'Erreur inattendue: {str(e)}',
-                'source': 'azure_ml'
+                'source': self.source
             }
     
     def _predict_local(self, image: Image.Image, text_description: str) -> Dict[str, Any]:
@@ -186,6 +352,12 @@ class AzureMLClient:
     
     def get_service_status(self) -> Dict[str, Any]:
         """Vérifier le statut du service Azure ML"""
+        if self.use_inprocess:
+            return {
+                'status': 'local',
+                'message': 'Modèle CLIP fine-tuné chargé dans le processus'
+            }
+        
         if self.use_local:
             return {
                 'status': 'local',
@@ -198,9 +370,10 @@ class AzureMLClient:
                 self.endpoint_url.replace('/score', '/health'),
                 timeout=5
             )
+            service_name = 'Serveur de scoring local' if self.source == 'local_server' else 'Service Azure ML'
             return {
                 'status': 'healthy' if response.status_code == 200 else 'unhealthy',
-                'message': f'Service Azure ML - Status: {response.status_code}'
+                'message': f'{service_name} - Status: {response.status_code}'
             }
         except Exception as e:
             return {
@@ -208,6 +381,14 @@ class AzureMLClient:
                 'message': f'Impossible de contacter le service: {str(e)}'
             }
 
+# Classificateur partagé par toutes les sessions en mode 'inprocess'
+@st.cache_resource
+def get_inprocess_classifier():
+    """Charger une seule fois le classificateur CLIP fine-tuné dans le processus"""
+    sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), 'azure_ml_api'))
+    from score_finetuned import CLIPClassifierFinetuned
+    return CLIPClassifierFinetuned()
+
 # Instance globale du client
 @st.cache_resource
 def get_azure_client():
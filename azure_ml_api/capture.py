@@ -0,0 +1,120 @@
+#!/usr/bin/env python3
+"""
+Capture d'un échantillon des requêtes de scoring pour le rejeu
+
+Désactivée par défaut. Avec SCORING_CAPTURE_RATE=0.05, 5 % des requêtes sont
+ajoutées à un fichier JSONL au format de requests.jsonl, directement
+rejouable par load_test.py :
+
+    {"request_id": ..., "title": ..., "body": ..., "meta": {...}}
+
+- mode 'full' (défaut) : body = corps JSON reçu (image base64 et texte) ;
+- mode 'hash' : body = empreintes SHA-256 et tailles de l'image et du texte,
+  sans contenu (pour les environnements où les données ne peuvent pas sortir).
+
+`request_id` est celui de la requête (en-tête x-ms-request-id, sinon généré),
+repris à la fin du nom du profil si la requête est aussi profilée
+(profiling.py). `meta` contient l'horodatage, le statut, la taille du corps en
+octets, la durée totale et les durées par étape (timing.py). Chaque processus
+écrit son propre fichier capture-<pid>.jsonl dans SCORING_CAPTURE_DIR ; au-delà
+de SCORING_CAPTURE_MAX_MB il est renommé avec un horodatage et seuls les
+SCORING_CAPTURE_MAX_FILES fichiers les plus récents sont conservés.
+"""
+
+import os
+import glob
+import json
+import time
+import random
+import hashlib
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+_lock = threading.Lock()
+
+
+def settings():
+    """Configuration lue dans l'environnement"""
+    return {
+        'rate': float(os.getenv('SCORING_CAPTURE_RATE', '0')),
+        'mode': os.getenv('SCORING_CAPTURE_MODE', 'full').lower(),
+        'directory': os.getenv('SCORING_CAPTURE_DIR', 'captures'),
+        'max_bytes': int(float(os.getenv('SCORING_CAPTURE_MAX_MB', '50')) * 1024 * 1024),
+        'max_files': int(os.getenv('SCORING_CAPTURE_MAX_FILES', '10')),
+    }
+
+
+def fingerprint(value):
+    """Empreinte et taille d'une valeur texte (sans son contenu)"""
+    value = value if isinstance(value, str) else json.dumps(value)
+    encoded = value.encode('utf-8')
+    return {'sha256': hashlib.sha256(encoded).hexdigest(), 'bytes': len(encoded)}
+
+
+def capture_body(raw_data, mode):
+    """Corps enregistré : requête complète ou empreintes"""
+    try:
+        data = json.loads(raw_data)
+    except ValueError:
+        data = raw_data
+    if mode != 'hash':
+        return data
+    if not isinstance(data, dict):
+        return {'raw': fingerprint(raw_data)}
+    return {name: fingerprint(value) for name, value in data.items()}
+
+
+def capture_path(directory):
+    return os.path.join(directory, f"capture-{os.getpid()}.jsonl")
+
+
+def rotate(path, directory, max_bytes, max_files):
+    """Renommer le fichier courant s'il dépasse la taille maximale, supprimer les plus anciens"""
+    try:
+        if os.path.getsize(path) < max_bytes:
+            return
+    except OSError:
+        return
+    root, extension = os.path.splitext(path)
+    os.replace(path, f"{root}-{time.strftime('%Y%m%d-%H%M%S')}-{time.time_ns() % 1_000_000_000:09d}{extension}")
+    rotated = sorted(glob.glob(os.path.join(directory, 'capture-*-*.jsonl')), key=os.path.getmtime)
+    for old_path in rotated[:max(0, len(rotated) - max_files)]:
+        try:
+            os.remove(old_path)
+        except OSError:
+            pass
+
+
+def maybe_capture(raw_data, status, timings, request_id=None, config=None):
+    """Enregistrer la requête si elle est échantillonnée (appelé après la réponse)"""
+    config = config or settings()
+    if config['rate'] <= 0 or random.random() >= config['rate']:
+        return False
+    try:
+        timings_ms = timings.as_ms()
+        record = {
+            'request_id': request_id,
+            'title': f"Requête de scoring ({status}, {timings_ms['total']:.0f} ms)",
+            'body': capture_body(raw_data, config['mode']),
+            'meta': {
+                'captured_at': time.time(),
+                'mode': config['mode'],
+                'status': status,
+                'request_bytes': len(raw_data.encode('utf-8') if isinstance(raw_data, str) else raw_data),
+                'timings_ms': timings_ms
+            }
+        }
+        line = json.dumps(record, ensure_ascii=False) + '\n'
+        path = capture_path(config['directory'])
+        with _lock:
+            os.makedirs(config['directory'], exist_ok=True)
+            with open(path, 'a', encoding='utf-8') as f:
+                f.write(line)
+            rotate(path, config['directory'], config['max_bytes'], config['max_files'])
+        return True
+    except Exception as e:
+        # La capture ne doit jamais faire échouer une requête
+        logger.warning(f"⚠️ Capture de la requête impossible: {str(e)}")
+        return False
@@ -0,0 +1,74 @@
+#!/usr/bin/env python3
+"""
+Parsing de product_category_tree, partagé par l'application et l'API
+
+Une valeur est une liste Python sérialisée dont le premier élément est le
+chemin de catégories : '["Watches >> Wrist Watches >> ..."]'. Le parsing se
+fait sur la colonne entière (opérations .str de pandas) : le jeu de données
+produits, l'index d'embeddings et les scripts d'évaluation utilisent tous ce
+module, les étiquettes restent donc identiques partout.
+"""
+
+import pandas as pd
+
+# Premier élément de la liste product_category_tree, entre guillemets doubles ou simples
+CATEGORY_TREE_PATTERN = r"""^\s*\[\s*(?:"((?:[^"\\]|\\.)*)"|'((?:[^'\\]|\\.)*)')"""
+LEVEL_SEPARATOR = ' >> '
+
+
+def parse_category_tree_column(category_trees):
+    """Extraire tous les niveaux de product_category_tree en une passe vectorisée
+
+    Renvoie un DataFrame (même index) avec main_category, sub_categories
+    (deuxième niveau, 'Unknown' s'il est absent) et category_level_1..N, en
+    colonnes catégorielles. Les valeurs illisibles donnent NaN partout.
+    """
+    # Les valeurs non textuelles (NaN) donnent NaN avec les opérations .str
+    category_trees = pd.Series(category_trees, dtype='object')
+
+    # Cas courant '["A >> B >> ..."]' sans échappement : le chemin est entre les deux premiers guillemets
+    simple = category_trees.str.startswith('["', na=False) & ~category_trees.str.contains('\\', regex=False, na=False)
+    paths = category_trees.where(simple).str.split('"', n=2).str[1]
+
+    # Autres formes (guillemets simples, échappements) : extraction par regex sur ces lignes seulement
+    others = ~simple & category_trees.notna()
+    if others.any():
+        extracted = category_trees[others].str.extract(CATEGORY_TREE_PATTERN)
+        paths[others] = extracted[0].fillna(extracted[1]).str.replace(r'\\(.)', r'\1', regex=True)
+
+    # Chemin vide '[""]' : pas de catégorie
+    paths = paths.mask(paths == '')
+    levels = paths.str.split(LEVEL_SEPARATOR, expand=True, regex=False)
+    if levels.shape[1] == 0:
+        levels = pd.DataFrame({0: pd.Series(None, index=paths.index, dtype='object')})
+
+    main_category = levels[0].mask(levels[0] == '')
+    if levels.shape[1] > 1:
+        sub_categories = levels[1].fillna('Unknown')
+    else:
+        sub_categories = pd.Series('Unknown', index=levels.index, dtype='object')
+    columns = {
+        'main_category': main_category,
+        'sub_categories': sub_categories.where(main_category.notna()),
+    }
+    for level in levels.columns:
+        columns[f'category_level_{level + 1}'] = levels[level]
+
+    return pd.DataFrame({name: to_categorical(values) for name, values in columns.items()},
+                        index=category_trees.index)
+
+
+def to_categorical(values):
+    """Colonne catégorielle (catégories triées) construite directement depuis pd.factorize
+
+    Équivalent à astype('category'), sans les vérifications de type de
+    pd.Categorical, coûteuses sur de petites colonnes.
+    """
+    codes, categories = pd.factorize(values, sort=True)
+    return pd.Categorical.from_codes(codes, categories)
+
+
+def main_categories(category_trees):
+    """Catégorie principale de chaque valeur (Series object, None si illisible)"""
+    main_category = parse_category_tree_column(category_trees)['main_category'].astype('object')
+    return main_category.where(main_category.notna(), None)
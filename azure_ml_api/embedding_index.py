@@ -0,0 +1,335 @@
+#!/usr/bin/env python3
+"""
+Index des embeddings CLIP du catalogue et recherche des plus proches voisins
+
+Un job encode chaque produit (image + mots-clés de la description) avec le
+backbone CLIP du modèle fine-tuné. Les embeddings image et texte, normalisés,
+sont écrits dans deux matrices float16 memory-mappées (N×D) avec un index JSON
+des uniq_id. La recherche se fait par produit scalaire (similarité cosinus) en
+force brute, par blocs, ou via un index faiss IVF/HNSW s'il est installé.
+
+Usage :
+    python azure_ml_api/embedding_index.py --csv produits_original.csv --images Images
+"""
+
+import os
+import sys
+import json
+import time
+import logging
+import argparse
+from contextlib import contextmanager
+import numpy as np
+
+try:
+    import fcntl
+except ImportError:
+    # Windows : pas de verrou entre processus (un seul processus doit ajouter des produits)
+    fcntl = None
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_INDEX_PATH = os.getenv('EMBEDDING_INDEX_PATH', 'embeddings/catalogue')
+# Type d'index : flat (force brute numpy), ivf ou hnsw (faiss, optionnel)
+DEFAULT_INDEX_TYPE = os.getenv('EMBEDDING_INDEX_TYPE', 'flat')
+MODALITIES = ('image', 'text')
+SEARCH_BLOCK_SIZE = 8192
+BUILD_BATCH_SIZE = 32
+
+
+def index_files(index_path):
+    """Fichiers de l'index : matrices image/texte (.f16), métadonnées (.json) et verrou d'écriture"""
+    return {
+        'image': index_path + '.image.f16',
+        'text': index_path + '.text.f16',
+        'meta': index_path + '.json',
+        'lock': index_path + '.lock'
+    }
+
+
+def top_k(scores, k):
+    """Indices des k meilleurs scores, triés par score décroissant"""
+    k = min(k, len(scores))
+    if k <= 0:
+        return np.array([], dtype=np.int64)
+    candidates = np.argpartition(-scores, k - 1)[:k]
+    return candidates[np.argsort(-scores[candidates])]
+
+
+def vote(neighbours, weighting='weighted'):
+    """Vote des voisins [(label, similarité)] : {label: part des voix}
+
+    'majority' : une voix par voisin ; 'weighted' : voix pondérée par la
+    similarité (les similarités négatives ne votent pas).
+    """
+    votes = {}
+    for label, score in neighbours:
+        weight = 1.0 if weighting == 'majority' else max(float(score), 0.0)
+        votes[label] = votes.get(label, 0.0) + weight
+    total = sum(votes.values())
+    if total <= 0:
+        # Aucun voisin utile : répartition uniforme
+        return {label: 1.0 / len(votes) for label in votes} if votes else {}
+    return {label: weight / total for label, weight in votes.items()}
+
+
+class EmbeddingIndex:
+    """Embeddings du catalogue memory-mappés avec recherche des plus proches voisins"""
+
+    def __init__(self, index_path=DEFAULT_INDEX_PATH, index_type=DEFAULT_INDEX_TYPE):
+        files = index_files(index_path)
+        with open(files['meta'], encoding='utf-8') as f:
+            self.meta = json.load(f)
+        self.files = files
+        self.ids = self.meta['ids']
+        self.dim = self.meta['dim']
+        # Catégorie de chaque produit (None : non étiqueté, ignoré par le vote kNN)
+        self.labels = self.meta.get('labels') or [None] * len(self.ids)
+        self._open_matrices()
+        self.index_type = index_type
+        self.ann = {}
+        if index_type != 'flat':
+            self._build_ann(index_type)
+
+    def __len__(self):
+        return len(self.ids)
+
+    def _open_matrices(self):
+        """(Re)projeter les matrices en mémoire"""
+        shape = (len(self.ids), self.dim)
+        self.matrices = {
+            modality: np.memmap(self.files[modality], dtype=np.float16, mode='r', shape=shape)
+            for modality in MODALITIES
+        }
+
+    @property
+    def categories(self):
+        """Catégories présentes parmi les produits étiquetés"""
+        return sorted({label for label in self.labels if label is not None})
+
+    def set_labels(self, labels_by_id):
+        """Remplacer les étiquettes (produits absents du dict : non étiquetés)"""
+        self.labels = [labels_by_id.get(item_id) for item_id in self.ids]
+
+    @contextmanager
+    def _write_lock(self):
+        """Verrou exclusif entre processus (workers du serveur prefork) pour modifier l'index"""
+        with open(self.files['lock'], 'a') as lock_file:
+            if fcntl is not None:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def add_items(self, ids, image_embeds, text_embeds, labels):
+        """Ajouter des produits étiquetés à la fin de l'index (fichiers mis à jour sur disque)"""
+        image_embeds = np.asarray(image_embeds, dtype=np.float16).reshape(-1, self.dim)
+        text_embeds = np.asarray(text_embeds, dtype=np.float16).reshape(-1, self.dim)
+        with self._write_lock():
+            # Relire les métadonnées : d'autres processus ont pu ajouter des produits
+            with open(self.files['meta'], encoding='utf-8') as f:
+                meta = json.load(f)
+            disk_ids = meta['ids']
+            disk_labels = meta.get('labels') or [None] * len(disk_ids)
+            row_bytes = self.dim * np.dtype(np.float16).itemsize
+            for modality, rows in (('image', image_embeds), ('text', text_embeds)):
+                with open(self.files[modality], 'r+b') as f:
+                    # Lignes d'un ajout interrompu (absentes des métadonnées) écrasées
+                    f.truncate(len(disk_ids) * row_bytes)
+                    f.seek(0, os.SEEK_END)
+                    f.write(rows.tobytes())
+            meta.update({'ids': disk_ids + list(ids), 'labels': disk_labels + list(labels)})
+            tmp_meta = f"{self.files['meta']}.{os.getpid()}.tmp"
+            with open(tmp_meta, 'w', encoding='utf-8') as f:
+                json.dump(meta, f)
+            os.replace(tmp_meta, self.files['meta'])
+
+        # Étiquettes en mémoire conservées (set_labels) pour les produits déjà connus
+        known = len(self.ids)
+        self.labels = self.labels + disk_labels[known:] + list(labels)
+        self.ids = meta['ids']
+        self.meta = meta
+        self._open_matrices()
+        # Les index faiss sont reconstruits avec les nouvelles lignes
+        if self.ann:
+            self.ann = {}
+            self._build_ann(self.index_type)
+
+    def _build_ann(self, index_type):
+        """Construire les index faiss (optionnels), force brute sinon"""
+        try:
+            import faiss
+        except ImportError:
+            logger.warning(f"⚠️ faiss non installé, index '{index_type}' remplacé par la force brute")
+            self.index_type = 'flat'
+            return
+
+        for modality, matrix in self.matrices.items():
+            vectors = np.ascontiguousarray(matrix, dtype=np.float32)
+            if index_type == 'hnsw':
+                index = faiss.IndexHNSWFlat(self.dim, 32, faiss.METRIC_INNER_PRODUCT)
+            elif index_type == 'ivf':
+                nlist = max(1, int(np.sqrt(len(vectors))))
+                quantizer = faiss.IndexFlatIP(self.dim)
+                index = faiss.IndexIVFFlat(quantizer, self.dim, nlist, faiss.METRIC_INNER_PRODUCT)
+                index.train(vectors)
+                index.nprobe = max(1, nlist // 8)
+            else:
+                raise ValueError(f"Type d'index inconnu: {index_type}")
+            index.add(vectors)
+            self.ann[modality] = index
+        logger.info(f"✅ Index {index_type} construit pour {len(self.ids)} produits")
+
+    def scores(self, query, modality):
+        """Similarités (produit scalaire) d'un vecteur requête normalisé avec tout le catalogue"""
+        query = np.asarray(query, dtype=np.float32).reshape(-1)
+        matrix = self.matrices[modality]
+        scores = np.empty(len(self.ids), dtype=np.float32)
+        # Conversion float16 -> float32 par blocs : mémoire constante, BLAS pour le produit
+        for start in range(0, len(self.ids), SEARCH_BLOCK_SIZE):
+            block = np.asarray(matrix[start:start + SEARCH_BLOCK_SIZE], dtype=np.float32)
+            scores[start:start + len(block)] = block @ query
+        return scores
+
+    def search(self, query, k=5, modality='image'):
+        """Les k produits les plus proches d'un vecteur requête : [(uniq_id, score)]"""
+        if modality in self.ann:
+            query = np.asarray(query, dtype=np.float32).reshape(1, -1)
+            distances, positions = self.ann[modality].search(query, k)
+            return [(self.ids[p], float(d)) for p, d in zip(positions[0], distances[0]) if p >= 0]
+        scores = self.scores(query, modality)
+        return [(self.ids[p], float(scores[p])) for p in top_k(scores, k)]
+
+    def search_combined(self, image_query, text_query, k=5):
+        """Recherche sur la moyenne des similarités image et texte"""
+        scores = (self.scores(image_query, 'image') + self.scores(text_query, 'text')) / 2
+        return [(self.ids[p], float(scores[p])) for p in top_k(scores, k)]
+
+    def labelled_neighbours(self, image_query, text_query, k=10):
+        """Les k produits étiquetés les plus proches (image + texte) : [(label, score)]"""
+        scores = (self.scores(image_query, 'image') + self.scores(text_query, 'text')) / 2
+        unlabelled = np.array([label is None for label in self.labels])
+        if unlabelled.any():
+            scores[unlabelled] = -np.inf
+        k = min(k, int((~unlabelled).sum()))
+        return [(self.labels[p], float(scores[p])) for p in top_k(scores, k)]
+
+
+def product_text(record):
+    """Texte d'un produit du catalogue, comme celui envoyé par la page de prédiction"""
+    parts = [record.get(column) for column in ('product_name', 'description', 'product_specifications')]
+    return " ".join(part for part in parts if isinstance(part, str))
+
+
+def build_embedding_index(classifier, csv_path='produits_original.csv', image_folder='Images',
+                          index_path=DEFAULT_INDEX_PATH, pixel_store_path=None, batch_size=BUILD_BATCH_SIZE):
+    """Encoder tous les produits du catalogue et écrire les matrices d'embeddings"""
+    import pandas as pd
+    from pixel_store import PixelStore, clip_image_processor, load_image, preprocess_uint8, store_files
+    from category_tree import main_categories
+
+    products = pd.read_csv(csv_path, usecols=['uniq_id', 'image', 'product_name', 'description',
+                                              'product_specifications', 'product_category_tree'])
+    products = products.drop_duplicates('uniq_id')
+    products['label'] = main_categories(products['product_category_tree'])
+    products = products[[isinstance(name, str) and os.path.exists(os.path.join(image_folder, name))
+                         for name in products['image']]]
+    records = products.to_dict('records')
+
+    # Pixels prétraités (pixel_store.py) si le stockage existe, décodage des JPEG sinon
+    pixel_store = None
+    if pixel_store_path and os.path.exists(store_files(pixel_store_path)[1]):
+        pixel_store = PixelStore(pixel_store_path)
+        logger.info(f"✅ Pixels lus depuis {pixel_store_path}")
+
+    files = index_files(index_path)
+    os.makedirs(os.path.dirname(files['meta']) or '.', exist_ok=True)
+    dim = classifier.config.projection_dim
+    tmp = {modality: f"{files[modality]}.{os.getpid()}.tmp" for modality in MODALITIES}
+    matrices = {
+        modality: np.memmap(tmp[modality], dtype=np.float16, mode='w+', shape=(len(records), dim))
+        for modality in MODALITIES
+    }
+
+    image_processor = clip_image_processor(classifier.processor)
+    kept = []
+    failed = []
+    row = 0
+    for start in range(0, len(records), batch_size):
+        batch = records[start:start + batch_size]
+        ids = [record['uniq_id'] for record in batch]
+        if pixel_store is not None and all(item_id in pixel_store for item_id in ids):
+            pixels = pixel_store.get_batch(ids)
+        else:
+            # Les images illisibles (load_image renvoie None) sont écartées avec leur produit
+            loaded = [(record, load_image(os.path.join(image_folder, record['image']))) for record in batch]
+            failed.extend(record['image'] for record, image in loaded if image is None)
+            loaded = [(record, image) for record, image in loaded if image is not None]
+            if not loaded:
+                continue
+            batch = [record for record, _ in loaded]
+            pixels = preprocess_uint8([image for _, image in loaded], image_processor)
+        image_embeds, text_embeds = classifier.embed_pixel_batch(pixels, [product_text(record) for record in batch])
+        matrices['image'][row:row + len(batch)] = image_embeds.astype(np.float16)
+        matrices['text'][row:row + len(batch)] = text_embeds.astype(np.float16)
+        kept.extend(batch)
+        row += len(batch)
+        logger.info(f"🔄 {min(start + batch_size, len(records))}/{len(records)} produits encodés")
+
+    for modality in MODALITIES:
+        matrices[modality].flush()
+    del matrices
+    for modality in MODALITIES:
+        # Tronquer si des images n'ont pas pu être décodées
+        os.truncate(tmp[modality], row * dim * np.dtype(np.float16).itemsize)
+        os.replace(tmp[modality], files[modality])
+
+    meta = {
+        'ids': [record['uniq_id'] for record in kept],
+        'labels': [record['label'] for record in kept],
+        'dim': dim,
+        'model': getattr(classifier, 'checkpoint_path', None),
+        'created_at': time.time()
+    }
+    tmp_meta = f"{files['meta']}.{os.getpid()}.tmp"
+    with open(tmp_meta, 'w', encoding='utf-8') as f:
+        json.dump(meta, f)
+    os.replace(tmp_meta, files['meta'])
+
+    for name in failed:
+        logger.warning(f"⚠️ Image ignorée (décodage impossible): {name}")
+    logger.info(f"✅ {len(kept)} produits indexés dans {index_path}")
+    return len(kept)
+
+
+def main():
+    """Point d'entrée en ligne de commande"""
+    logging.basicConfig(level=logging.INFO)
+    parser = argparse.ArgumentParser(description="Encoder le catalogue et écrire l'index d'embeddings")
+    parser.add_argument('--csv', default='produits_original.csv', help="CSV des produits")
+    parser.add_argument('--images', default='Images', help="Dossier des images")
+    parser.add_argument('--output', default=DEFAULT_INDEX_PATH, help="Chemin de l'index (sans extension)")
+    parser.add_argument('--pixel-store', default=os.getenv('PIXEL_STORE_PATH', 'pixel_store/catalogue'),
+                        help="Stockage de pixels prétraités à réutiliser s'il existe")
+    parser.add_argument('--batch-size', type=int, default=BUILD_BATCH_SIZE)
+    args = parser.parse_args()
+
+    if not os.path.exists(args.csv):
+        print(f"❌ Fichier non trouvé: {args.csv}")
+        return 1
+
+    from score_finetuned import CLIPClassifierFinetuned
+    classifier = CLIPClassifierFinetuned()
+
+    start = time.perf_counter()
+    count = build_embedding_index(classifier, args.csv, args.images, args.output, args.pixel_store, args.batch_size)
+    print(f"✅ {count} produits encodés en {time.perf_counter() - start:.1f}s -> {args.output}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,339 @@
+#!/usr/bin/env python3
+"""
+Serveur HTTP local multi-workers pour le script de scoring fine-tuné
+
+Remplace l'endpoint Azure ML en développement avec le même contrat :
+POST /score (JSON {"image": base64, "text": ...}) et GET /health. Le client
+Streamlit l'utilise avec AZURE_ML_ENDPOINT_URL=http://localhost:5001/score.
+
+Le modèle est chargé une seule fois dans le processus parent via
+score_finetuned.init(), puis N workers sont créés par fork : ils partagent les
+poids en copy-on-write au lieu d'en garder chacun une copie.
+
+GET /metrics expose les métriques au format texte Prometheus (requêtes par
+statut, latences par étape, tailles de batch, caches, chargement du modèle,
+requêtes en cours et file d'attente de la socket), agrégées sur tous les
+workers.
+
+Usage :
+    python azure_ml_api/local_server.py --port 5001 --workers 4
+"""
+
+import os
+import sys
+import gc
+import time
+import signal
+import logging
+import argparse
+import hmac
+import json
+import shutil
+import tempfile
+from urllib.parse import urlparse
+from http.server import BaseHTTPRequestHandler, HTTPServer
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+import metrics
+import profiling
+
+logger = logging.getLogger(__name__)
+
+# Module de scoring chargé par le parent (hérité par les workers)
+scoring = None
+entry_script_name = None
+
+# Clé attendue dans l'en-tête Authorization (optionnelle, comme sur Azure ML)
+api_key = None
+
+# Répertoire des métriques partagé par les workers (None avec un seul processus)
+metrics_dir = None
+
+# Secondes d'inactivité tolérées sur une connexion (client lent ou muet)
+REQUEST_TIMEOUT = float(os.getenv('SCORING_REQUEST_TIMEOUT', '30'))
+
+
+def listen_queue_depth(port):
+    """Connexions en attente d'accept() sur la socket d'écoute (Linux, None ailleurs)"""
+    depth = None
+    for table in ('/proc/net/tcp', '/proc/net/tcp6'):
+        try:
+            with open(table) as f:
+                next(f)
+                for line in f:
+                    fields = line.split()
+                    # Socket en écoute (état 0A) : rx_queue = file d'attente d'accept
+                    if fields[3] == '0A' and int(fields[1].rsplit(':', 1)[1], 16) == port:
+                        depth = (depth or 0) + int(fields[4].split(':')[1], 16)
+        except (OSError, StopIteration, IndexError, ValueError):
+            continue
+    return depth
+
+
+def write_worker_metrics():
+    """Publier les métriques du worker pour GET /metrics (sans effet avec un seul processus)"""
+    if metrics_dir:
+        try:
+            metrics.write_snapshot(metrics_dir)
+        except OSError as e:
+            logger.warning(f"⚠️ Écriture des métriques impossible: {str(e)}")
+
+
+class ScoringRequestHandler(BaseHTTPRequestHandler):
+    """Gestionnaire des requêtes /score et /health"""
+
+    protocol_version = 'HTTP/1.1'
+    # Un worker ne sert qu'une connexion à la fois : pas de connexion persistante,
+    # et une connexion inactive est coupée au lieu de bloquer le worker
+    timeout = REQUEST_TIMEOUT
+
+    def _send(self, status, body, content_type='application/json'):
+        metrics.HTTP_RESPONSES.inc(code=status)
+        payload = body.encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(payload)))
+        self.send_header('Connection', 'close')
+        self.close_connection = True
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def _send_error(self, status, message):
+        self._send(status, json.dumps({'status': 'error', 'error': message}))
+
+    def _route(self):
+        return urlparse(self.path).path.rstrip('/') or '/'
+
+    def _authorized(self):
+        """Vérifier la clé Bearer si le serveur en exige une"""
+        if not api_key:
+            return True
+        header = self.headers.get('Authorization', '')
+        token = header[len('Bearer '):] if header.startswith('Bearer ') else ''
+        return hmac.compare_digest(token.encode('utf-8'), api_key.encode('utf-8'))
+
+    def do_GET(self):
+        route = self._route()
+        if route == '/':
+            # Sonde de vivacité du serveur d'inférence Azure ML
+            self._send(200, 'Healthy', content_type='text/plain')
+        elif route == '/health':
+            if scoring is None:
+                self._send(503, json.dumps({'status': 'unhealthy', 'error': 'Modèle non chargé'}))
+            else:
+                self._send(200, json.dumps({
+                    'status': 'healthy',
+                    'entry_script': entry_script_name,
+                    'pid': os.getpid()
+                }))
+        elif route == '/metrics':
+            queue_depth = listen_queue_depth(self.server.server_address[1])
+            self._send(200, metrics.exposition(metrics_dir, [
+                ('scoring_queue_depth', "Connexions en attente d'un worker libre", queue_depth)
+            ]), content_type=metrics.CONTENT_TYPE)
+        else:
+            self._send_error(404, f"Route inconnue: {route}")
+
+    def do_POST(self):
+        try:
+            self._score()
+        finally:
+            # Toutes les réponses (erreurs comprises) comptent dans les métriques fusionnées
+            write_worker_metrics()
+
+    def _score(self):
+        route = self._route()
+        if route != '/score':
+            self._send_error(404, f"Route inconnue: {route}")
+            return
+
+        if not self._authorized():
+            self._send_error(401, "Clé API invalide ou manquante")
+            return
+
+        try:
+            length = int(self.headers.get('Content-Length', 0))
+        except ValueError:
+            self._send_error(400, "En-tête Content-Length invalide")
+            return
+        raw_data = self.rfile.read(length).decode('utf-8')
+
+        metrics.IN_FLIGHT.inc()
+        # Requête en cours visible par le worker qui répond à /metrics
+        write_worker_metrics()
+        try:
+            # En-têtes transmis au profilage (X-Profile, identifiant de requête)
+            with profiling.request_headers(self.headers):
+                result = scoring.run(raw_data)
+        except Exception as e:
+            logger.error(f"❌ Erreur dans run(): {str(e)}")
+            self._send_error(500, str(e))
+            return
+        finally:
+            metrics.IN_FLIGHT.dec()
+
+        # run() renvoie une chaîne JSON (Azure ML accepte aussi un dict)
+        if not isinstance(result, str):
+            result = json.dumps(result)
+        self._send(200, result)
+
+    def log_message(self, format, *args):
+        logger.debug(f"[worker {os.getpid()}] {format % args}")
+
+
+class PreforkHTTPServer(HTTPServer):
+    """Serveur HTTP dont la socket d'écoute est partagée entre les workers"""
+
+    allow_reuse_address = True
+    request_queue_size = 128
+
+
+def default_threads_per_worker(workers):
+    """Nombre de threads torch par worker pour ne pas sursouscrire les CPU"""
+    return max(1, (os.cpu_count() or 1) // max(1, workers))
+
+
+def limit_threads(threads):
+    """Limiter les threads de calcul du processus courant"""
+    import torch
+    for name in ('OMP_NUM_THREADS', 'MKL_NUM_THREADS', 'OPENBLAS_NUM_THREADS'):
+        os.environ[name] = str(threads)
+    torch.set_num_threads(threads)
+
+
+def load_model(entry_script='score_finetuned'):
+    """Importer le script de scoring et charger le modèle"""
+    global scoring, entry_script_name
+    import importlib
+    # Accepter aussi bien "score_finetuned" que "score_finetuned.py"
+    entry_script_name = os.path.splitext(os.path.basename(entry_script))[0]
+    module = importlib.import_module(entry_script_name)
+
+    start = time.perf_counter()
+    module.init()
+    scoring = module
+    logger.info(f"✅ Modèle chargé en {time.perf_counter() - start:.1f}s")
+    return scoring
+
+
+def run_worker(server, threads):
+    """Boucle d'un worker (processus enfant)"""
+    # Le parent gère l'arrêt : les workers sortent sur SIGTERM
+    signal.signal(signal.SIGTERM, lambda *_: os._exit(0))
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    limit_threads(threads)
+    logger.info(f"🚀 Worker {os.getpid()} prêt ({threads} thread(s))")
+    try:
+        server.serve_forever()
+    finally:
+        os._exit(0)
+
+
+def spawn_worker(server, threads):
+    """Créer un worker par fork"""
+    pid = os.fork()
+    if pid == 0:
+        run_worker(server, threads)
+    return pid
+
+
+def prepare_metrics_dir(path=None):
+    """Répertoire où chaque worker écrit ses métriques, sans états d'une exécution précédente
+
+    Seuls les fichiers <pid>.json(.tmp) des workers sont supprimés : le dossier
+    SCORING_METRICS_DIR peut contenir d'autres fichiers.
+    """
+    path = path or tempfile.mkdtemp(prefix='scoring-metrics-')
+    os.makedirs(path, exist_ok=True)
+    metrics.remove_snapshots(path)
+    return path
+
+
+def serve(host='0.0.0.0', port=5001, workers=1, threads=None, entry_script='score_finetuned', key=None):
+    """Charger le modèle puis servir les requêtes avec N workers"""
+    global api_key, metrics_dir
+    api_key = key
+    threads = threads or default_threads_per_worker(workers)
+
+    # Un seul thread pendant le chargement : pas de pool OpenMP avant le fork
+    limit_threads(1)
+    load_model(entry_script)
+
+    server = PreforkHTTPServer((host, port), ScoringRequestHandler)
+    logger.info(f"🌐 Serveur de scoring sur http://{host}:{port}/score ({workers} worker(s))")
+
+    if workers <= 1 or not hasattr(os, 'fork'):
+        limit_threads(threads)
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.server_close()
+        return
+
+    # Les workers fusionnent leurs métriques via ce répertoire
+    metrics_dir = prepare_metrics_dir(os.getenv('SCORING_METRICS_DIR'))
+
+    # Geler les objets existants pour limiter les copies dues au ramasse-miettes
+    gc.collect()
+    if hasattr(gc, 'freeze'):
+        gc.freeze()
+
+    children = set(spawn_worker(server, threads) for _ in range(workers))
+    stopping = False
+
+    def stop(*_):
+        nonlocal stopping
+        stopping = True
+        for pid in list(children):
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+
+    # Superviser les workers : relancer ceux qui meurent
+    while children:
+        try:
+            pid, status = os.wait()
+        except ChildProcessError:
+            break
+        except InterruptedError:
+            continue
+        children.discard(pid)
+        metrics.mark_process_dead(metrics_dir, pid)
+        if not stopping:
+            logger.warning(f"⚠️ Worker {pid} arrêté (status {status}), redémarrage")
+            children.add(spawn_worker(server, threads))
+
+    server.server_close()
+    if not os.getenv('SCORING_METRICS_DIR'):
+        shutil.rmtree(metrics_dir, ignore_errors=True)
+    logger.info("🛑 Serveur arrêté")
+
+
+def main():
+    """Point d'entrée en ligne de commande"""
+    logging.basicConfig(level=logging.INFO)
+    parser = argparse.ArgumentParser(description="Serveur de scoring local multi-workers")
+    parser.add_argument('--host', default='0.0.0.0')
+    parser.add_argument('--port', type=int, default=int(os.getenv('SCORING_PORT', '5001')))
+    parser.add_argument('--workers', type=int, default=int(os.getenv('SCORING_WORKERS', '1')),
+                        help="Nombre de processus workers")
+    parser.add_argument('--threads', type=int, default=None,
+                        help="Threads torch par worker (par défaut : CPU / workers)")
+    parser.add_argument('--entry-script', default='score_finetuned',
+                        help="Module de scoring exposant init() et run() (ex. score_finetuned, score)")
+    parser.add_argument('--api-key', default=os.getenv('SCORING_API_KEY'),
+                        help="Clé Bearer exigée sur /score (désactivée par défaut)")
+    args = parser.parse_args()
+
+    serve(args.host, args.port, args.workers, args.threads, args.entry_script, args.api_key)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
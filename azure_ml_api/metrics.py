@@ -0,0 +1,313 @@
+#!/usr/bin/env python3
+"""
+Métriques du service de scoring au format texte Prometheus
+
+Compteurs, jauges et histogrammes minimalistes (sans dépendance) enregistrés
+par le script de scoring et le serveur local, exposés sur GET /metrics.
+
+Avec plusieurs workers (serveur prefork), chaque processus a ses propres
+valeurs : il les écrit après chaque requête dans un fichier <pid>.json du
+répertoire de métriques, et le worker qui répond à /metrics fusionne tous les
+fichiers (compteurs et histogrammes additionnés, jauges additionnées ou
+maximum selon la métrique). Les compteurs d'un worker arrêté sont conservés,
+ses jauges sont retirées.
+"""
+
+import os
+import glob
+import json
+import math
+import threading
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+# Secondes : de la milliseconde (étapes courtes) à la minute (heatmap sur CPU lent)
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+BATCH_SIZE_BUCKETS = (1, 2, 4, 8, 16, 32, 64, 128, 256)
+
+
+class Metric:
+    """Métrique nommée avec étiquettes (valeurs indexées par tuple d'étiquettes)"""
+
+    kind = None
+
+    def __init__(self, name, documentation, labelnames=(), registry=None):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+        (registry if registry is not None else REGISTRY).register(self)
+
+    def _key(self, labels):
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"{self.name} attend les étiquettes {self.labelnames}, reçu {tuple(labels)}")
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def snapshot(self):
+        """État sérialisable en JSON"""
+        with self._lock:
+            samples = [[list(key), value] for key, value in self._values.items()]
+        return {'type': self.kind, 'help': self.documentation, 'labelnames': list(self.labelnames),
+                'samples': samples}
+
+
+class Counter(Metric):
+    """Compteur monotone"""
+
+    kind = 'counter'
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def set_total(self, value, **labels):
+        """Recopier un total compté ailleurs (ex. statistiques d'un cache)"""
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+
+class Gauge(Metric):
+    """Valeur instantanée ; multiprocess_mode 'sum' ou 'max' pour la fusion entre workers"""
+
+    kind = 'gauge'
+
+    def __init__(self, name, documentation, labelnames=(), registry=None, multiprocess_mode='sum'):
+        super().__init__(name, documentation, labelnames, registry)
+        self.multiprocess_mode = multiprocess_mode
+
+    def set(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, amount=1, **labels):
+        self.inc(-amount, **labels)
+
+    def snapshot(self):
+        state = super().snapshot()
+        state['multiprocess_mode'] = self.multiprocess_mode
+        return state
+
+
+class Histogram(Metric):
+    """Histogramme à seaux fixes : valeur = [comptes par seau (non cumulés), somme, nombre]"""
+
+    kind = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), registry=None, buckets=LATENCY_BUCKETS):
+        super().__init__(name, documentation, labelnames, registry)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        # Premier seau dont la borne supérieure contient la valeur (dernier = +Inf)
+        position = next((i for i, bound in enumerate(self.buckets) if value <= bound), len(self.buckets))
+        with self._lock:
+            counts, total, count = self._values.get(key) or ([0] * (len(self.buckets) + 1), 0.0, 0)
+            counts = list(counts)
+            counts[position] += 1
+            self._values[key] = (counts, total + value, count + 1)
+
+    def snapshot(self):
+        state = super().snapshot()
+        state['buckets'] = list(self.buckets)
+        state['samples'] = [[key, list(value)] for key, value in state['samples']]
+        return state
+
+
+class Registry:
+    """Ensemble des métriques d'un processus et fonctions de collecte appelées avant export"""
+
+    def __init__(self):
+        self.metrics = {}
+        self.collectors = []
+
+    def register(self, metric):
+        if metric.name in self.metrics:
+            raise ValueError(f"Métrique déjà enregistrée: {metric.name}")
+        self.metrics[metric.name] = metric
+
+    def register_collector(self, collector):
+        """Fonction sans argument appelée avant chaque export (mise à jour de jauges, totaux de caches)"""
+        self.collectors.append(collector)
+
+    def snapshot(self):
+        """État de toutes les métriques du processus"""
+        for collector in self.collectors:
+            collector()
+        return {name: metric.snapshot() for name, metric in self.metrics.items()}
+
+
+REGISTRY = Registry()
+
+
+# --- Métriques du service de scoring ---
+
+REQUESTS = Counter('scoring_requests_total', "Requêtes de scoring par statut de réponse", ['status'])
+REQUEST_SECONDS = Histogram('scoring_request_duration_seconds', "Durée totale d'une requête de scoring", ['status'])
+STAGE_SECONDS = Histogram('scoring_stage_duration_seconds', "Durée des étapes du scoring (voir timing.py)", ['stage'])
+BATCH_SIZE = Histogram('scoring_batch_size', "Taille des batches passés au modèle", buckets=BATCH_SIZE_BUCKETS)
+CACHE_HITS = Counter('scoring_cache_hits_total', "Accès en cache réussis", ['cache'])
+CACHE_MISSES = Counter('scoring_cache_misses_total', "Accès en cache manqués", ['cache'])
+MODEL_LOAD_SECONDS = Gauge('scoring_model_load_seconds', "Durée du chargement du modèle (init)",
+                           multiprocess_mode='max')
+IN_FLIGHT = Gauge('scoring_requests_in_flight', "Requêtes en cours de traitement")
+HTTP_RESPONSES = Counter('scoring_http_responses_total', "Réponses HTTP du serveur local par code", ['code'])
+
+
+# --- Fusion entre processus ---
+
+def write_snapshot(directory, registry=REGISTRY):
+    """Écrire l'état du processus courant dans <directory>/<pid>.json (écriture atomique)"""
+    path = os.path.join(directory, f"{os.getpid()}.json")
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(registry.snapshot(), f)
+    os.replace(tmp_path, path)
+
+
+def snapshot_files(directory, suffix='.json'):
+    """Fichiers <pid>.json des workers (les autres fichiers du dossier sont ignorés)"""
+    return [path for path in glob.glob(os.path.join(directory, f'[0-9]*{suffix}'))
+            if os.path.basename(path)[:-len(suffix)].isdigit()]
+
+
+def remove_snapshots(directory):
+    """Supprimer les états d'une exécution précédente (<pid>.json et <pid>.json.tmp seulement)"""
+    for path in snapshot_files(directory) + snapshot_files(directory, '.json.tmp'):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+
+def read_snapshots(directory):
+    """États écrits par les workers"""
+    snapshots = []
+    for path in snapshot_files(directory):
+        try:
+            with open(path, encoding='utf-8') as f:
+                snapshots.append(json.load(f))
+        except (OSError, ValueError):
+            # Fichier en cours de remplacement ou supprimé
+            continue
+    return snapshots
+
+
+def mark_process_dead(directory, pid):
+    """Retirer les jauges d'un worker arrêté (ses compteurs restent acquis)"""
+    path = os.path.join(directory, f"{pid}.json")
+    try:
+        with open(path, encoding='utf-8') as f:
+            snapshot = json.load(f)
+    except (OSError, ValueError):
+        return
+    snapshot = {name: state for name, state in snapshot.items() if state['type'] != 'gauge'}
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(snapshot, f)
+    os.replace(tmp_path, path)
+
+
+def merge_snapshots(snapshots):
+    """Fusionner les états de plusieurs processus"""
+    merged = {}
+    for snapshot in snapshots:
+        for name, state in snapshot.items():
+            target = merged.setdefault(name, {**state, 'samples': {}})
+            for key, value in state['samples']:
+                key = tuple(key)
+                previous = target['samples'].get(key)
+                if previous is None:
+                    target['samples'][key] = value
+                elif state['type'] == 'histogram':
+                    counts = [a + b for a, b in zip(previous[0], value[0])]
+                    target['samples'][key] = [counts, previous[1] + value[1], previous[2] + value[2]]
+                elif state.get('multiprocess_mode') == 'max':
+                    target['samples'][key] = max(previous, value)
+                else:
+                    target['samples'][key] = previous + value
+    for state in merged.values():
+        state['samples'] = [[list(key), value] for key, value in state['samples'].items()]
+    return merged
+
+
+# --- Format texte ---
+
+def _format_value(value):
+    if value == math.inf:
+        return '+Inf'
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return repr(value) if isinstance(value, float) else str(value)
+
+
+def _format_labels(names, values, extra=()):
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ''
+    escaped = (str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for _, value in pairs)
+    return '{' + ','.join(f'{name}="{value}"' for (name, _), value in zip(pairs, escaped)) + '}'
+
+
+def cache_hit_ratios(snapshot):
+    """Taux de succès par cache, calculé après fusion des compteurs"""
+    hits = {tuple(key): value for key, value in snapshot.get('scoring_cache_hits_total', {}).get('samples', [])}
+    misses = {tuple(key): value for key, value in snapshot.get('scoring_cache_misses_total', {}).get('samples', [])}
+    ratios = []
+    for key in sorted(set(hits) | set(misses)):
+        total = hits.get(key, 0) + misses.get(key, 0)
+        ratios.append([list(key), hits.get(key, 0) / total if total else 0.0])
+    return {'type': 'gauge', 'help': "Taux de succès des caches (hits / accès)", 'labelnames': ['cache'],
+            'samples': ratios}
+
+
+def render(snapshot):
+    """Exposition texte Prometheus d'un état (fusionné ou non)"""
+    snapshot = dict(snapshot)
+    if 'scoring_cache_hits_total' in snapshot:
+        snapshot['scoring_cache_hit_ratio'] = cache_hit_ratios(snapshot)
+    lines = []
+    for name in sorted(snapshot):
+        state = snapshot[name]
+        lines.append(f"# HELP {name} {state['help']}")
+        lines.append(f"# TYPE {name} {state['type']}")
+        for key, value in sorted(state['samples']):
+            if state['type'] == 'histogram':
+                counts, total, count = value
+                cumulative = 0
+                for bound, bucket_count in zip(list(state['buckets']) + [math.inf], counts):
+                    cumulative += bucket_count
+                    labels = _format_labels(state['labelnames'], key, [('le', _format_value(float(bound)))])
+                    lines.append(f"{name}_bucket{labels} {cumulative}")
+                labels = _format_labels(state['labelnames'], key)
+                lines.append(f"{name}_sum{labels} {_format_value(float(total))}")
+                lines.append(f"{name}_count{labels} {count}")
+            else:
+                lines.append(f"{name}{_format_labels(state['labelnames'], key)} {_format_value(value)}")
+    return '\n'.join(lines) + '\n'
+
+
+def exposition(directory=None, extra_gauges=(), registry=REGISTRY):
+    """
+    Texte de /metrics : processus courant seul, ou tous les workers si un
+    répertoire de métriques est donné. extra_gauges : [(nom, aide, valeur)]
+    mesurées au moment de l'export (ex. file d'attente de la socket).
+    """
+    if directory:
+        write_snapshot(directory, registry)
+        snapshot = merge_snapshots(read_snapshots(directory))
+    else:
+        snapshot = registry.snapshot()
+    for name, documentation, value in extra_gauges:
+        if value is not None:
+            snapshot[name] = {'type': 'gauge', 'help': documentation, 'labelnames': [], 'samples': [[[], value]]}
+    return render(snapshot)
@@ -0,0 +1,241 @@
+#!/usr/bin/env python3
+"""
+Chargement des poids du modèle CLIP fine-tuné
+
+Les checkpoints .pth (state_dict picklé) sont désérialisés entièrement en
+mémoire dans chaque processus. Le format safetensors est lu ici par
+memory-mapping : les tenseurs pointent directement sur le page cache, qui est
+partagé entre tous les workers d'une même machine.
+"""
+
+import os
+import sys
+import json
+import mmap
+import inspect
+import logging
+import argparse
+from collections import namedtuple
+from contextlib import contextmanager
+import torch
+
+logger = logging.getLogger(__name__)
+
+# Même forme que le résultat de Module.load_state_dict
+IncompatibleKeys = namedtuple('IncompatibleKeys', ['missing_keys', 'unexpected_keys'])
+
+SAFETENSORS_DTYPES = {
+    'F64': torch.float64,
+    'F32': torch.float32,
+    'F16': torch.float16,
+    'BF16': torch.bfloat16,
+    'I64': torch.int64,
+    'I32': torch.int32,
+    'I16': torch.int16,
+    'I8': torch.int8,
+    'U8': torch.uint8,
+    'BOOL': torch.bool,
+}
+
+
+# Fonctions d'initialisation appelées par les constructeurs des couches torch
+TORCH_INIT_FUNCTIONS = (
+    'uniform_', 'normal_', 'trunc_normal_', 'constant_', 'zeros_', 'ones_',
+    'xavier_uniform_', 'xavier_normal_', 'kaiming_uniform_', 'kaiming_normal_', 'orthogonal_',
+)
+
+
+def _skip_init(tensor, *args, **kwargs):
+    return tensor
+
+
+@contextmanager
+def skip_weight_init():
+    """
+    Construire un modèle sans initialiser ses poids (alloués sans valeur) :
+    l'initialisation aléatoire des ~150M paramètres de CLIP coûte plusieurs
+    secondes, pour des poids aussitôt remplacés par ceux du checkpoint.
+    À utiliser avec load_weights_into(strict=True), qui refuse un checkpoint
+    incomplet (les poids absents resteraient non initialisés).
+    """
+    originals = {name: getattr(torch.nn.init, name) for name in TORCH_INIT_FUNCTIONS
+                 if hasattr(torch.nn.init, name)}
+    try:
+        # Saute aussi _init_weights des modèles transformers
+        from transformers.modeling_utils import no_init_weights
+    except ImportError:
+        no_init_weights = None
+    for name in originals:
+        setattr(torch.nn.init, name, _skip_init)
+    try:
+        if no_init_weights is not None:
+            with no_init_weights():
+                yield
+        else:
+            yield
+    finally:
+        for name, function in originals.items():
+            setattr(torch.nn.init, name, function)
+
+
+def safetensors_path_for(checkpoint_path):
+    """Chemin du fichier safetensors associé à un checkpoint .pth"""
+    root, _ = os.path.splitext(checkpoint_path)
+    return root + '.safetensors'
+
+
+def find_checkpoint(checkpoint_path):
+    """Trouver le checkpoint à charger, safetensors en priorité puis .pth"""
+    candidates = [safetensors_path_for(checkpoint_path), checkpoint_path]
+    for path in candidates:
+        if os.path.exists(path):
+            return path
+    return None
+
+
+def load_safetensors_mmap(path):
+    """Charger un fichier safetensors en memory-mapping (sans copie)"""
+    with open(path, 'rb') as f:
+        header_size = int.from_bytes(f.read(8), 'little')
+        header = json.loads(f.read(header_size))
+        # ACCESS_COPY (MAP_PRIVATE) : pages partagées tant qu'elles ne sont pas modifiées
+        buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_COPY)
+
+    data_start = 8 + header_size
+    state_dict = {}
+    for name, info in header.items():
+        if name == '__metadata__':
+            continue
+        dtype = SAFETENSORS_DTYPES[info['dtype']]
+        begin, end = info['data_offsets']
+        offset = data_start + begin
+        itemsize = torch.empty((), dtype=dtype).element_size()
+        count = (end - begin) // itemsize
+
+        if count == 0:
+            tensor = torch.empty(info['shape'], dtype=dtype)
+        elif offset % itemsize == 0:
+            tensor = torch.frombuffer(buffer, dtype=dtype, count=count, offset=offset).view(info['shape'])
+        else:
+            # Tenseur non aligné : copie pour éviter les accès non alignés
+            tensor = torch.frombuffer(bytearray(buffer[offset:offset + end - begin]), dtype=dtype).view(info['shape'])
+        state_dict[name] = tensor
+
+    return state_dict
+
+
+def load_state_dict(path, device='cpu'):
+    """Charger un state_dict depuis un fichier .safetensors ou .pth"""
+    device = torch.device(device)
+
+    if path.endswith('.safetensors'):
+        state_dict = load_safetensors_mmap(path)
+        if device.type != 'cpu':
+            state_dict = {name: tensor.to(device) for name, tensor in state_dict.items()}
+        logger.info(f"✅ Poids chargés en memory-mapping depuis {path}")
+        return state_dict
+
+    try:
+        # torch >= 2.1 : mmap du zip .pth, sinon désérialisation complète
+        state_dict = torch.load(path, map_location=device, mmap=True)
+    except TypeError:
+        state_dict = torch.load(path, map_location=device)
+    except RuntimeError:
+        # Ancien format de sérialisation, non compatible avec mmap
+        state_dict = torch.load(path, map_location=device)
+    logger.info(f"✅ Poids chargés depuis {path}")
+    return state_dict
+
+
+def assign_state_dict(model, state_dict):
+    """
+    Remplacer les paramètres et buffers du modèle par les tenseurs du
+    state_dict, sans copie (équivalent de load_state_dict(assign=True) pour
+    torch < 2.1). Renvoie (missing_keys, unexpected_keys) comme load_state_dict.
+    """
+    expected = model.state_dict(keep_vars=True)
+    for name, tensor in state_dict.items():
+        current = expected.get(name)
+        if current is None:
+            continue
+        if current.shape != tensor.shape:
+            raise RuntimeError(f"Taille incompatible pour {name}: {tuple(tensor.shape)} "
+                               f"dans le checkpoint, {tuple(current.shape)} dans le modèle")
+        module_name, _, attribute = name.rpartition('.')
+        module = model.get_submodule(module_name) if module_name else model
+        # .to() ne copie que si le type diffère de celui du modèle
+        tensor = tensor.to(current.dtype)
+        if attribute in module._parameters:
+            module._parameters[attribute] = torch.nn.Parameter(tensor, requires_grad=current.requires_grad)
+        else:
+            module._buffers[attribute] = tensor
+    return IncompatibleKeys(
+        missing_keys=[name for name in expected if name not in state_dict],
+        unexpected_keys=[name for name in state_dict if name not in expected]
+    )
+
+
+def load_weights_into(model, path, device='cpu', strict=True):
+    """
+    Charger les poids dans le modèle en réutilisant les tenseurs chargés
+
+    strict : erreur si des poids du modèle manquent dans le checkpoint. Les
+    clés en trop (ex. buffers position_ids des anciennes versions de
+    transformers) sont seulement signalées.
+    """
+    state_dict = load_state_dict(path, device)
+    if 'assign' in inspect.signature(model.load_state_dict).parameters:
+        # assign=True : les paramètres pointent sur les tenseurs mmap au lieu d'une copie
+        result = model.load_state_dict(state_dict, strict=False, assign=True)
+        logger.info("✅ Poids assignés sans copie (load_state_dict assign=True)")
+    else:
+        # torch < 2.1 (environment.yml) : load_state_dict copierait les tenseurs
+        result = assign_state_dict(model, state_dict)
+        logger.info(f"✅ Poids assignés sans copie (torch {torch.__version__}, remplacement des paramètres)")
+    if result.missing_keys:
+        message = f"{len(result.missing_keys)} poids absents du checkpoint {path}: {', '.join(result.missing_keys[:5])}"
+        if strict:
+            raise RuntimeError(message)
+        logger.warning(f"⚠️ {message}")
+    if result.unexpected_keys:
+        logger.warning(f"⚠️ {len(result.unexpected_keys)} clés du checkpoint ignorées: "
+                       f"{', '.join(result.unexpected_keys[:5])}")
+    return result
+
+
+def convert_checkpoint(checkpoint_path, output_path=None):
+    """Convertir un state_dict .pth en fichier safetensors"""
+    from safetensors.torch import save_file
+
+    output_path = output_path or safetensors_path_for(checkpoint_path)
+    state_dict = torch.load(checkpoint_path, map_location='cpu')
+    if 'model_state_dict' in state_dict:
+        state_dict = state_dict['model_state_dict']
+
+    # safetensors refuse les tenseurs partagés ou non contigus
+    tensors = {name: tensor.detach().clone().contiguous() for name, tensor in state_dict.items()}
+    save_file(tensors, output_path, metadata={'source': os.path.basename(checkpoint_path)})
+
+    logger.info(f"✅ {len(tensors)} tenseurs convertis vers {output_path}")
+    return output_path
+
+
+def main():
+    """Point d'entrée en ligne de commande pour la conversion"""
+    logging.basicConfig(level=logging.INFO)
+    parser = argparse.ArgumentParser(description="Convertir un checkpoint .pth en safetensors")
+    parser.add_argument('checkpoint', help="Chemin du fichier .pth")
+    parser.add_argument('-o', '--output', help="Chemin du fichier .safetensors (par défaut à côté du .pth)")
+    args = parser.parse_args()
+
+    if not os.path.exists(args.checkpoint):
+        print(f"❌ Checkpoint non trouvé: {args.checkpoint}")
+        return 1
+
+    output_path = convert_checkpoint(args.checkpoint, args.output)
+    print(f"✅ Checkpoint converti: {output_path}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
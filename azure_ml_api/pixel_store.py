@@ -0,0 +1,203 @@
+#!/usr/bin/env python3
+"""
+Stockage des images du catalogue déjà prétraitées pour CLIP
+
+Le décodage JPEG et le prétraitement CLIPProcessor (redimensionnement puis
+recadrage central) sont faits une seule fois. Les pixels sont écrits dans un
+unique tableau uint8 N×3×224×224 (fichier .u8 lu en memory-mapping, ~150 ko
+par image) accompagné d'un index JSON des identifiants. La normalisation
+(mise à l'échelle, moyenne et écart-type CLIP) est appliquée au moment du
+scoring, en torch, sur le batch demandé.
+
+Usage :
+    python azure_ml_api/pixel_store.py --images Images --output pixel_store/catalogue
+"""
+
+import os
+import sys
+import json
+import time
+import logging
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+import torch
+from PIL import Image
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_STORE_PATH = os.getenv('PIXEL_STORE_PATH', 'pixel_store/catalogue')
+IMAGE_SIZE = 224
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png')
+BUILD_BATCH_SIZE = 64
+MAX_WORKERS = 8
+
+
+def store_files(store_path):
+    """Fichiers du stockage : (pixels .u8, index .json)"""
+    return store_path + '.u8', store_path + '.json'
+
+
+def clip_image_processor(processor):
+    """Processeur d'images d'un CLIPProcessor (feature_extractor avant transformers 4.26)"""
+    return getattr(processor, 'image_processor', None) or processor.feature_extractor
+
+
+def normalize_pixels(pixels, image_processor, device='cpu'):
+    """Normaliser un batch uint8 N×3×H×W comme CLIPProcessor (float32 sur le device)"""
+    # torch.from_numpy partage la mémoire du memmap : pas de copie avant la conversion en float
+    tensor = torch.from_numpy(np.asarray(pixels)) if not torch.is_tensor(pixels) else pixels
+    tensor = tensor.to(device=device, dtype=torch.float32)
+    mean = torch.tensor(image_processor.image_mean, dtype=torch.float32, device=device).view(1, -1, 1, 1)
+    std = torch.tensor(image_processor.image_std, dtype=torch.float32, device=device).view(1, -1, 1, 1)
+    rescale_factor = getattr(image_processor, 'rescale_factor', 1 / 255)
+    return (tensor * rescale_factor - mean) / std
+
+
+def preprocess_uint8(images, image_processor):
+    """Redimensionner et recadrer des images PIL comme CLIPProcessor, sans normalisation (uint8)"""
+    if not hasattr(image_processor, 'rescale_factor'):
+        # CLIPFeatureExtractor (transformers < 4.26) : pas d'option do_rescale, ses étapes PIL sont appliquées ici
+        pixels = [
+            np.asarray(image_processor.center_crop(
+                image_processor.resize(image.convert('RGB'), size=image_processor.size,
+                                       resample=image_processor.resample, default_to_square=False),
+                image_processor.crop_size)).transpose(2, 0, 1)
+            for image in images
+        ]
+        return np.stack(pixels).astype(np.uint8)
+    pixels = image_processor(images=images, do_rescale=False, do_normalize=False,
+                             return_tensors='np')['pixel_values']
+    return np.clip(np.rint(pixels), 0, 255).astype(np.uint8)
+
+
+class PixelStore:
+    """Pixels prétraités du catalogue, lus en memory-mapping"""
+
+    def __init__(self, store_path=DEFAULT_STORE_PATH):
+        pixels_path, index_path = store_files(store_path)
+        with open(index_path, encoding='utf-8') as f:
+            meta = json.load(f)
+        self.ids = meta['ids']
+        self.positions = {item_id: i for i, item_id in enumerate(self.ids)}
+        shape = (len(self.ids), 3, meta['image_size'], meta['image_size'])
+        # mode 'r' : lecture seule, pages partagées entre processus via le page cache
+        self.pixels = np.memmap(pixels_path, dtype=np.uint8, mode='r', shape=shape)
+
+    def __len__(self):
+        return len(self.ids)
+
+    def __contains__(self, item_id):
+        return item_id in self.positions
+
+    def get_batch(self, ids):
+        """Pixels d'une liste d'identifiants (copie, les positions n'étant pas contiguës)"""
+        return self.pixels[[self.positions[item_id] for item_id in ids]]
+
+    def iter_batches(self, batch_size=32):
+        """Parcourir le stockage par tranches contiguës (vues sans copie du memmap)"""
+        for start in range(0, len(self.ids), batch_size):
+            end = start + batch_size
+            yield self.ids[start:end], self.pixels[start:end]
+
+
+def limit_image_size(image, max_size=IMAGE_SIZE):
+    """Convertir en RVB et ramener le plus grand côté à 224 px (pré-redimensionnement du scoring)"""
+    if image.mode != 'RGB':
+        image = image.convert('RGB')
+    if max(image.size) > max_size:
+        ratio = max_size / max(image.size)
+        new_size = (int(image.size[0] * ratio), int(image.size[1] * ratio))
+        image = image.resize(new_size, Image.LANCZOS)
+    return image
+
+
+def load_image(image_path):
+    """Décoder une image prête pour le processeur (None si illisible)"""
+    try:
+        with Image.open(image_path) as img:
+            return limit_image_size(img.convert('RGB'))
+    except Exception:
+        return None
+
+
+def build_pixel_store(image_folder='Images', store_path=DEFAULT_STORE_PATH, processor=None,
+                      batch_size=BUILD_BATCH_SIZE, max_workers=MAX_WORKERS):
+    """Prétraiter toutes les images du dossier et écrire le stockage, renvoie le nombre d'images"""
+    if processor is None:
+        from transformers import CLIPProcessor
+        processor = CLIPProcessor.from_pretrained("openai/clip-vit-base-patch32")
+    image_processor = clip_image_processor(processor)
+
+    names = sorted(name for name in os.listdir(image_folder) if name.lower().endswith(IMAGE_EXTENSIONS))
+    pixels_path, index_path = store_files(store_path)
+    os.makedirs(os.path.dirname(pixels_path) or '.', exist_ok=True)
+
+    tmp_pixels = f"{pixels_path}.{os.getpid()}.tmp"
+    pixels = np.memmap(tmp_pixels, dtype=np.uint8, mode='w+', shape=(len(names), 3, IMAGE_SIZE, IMAGE_SIZE))
+
+    ids = []
+    failed = []
+    row = 0
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        for start in range(0, len(names), batch_size):
+            batch_names = names[start:start + batch_size]
+            paths = [os.path.join(image_folder, name) for name in batch_names]
+            images = []
+            for name, image in zip(batch_names, executor.map(load_image, paths)):
+                if image is None:
+                    failed.append(name)
+                    continue
+                images.append(image)
+                ids.append(os.path.splitext(name)[0])
+            if images:
+                pixels[row:row + len(images)] = preprocess_uint8(images, image_processor)
+                row += len(images)
+
+    pixels.flush()
+    del pixels
+    # Tronquer si des images n'ont pas pu être décodées
+    os.truncate(tmp_pixels, row * 3 * IMAGE_SIZE * IMAGE_SIZE)
+    os.replace(tmp_pixels, pixels_path)
+
+    meta = {
+        'ids': ids,
+        'image_size': IMAGE_SIZE,
+        'image_folder': os.path.abspath(image_folder),
+        'image_mean': list(image_processor.image_mean),
+        'image_std': list(image_processor.image_std),
+        'created_at': time.time()
+    }
+    tmp_index = f"{index_path}.{os.getpid()}.tmp"
+    with open(tmp_index, 'w', encoding='utf-8') as f:
+        json.dump(meta, f)
+    os.replace(tmp_index, index_path)
+
+    for name in failed:
+        logger.warning(f"⚠️ Image ignorée (décodage impossible): {name}")
+    logger.info(f"✅ {len(ids)} images prétraitées dans {pixels_path}")
+    return len(ids)
+
+
+def main():
+    """Point d'entrée en ligne de commande"""
+    logging.basicConfig(level=logging.INFO)
+    parser = argparse.ArgumentParser(description="Prétraiter les images du catalogue en un tableau uint8 memory-mappé")
+    parser.add_argument('--images', default='Images', help="Dossier des images")
+    parser.add_argument('--output', default=DEFAULT_STORE_PATH, help="Chemin du stockage (sans extension)")
+    parser.add_argument('--batch-size', type=int, default=BUILD_BATCH_SIZE)
+    parser.add_argument('--workers', type=int, default=MAX_WORKERS, help="Threads de décodage JPEG")
+    args = parser.parse_args()
+
+    if not os.path.isdir(args.images):
+        print(f"❌ Dossier non trouvé: {args.images}")
+        return 1
+
+    start = time.perf_counter()
+    count = build_pixel_store(args.images, args.output, batch_size=args.batch_size, max_workers=args.workers)
+    print(f"✅ {count} images prétraitées en {time.perf_counter() - start:.1f}s -> {store_files(args.output)[0]}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,195 @@
+#!/usr/bin/env python3
+"""
+Profilage à la demande des requêtes de scoring
+
+Désactivé par défaut. Une requête est profilée :
+- par échantillonnage : SCORING_PROFILE_RATE=0.01 profile 1 % des requêtes ;
+- à la demande : en-tête `X-Profile: 1` (serveur local), seulement si
+  SCORING_PROFILE_ON_DEMAND=true. Désactivé par défaut : sinon n'importe
+  quel appelant pourrait déclencher le profileur et des écritures disque.
+  Le corps de la requête n'est jamais pris en compte.
+
+Profileurs (SCORING_PROFILER) :
+- cprofile (défaut) : <id>.prof (pstats, snakeviz) et <id>.txt, les 40
+  fonctions les plus coûteuses en temps cumulé ;
+- torch : trace Chrome <id>.json de torch.profiler (opérateurs CPU/CUDA),
+  à ouvrir dans chrome://tracing ou Perfetto.
+
+Les captures sont écrites dans SCORING_PROFILE_DIR (défaut 'profiles'), nommées
+<horodatage>-<id de requête>, et seules les SCORING_PROFILE_MAX_FILES plus
+récentes sont conservées.
+"""
+
+import os
+import io
+import glob
+import time
+import uuid
+import random
+import logging
+import pstats
+import cProfile
+import threading
+from contextlib import contextmanager
+
+logger = logging.getLogger(__name__)
+
+PROFILE_HEADER = 'X-Profile'
+REQUEST_ID_HEADERS = ('x-ms-request-id', 'x-request-id')
+SUMMARY_LINES = 40
+
+_local = threading.local()
+
+# Une seule capture à la fois par processus (cProfile est global depuis Python 3.12)
+_capture_lock = threading.Lock()
+
+
+def settings():
+    """Configuration lue dans l'environnement (modifiable sans redéployer le code)"""
+    return {
+        'rate': float(os.getenv('SCORING_PROFILE_RATE', '0')),
+        'on_demand': os.getenv('SCORING_PROFILE_ON_DEMAND', 'false').lower() == 'true',
+        'profiler': os.getenv('SCORING_PROFILER', 'cprofile').lower(),
+        'directory': os.getenv('SCORING_PROFILE_DIR', 'profiles'),
+        'max_files': int(os.getenv('SCORING_PROFILE_MAX_FILES', '100')),
+    }
+
+
+@contextmanager
+def request_headers(headers):
+    """Rendre les en-têtes HTTP de la requête visibles par run() (serveur local)"""
+    previous = getattr(_local, 'headers', None)
+    _local.headers = {name.lower(): value for name, value in dict(headers or {}).items()}
+    try:
+        yield
+    finally:
+        _local.headers = previous
+
+
+def current_headers():
+    return getattr(_local, 'headers', None) or {}
+
+
+def _truthy(value):
+    return str(value).lower() in ('1', 'true', 'yes', 'on')
+
+
+def should_profile(config=None):
+    """La requête doit-elle être profilée ?"""
+    config = config or settings()
+    if config['on_demand'] and _truthy(current_headers().get(PROFILE_HEADER.lower(), '')):
+        return True
+    return config['rate'] > 0 and random.random() < config['rate']
+
+
+def current_request_id():
+    """Identifiant de la requête (en-tête Azure ML / proxy, sinon généré)
+
+    À appeler une seule fois par requête et à transmettre : un identifiant
+    généré change à chaque appel.
+    """
+    headers = current_headers()
+    for name in REQUEST_ID_HEADERS:
+        if headers.get(name):
+            # Utilisé dans un nom de fichier
+            return ''.join(c for c in headers[name] if c.isalnum() or c in '-_')[:64]
+    return uuid.uuid4().hex
+
+
+def rotate(directory, max_files):
+    """Ne garder que les max_files captures les plus récentes (tous fichiers d'une capture)"""
+    captures = {}
+    for path in glob.glob(os.path.join(directory, '*')):
+        captures.setdefault(os.path.splitext(os.path.basename(path))[0], []).append(path)
+    # Noms préfixés par l'horodatage : l'ordre alphabétique est chronologique
+    for stem in sorted(captures)[:max(0, len(captures) - max_files)]:
+        for path in captures[stem]:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+
+class ProfileCapture:
+    """Résultat d'une capture : fichiers écrits (vide si la requête n'est pas profilée)"""
+
+    def __init__(self, name=None):
+        self.name = name
+        self.files = []
+
+    def __bool__(self):
+        return self.name is not None
+
+
+def _write_cprofile(profiler, base_path):
+    profiler.dump_stats(base_path + '.prof')
+    summary = io.StringIO()
+    pstats.Stats(profiler, stream=summary).sort_stats('cumulative').print_stats(SUMMARY_LINES)
+    with open(base_path + '.txt', 'w', encoding='utf-8') as f:
+        f.write(summary.getvalue())
+    return [base_path + '.prof', base_path + '.txt']
+
+
+@contextmanager
+def maybe_profile(request_id=None):
+    """Profiler le bloc si la requête est échantillonnée ou le demande (en-tête)
+
+    request_id : identifiant de la requête, repris dans le nom du profil (le
+    même que celui de la capture, capture.py), sinon current_request_id().
+    """
+    config = settings()
+    if not should_profile(config) or not _capture_lock.acquire(blocking=False):
+        yield ProfileCapture()
+        return
+    try:
+        with _profile(config, request_id or current_request_id()) as capture:
+            yield capture
+    finally:
+        _capture_lock.release()
+
+
+@contextmanager
+def _profile(config, request_id):
+    now = time.time_ns()
+    timestamp = time.strftime('%Y%m%d-%H%M%S', time.localtime(now // 1_000_000_000))
+    name = f"{timestamp}-{now % 1_000_000_000:09d}-{request_id}"
+    capture = ProfileCapture(name)
+    base_path = os.path.join(config['directory'], name)
+
+    # Les fichiers sont écrits même si la requête échoue
+    if config['profiler'] == 'torch':
+        import torch
+        from torch.profiler import profile, ProfilerActivity
+        activities = [ProfilerActivity.CPU] + ([ProfilerActivity.CUDA] if torch.cuda.is_available() else [])
+        profiler = profile(activities=activities, record_shapes=True)
+        profiler.start()
+        try:
+            yield capture
+        finally:
+            profiler.stop()
+
+            def write_files():
+                profiler.export_chrome_trace(base_path + '.json')
+                return [base_path + '.json']
+            _save(capture, config, write_files)
+    else:
+        profiler = cProfile.Profile()
+        profiler.enable()
+        try:
+            yield capture
+        finally:
+            profiler.disable()
+            _save(capture, config, lambda: _write_cprofile(profiler, base_path))
+
+
+def _save(capture, config, write_files):
+    """Écrire les fichiers de la capture puis appliquer la rotation"""
+    try:
+        os.makedirs(config['directory'], exist_ok=True)
+        capture.files = write_files()
+        rotate(config['directory'], config['max_files'])
+    except Exception as e:
+        # Disque plein, dossier en lecture seule... : le profil ne doit jamais faire échouer la requête
+        logger.warning(f"⚠️ Profil de la requête non enregistré: {str(e)}")
+        return
+    logger.info(f"🔬 Requête profilée ({config['profiler']}) : {capture.files[0]}")
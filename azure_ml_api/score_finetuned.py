@@ -5,34 +5,178 @@ import numpy as np
 from PIL import Image
 import io
 import base64
-from transformers import CLIPModel, CLIPTokenizer, CLIPProcessor
+from torch import nn
+from transformers import CLIPConfig, CLIPModel, CLIPTokenizerFast, CLIPProcessor
 import pandas as pd
 from sklearn.preprocessing import LabelEncoder
 import logging
 from scipy.interpolate import griddata
-import re
-from collections import Counter
+from collections import OrderedDict
+import threading
+import uuid
+import sys
+import time
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+from model_weights import find_checkpoint, load_weights_into, skip_weight_init
+from text_processing import clean_text, extract_keywords, extract_keywords_batch
+from pixel_store import clip_image_processor, limit_image_size, normalize_pixels
+from embedding_index import DEFAULT_INDEX_PATH, EmbeddingIndex, index_files, vote
+from timing import request_timings, span
+import metrics
+import profiling
+import capture
 
 # Configuration du logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+class KeywordTokenCache:
+    """Cache LRU des tokenisations de mots-clés (chaîne normalisée -> input_ids)"""
+    
+    def __init__(self, tokenizer, max_size=4096, max_length=77):
+        self.tokenizer = tokenizer
+        self.max_size = max_size
+        self.max_length = max_length
+        self.pad_token_id = tokenizer.pad_token_id if tokenizer.pad_token_id is not None else 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+    
+    @staticmethod
+    def normalize(text):
+        """Normaliser la clé (le tokenizer CLIP met déjà tout en minuscules)"""
+        return " ".join(str(text).lower().split())
+    
+    def _lookup(self, keys):
+        """Récupérer les entrées en cache, renvoie aussi les clés manquantes"""
+        found = {}
+        missing = []
+        with self._lock:
+            for key in keys:
+                if key in found:
+                    continue
+                ids = self._entries.get(key)
+                if ids is None:
+                    if key not in missing:
+                        missing.append(key)
+                else:
+                    self._entries.move_to_end(key)
+                    found[key] = ids
+            # Compteurs mis à jour sous le même verrou que le LRU (appels concurrents)
+            hits = sum(1 for key in keys if key in found)
+            self.hits += hits
+            self.misses += len(keys) - hits
+        return found, missing
+    
+    def _store(self, entries):
+        """Ajouter des entrées en évinçant les moins récemment utilisées"""
+        with self._lock:
+            for key, ids in entries.items():
+                self._entries[key] = ids
+                self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+    
+    def encode(self, texts):
+        """Tokeniser une liste de textes, les absents du cache en un seul appel au tokenizer rapide"""
+        keys = [self.normalize(text) for text in texts]
+        found, missing = self._lookup(keys)
+        
+        if missing:
+            encoded = self.tokenizer(missing, truncation=True, max_length=self.max_length)
+            new_entries = {key: tuple(ids) for key, ids in zip(missing, encoded['input_ids'])}
+            self._store(new_entries)
+            found.update(new_entries)
+        
+        # Padding à la longueur la plus longue du batch (équivalent à padding=True)
+        sequences = [found[key] for key in keys]
+        width = max(len(ids) for ids in sequences)
+        input_ids = torch.full((len(sequences), width), self.pad_token_id, dtype=torch.long)
+        attention_mask = torch.zeros((len(sequences), width), dtype=torch.long)
+        for row, ids in enumerate(sequences):
+            input_ids[row, :len(ids)] = torch.tensor(ids, dtype=torch.long)
+            attention_mask[row, :len(ids)] = 1
+        
+        return {'input_ids': input_ids, 'attention_mask': attention_mask}
+    
+    def stats(self):
+        """Statistiques du cache"""
+        with self._lock:
+            size, hits, misses = len(self._entries), self.hits, self.misses
+        total = hits + misses
+        return {
+            'size': size,
+            'hits': hits,
+            'misses': misses,
+            'hit_ratio': hits / total if total else 0.0
+        }
+
+class CLIPForClassification(nn.Module):
+    """Modèle CLIP avec tête de classification (comme dans le notebook)"""
+    
+    def __init__(self, config, num_labels, pretrained=True):
+        super().__init__()
+        if pretrained:
+            self.clip = CLIPModel.from_pretrained("openai/clip-vit-base-patch32")
+        else:
+            # Squelette seul, sans initialisation : les poids viennent du checkpoint fine-tuné
+            with skip_weight_init():
+                self.clip = CLIPModel(config)
+        self.classifier = nn.Linear(config.projection_dim * 2, num_labels)
+        self.loss_fn = nn.CrossEntropyLoss()
+    
+    def forward(self, pixel_values, input_ids, attention_mask, labels=None):
+        outputs = self.clip(pixel_values=pixel_values, input_ids=input_ids, attention_mask=attention_mask)
+        pooled_output = torch.cat((outputs.image_embeds, outputs.text_embeds), dim=-1)
+        logits = self.classifier(pooled_output)
+        
+        loss = None
+        if labels is not None:
+            loss = self.loss_fn(logits, labels)
+        
+        return type('Output', (), {
+            'loss': loss,
+            'logits': logits,
+            'image_embeds': outputs.image_embeds,
+            'text_embeds': outputs.text_embeds
+        })()
+
 class CLIPClassifierFinetuned:
     def __init__(self):
         """Initialiser le classificateur CLIP fine-tuné"""
         self.device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
         logger.info(f"Utilisation du device: {self.device}")
         
-        # Charger le modèle CLIP de base
+        # Configuration du modèle CLIP de base (les poids ne sont chargés qu'en cas de besoin)
         self.model_name = "openai/clip-vit-base-patch32"
-        self.clip_model = CLIPModel.from_pretrained(self.model_name).to(self.device)
-        self.tokenizer = CLIPTokenizer.from_pretrained(self.model_name)
+        self.config = CLIPConfig.from_pretrained(self.model_name)
+        self.clip_model = None
+        self.checkpoint_path = None
+        self.embedding_index = None
+        
+        # Mode de classification : head (tête linéaire), knn (vote des plus proches
+        # produits étiquetés) ou hybrid (kNN seulement si la tête hésite)
+        self.classification_mode = os.getenv('CLASSIFICATION_MODE', 'head').lower()
+        self.knn_k = int(os.getenv('KNN_K', '10'))
+        self.knn_weighting = os.getenv('KNN_WEIGHTING', 'weighted')
+        self.head_confidence_threshold = float(os.getenv('HEAD_CONFIDENCE_THRESHOLD', '0.9'))
+        if self.classification_mode in ('knn', 'hybrid') and not os.path.exists(index_files(DEFAULT_INDEX_PATH)['meta']):
+            # Sans index, chaque requête échouerait : repli sur la tête de classification
+            logger.warning(f"⚠️ CLASSIFICATION_MODE={self.classification_mode} sans index d'embeddings "
+                           f"({DEFAULT_INDEX_PATH}, python azure_ml_api/embedding_index.py) : mode 'head' utilisé")
+            self.classification_mode = 'head'
+        self.tokenizer = CLIPTokenizerFast.from_pretrained(self.model_name)
         self.processor = CLIPProcessor.from_pretrained(self.model_name)
         
-        # Charger le modèle fine-tuné
-        self.load_finetuned_model()
+        # Cache des tokenisations de mots-clés (très répétitives dans le catalogue)
+        self.token_cache = KeywordTokenCache(
+            self.tokenizer,
+            max_size=int(os.getenv('TOKENIZER_CACHE_SIZE', '4096'))
+        )
         
-        # Catégories disponibles
+        # Catégories disponibles (nécessaires pour dimensionner la tête de classification)
         self.categories = [
             'Baby Care', 'Beauty and Personal Care', 'Computers',
             'Home Decor & Festive Needs', 'Home Furnishing',
@@ -43,333 +187,239 @@ class CLIPClassifierFinetuned:
         self.label_encoder = LabelEncoder()
         self.label_encoder.fit(self.categories)
         
+        # Charger le modèle fine-tuné
+        self.load_finetuned_model()
+        
         logger.info("✅ Modèle CLIP fine-tuné chargé avec succès")
     
+    def load_base_model(self):
+        """Charger le modèle CLIP de base (fallback)"""
+        if self.clip_model is None:
+            self.clip_model = CLIPModel.from_pretrained(self.model_name).to(self.device)
+            self.clip_model.eval()
+        return self.clip_model
+    
     def load_finetuned_model(self):
         """Charger le modèle fine-tuné"""
         try:
-            # Chemin vers le modèle fine-tuné
-            model_path = "/var/azureml-app/new_clip_product_classifier.pth"
+            # Chemin vers le modèle fine-tuné (le .safetensors voisin est prioritaire)
+            model_path = os.getenv('FINETUNED_MODEL_PATH', "/var/azureml-app/new_clip_product_classifier.pth")
+            checkpoint_path = find_checkpoint(model_path)
             
-            if os.path.exists(model_path):
-                # Charger le state_dict du modèle fine-tuné
-                state_dict = torch.load(model_path, map_location=self.device)
-                
-                # Créer le modèle avec la classification head
-                from torch import nn
-                
-                class CLIPForClassification(nn.Module):
-                    def __init__(self, config, num_labels):
-                        super().__init__()
-                        self.clip = CLIPModel.from_pretrained("openai/clip-vit-base-patch32")
-                        self.classifier = nn.Linear(config.projection_dim * 2, num_labels)
-                        self.loss_fn = nn.CrossEntropyLoss()
-                    
-                    def forward(self, pixel_values, input_ids, attention_mask, labels=None):
-                        outputs = self.clip(pixel_values=pixel_values, input_ids=input_ids, attention_mask=attention_mask)
-                        pooled_output = torch.cat((outputs.image_embeds, outputs.text_embeds), dim=-1)
-                        logits = self.classifier(pooled_output)
-                        
-                        loss = None
-                        if labels is not None:
-                            loss = self.loss_fn(logits, labels)
-                        
-                        return type('Output', (), {
-                            'loss': loss,
-                            'logits': logits,
-                            'image_embeds': outputs.image_embeds,
-                            'text_embeds': outputs.text_embeds
-                        })()
-                
-                # Créer le modèle avec classification head
-                config = self.clip_model.config
-                self.model = CLIPForClassification(config, num_labels=len(self.categories)).to(self.device)
+            if checkpoint_path:
+                # Créer le modèle avec classification head, sans télécharger les poids de base
+                self.model = CLIPForClassification(self.config, num_labels=len(self.categories), pretrained=False)
                 
-                # Charger les poids fine-tunés
-                self.model.load_state_dict(state_dict)
+                # Charger les poids fine-tunés (memory-mapping pour le format safetensors)
+                load_weights_into(self.model, checkpoint_path, device=self.device)
+                self.model.to(self.device)
                 self.model.eval()
+                self.checkpoint_path = checkpoint_path
                 
-                logger.info("✅ Modèle fine-tuné chargé avec succès")
+                logger.info(f"✅ Modèle fine-tuné chargé avec succès depuis {checkpoint_path}")
             else:
                 logger.warning("⚠️ Modèle fine-tuné non trouvé, utilisation du modèle de base")
-                self.model = self.clip_model
+                self.model = self.load_base_model()
                 
         except Exception as e:
             logger.error(f"❌ Erreur lors du chargement du modèle fine-tuné: {str(e)}")
-            self.model = self.clip_model
+            self.model = self.load_base_model()
     
     def clean_text(self, text):
         """Nettoyer le texte comme dans le notebook"""
-        if not isinstance(text, str):
-            return ""
-        text = text.lower()
-        all_patterns = [
-            # Transformation des motifs comme iphone4s en iphone s
-            (r'([a-zA-Z]+)(\d+)([a-zA-Z])', r'\1 \3'),
-            # Abréviations d'indice solaire
-            (r'\bpa\+{1,3}\b', 'sun protection factor'),
-            # Symboles indésirables
-            (r'[@*/±&%#]', ' '),  # Supprime @, *, /, ±, &, %, #
-            # Codes alphanumériques non pertinents (ex. ms004pktbl, r&m0179)
-            (r'\b[A-Z0-9]+[-_][A-Z0-9]+\b', ' '),
-            # Nombres seuls
-            (r'\b\d+\b', ' '),
-            # Ponctuation spécifique
-            (r'\(', ' ( '),
-            (r'\)', ' ) '),
-            (r'\.', ' . '),
-            (r'\!', ' ! '),
-            (r'\?', ' ? '),
-            (r'\:', ' : '),
-            (r'\,', ', '),
-            # Motifs spécifiques du domaine
-            (r'\b(\d+)\s*[-~to]?\s*(\d+)\s*(m|mth|mths|month|months?)\b', 'month'),
-            (r'\bnewborn\s*[-~to]?\s*(\d+)\s*(m|mth|months?)\b', 'month'),
-            (r'\b(nb|newborn|baby|bb|bby|babie|babies)\b', 'baby'),
-            (r'\b(diaper|diapr|nappy)\b', 'diaper'),
-            (r'\b(stroller|pram|buggy)\b', 'stroller'),
-            (r'\b(bpa\s*free|non\s*bpa)\b', 'bisphenol a free'),
-            (r'\b(\d+)\s*(oz|ounce)\b', 'ounce'),
-            (r'\b(rtx\s*\d+)\b', 'ray tracing graphics'),
-            (r'\b(gtx\s*\d+)\b', 'geforce graphics'),
-            (r'\bnvidia\b', 'nvidia'),
-            (r'\b(amd\s*radeon\s*rx\s*\d+)\b', 'amd radeon graphics'),
-            (r'\b(intel\s*(core|xeon)\s*[i\d-]+)\b', 'intel processor'),
-            (r'\b(amd\s*ryzen\s*[\d]+)\b', 'amd ryzen processor'),
-            (r'\bssd\b', 'solid state drive'),
-            (r'\bhdd\b', 'hard disk drive'),
-            (r'\bwifi\s*([0-9])\b', 'wi-fi standard'),
-            (r'\bbluetooth\s*(\d\.\d)\b', 'bluetooth version'),
-            (r'\bethernet\b', 'ethernet'),
-            (r'\bfhd\b', 'full high definition'),
-            (r'\buhd\b', 'ultra high definition'),
-            (r'\bqhd\b', 'quad high definition'),
-            (r'\boled\b', 'organic light emitting diode'),
-            (r'\bips\b', 'in-plane switching'),
-            (r'\bram\b', 'random access memory'),
-            (r'\bcpu\b', 'central processing unit'),
-            (r'\bgpu\b', 'graphics processing unit'),
-            (r'\bhdmi\b', 'high definition multimedia interface'),
-            (r'\busb\s*([a-z0-9]*)\b', 'universal serial bus'),
-            (r'\brgb\b', 'red green blue'),
-            (r'\bfridge\b', 'refrigerator'),
-            (r'\bwashing\s*machine\b', 'clothes washer'),
-            (r'\bdishwasher\b', 'dish washing machine'),
-            (r'\boven\b', 'cooking oven'),
-            (r'\bmicrowave\b', 'microwave oven'),
-            (r'\bhoover\b', 'vacuum cleaner'),
-            (r'\btumble\s*dryer\b', 'clothes dryer'),
-            (r'\b(a\+\++)\b', 'energy efficiency class'),
-            (r'\b(\d+)\s*btu\b', 'british thermal unit'),
-            (r'\bpoly\b', 'polyester'),
-            (r'\bacrylic\b', 'acrylic fiber'),
-            (r'\bnylon\b', 'nylon fiber'),
-            (r'\bspandex\b', 'spandex fiber'),
-            (r'\blycra\b', 'lycra fiber'),
-            (r'\bpvc\b', 'polyvinyl chloride'),
-            (r'\bvinyl\b', 'vinyl material'),
-            (r'\bstainless\s*steel\b', 'stainless steel'),
-            (r'\baluminum\b', 'aluminum metal'),
-            (r'\bplexiglass\b', 'acrylic glass'),
-            (r'\bpu\s*leather\b', 'polyurethane leather'),
-            (r'\bsynthetic\s*leather\b', 'synthetic leather'),
-            (r'\bfaux\s*leather\b', 'faux leather'),
-            (r'\bwaterproof\b', 'water resistant'),
-            (r'\bbreathable\b', 'air permeable'),
-            (r'\bwrinkle-free\b', 'wrinkle resistant'),
-            (r'\bSPF\b', 'sun protection factor'),
-            (r'\bUV\b', 'ultraviolet'),
-            (r'\bBB\s*cream\b', 'blemish balm cream'),
-            (r'\bCC\s*cream\b', 'color correcting cream'),
-            (r'\bHA\b', 'hyaluronic acid'),
-            (r'\bAHA\b', 'alpha hydroxy acid'),
-            (r'\bBHA\b', 'beta hydroxy acid'),
-            (r'\bPHA\b', 'polyhydroxy acid'),
-            (r'\bNMF\b', 'natural moisturizing factor'),
-            (r'\bEGF\b', 'epidermal growth factor'),
-            (r'\bVit\s*C\b', 'vitamin c'),
-            (r'\bVit\s*E\b', 'vitamin e'),
-            (r'\bVit\s*B3\b', 'niacinamide vitamin b3'),
-            (r'\bVit\s*B5\b', 'panthenol vitamin b5'),
-            (r'\bSOD\b', 'superoxide dismutase'),
-            (r'\bQ10\b', 'coenzyme q10'),
-            (r'\bFoam\s*cl\b', 'foam cleanser'),
-            (r'\bMic\s*H2O\b', 'micellar water'),
-            (r'\bToner\b', 'skin toner'),
-            (r'\bEssence\b', 'skin essence'),
-            (r'\bAmpoule\b', 'concentrated serum'),
-            (r'\bCF\b', 'cruelty free'),
-            (r'\bPF\b', 'paraben free'),
-            (r'\bSF\b', 'sulfate free'),
-            (r'\bGF\b', 'gluten free'),
-            (r'\bHF\b', 'hypoallergenic formula'),
-            (r'\bNT\b', 'non-comedogenic tested'),
-            (r'\bAM\b', 'morning'),
-            (r'\bPM\b', 'night'),
-            (r'\bBID\b', 'twice daily'),
-            (r'\bQD\b', 'once daily'),
-            (r'\bAIR\b', 'airless pump bottle'),
-            (r'\bD-C\b', 'dropper container'),
-            (r'\bT-C\b', 'tube container'),
-            (r'\bPDO\b', 'polydioxanone'),
-            (r'\bPCL\b', 'polycaprolactone'),
-            (r'\bPLLA\b', 'poly-l-lactic acid'),
-            (r'\bHIFU\b', 'high-intensity focused ultrasound'),
-            (r'\b(\d+)\s*fl\s*oz\b', 'fluid ounce'),
-            (r'\bpH\s*bal\b', 'ph balanced'),
-            (r'\b(\d+)\s*(gb|tb|mb|go|to|mo)\b', 'byte'),
-            (r'\boctet\b', 'byte'),
-            (r'\b(\d+)\s*y\b', 'year'),
-            (r'\b(\d+)\s*mth\b', 'month'),
-            (r'\b(\d+)\s*d\b', 'day'),
-            (r'\b(\d+)\s*h\b', 'hour'),
-            (r'\b(\d+)\s*min\b', 'minute'),
-            (r'\b(\d+)\s*rpm\b', 'revolution per minute'),
-            (r'\b(\d+)\s*(mw|cw|kw)\b', 'watt'),
-            (r'\b(\d+)\s*(ma|ca|ka)\b', 'ampere'),
-            (r'\b(\d+)\s*(mv|cv|kv)\b', 'volt'),
-            (r'\b(\d+)\s*(mm|cm|m|km)\b', 'meter'),
-            (r'\binch\b', 'meter'),
-            (r'\b(\d+)\s*(ml|cl|dl|l|oz|gal)\b', 'liter'),
-            (r'\b(gallon|ounce)\b', 'liter'),
-            (r'\b(\d+)\s*(mg|cg|dg|g|kg|lb)\b', 'gram'),
-            (r'\bpound\b', 'gram'),
-            (r'\b(\d+)\s*(°c|°f)\b', 'celsius'),
-            (r'\bfahrenheit\b', 'celsius'),
-            (r'\bflipkart\.com\b', ''),
-            (r'\bapprox\.?\b', 'approximately'),
-            (r'\bw/o\b', 'without'),
-            (r'\bw/\b', 'with'),
-            (r'\bant-\b', 'anti'),
-            (r'\byes\b', ''),
-            (r'\bno\b', ''),
-            (r'\bna\b', ''),
-            (r'\brs\.?\b', ''),
-            # Normaliser les espaces
-            (r'\s+', ' '),
-        ]
-        # Apply patterns twice to ensure complete replacement
-        for _ in range(2):
-            for pattern, replacement in all_patterns:
-                text = re.sub(pattern, replacement, text, flags=re.IGNORECASE)
-        return text.strip()
+        return clean_text(text)
     
     def extract_keywords(self, text, top_n=15):
         """Extraire les mots-clés comme dans le notebook"""
-        if not text:
-            return []
-        
-        # Nettoyer le texte
-        text = self.clean_text(text)
+        return extract_keywords(text, top_n)
+    
+    def extract_keywords_batch(self, texts, top_n=15):
+        """Mots-clés d'un batch de textes (textes répétés traités une fois, sans pool dans le service)"""
+        return extract_keywords_batch(texts, top_n, workers=1)
+    
+    def tokenize_keywords(self, texts):
+        """Tokeniser des chaînes de mots-clés via le cache LRU"""
+        encoded = self.token_cache.encode(texts)
+        return {name: tensor.to(self.device) for name, tensor in encoded.items()}
+    
+    def prepare_image(self, image):
+        """Convertir en RVB et limiter l'image à 224 px avant le processeur CLIP"""
+        return limit_image_size(image)
+    
+    def forward_batch(self, pixel_values, keywords_texts):
+        """Passe avant unique : probabilités de la tête et embeddings normalisés du batch"""
+        with span('tokenize'):
+            text_inputs = self.tokenize_keywords(keywords_texts)
         
-        # Simple keyword extraction without spaCy
-        stopwords = {
-            'a', 'an', 'and', 'are', 'as', 'at', 'be', 'by', 'for', 'from',
-            'has', 'he', 'in', 'is', 'it', 'its', 'of', 'on', 'that', 'the',
-            'to', 'was', 'will', 'with', 'this', 'these', 'they', 'them',
-            'their', 'there', 'then', 'than', 'or', 'but', 'if', 'when',
-            'where', 'why', 'how', 'all', 'any', 'both', 'each', 'few',
-            'more', 'most', 'other', 'some', 'such', 'no', 'nor', 'not',
-            'only', 'own', 'same', 'so', 'than', 'too', 'very', 'can',
-            'could', 'should', 'would', 'may', 'might', 'must', 'shall'
+        with span('forward'), torch.no_grad():
+            if hasattr(self.model, 'classifier'):
+                # Modèle fine-tuné avec classification head
+                outputs = self.model(
+                    pixel_values=pixel_values,
+                    input_ids=text_inputs['input_ids'],
+                    attention_mask=text_inputs['attention_mask']
+                )
+                logits = outputs.logits
+            else:
+                # Modèle de base CLIP
+                outputs = self.model(
+                    pixel_values=pixel_values,
+                    input_ids=text_inputs['input_ids'],
+                    attention_mask=text_inputs['attention_mask']
+                )
+                # Calculer les similarités avec les catégories
+                image_features = outputs.image_embeds
+                
+                # Créer des embeddings pour chaque catégorie
+                category_embeddings = []
+                for category in self.categories:
+                    cat_inputs = self.tokenizer(category, return_tensors="pt", padding=True, truncation=True, max_length=77).to(self.device)
+                    cat_outputs = self.model.get_text_features(**cat_inputs)
+                    category_embeddings.append(cat_outputs)
+                
+                category_embeddings = torch.cat(category_embeddings, dim=0)
+                
+                # Calculer les similarités
+                image_features = image_features / image_features.norm(dim=-1, keepdim=True)
+                category_embeddings = category_embeddings / category_embeddings.norm(dim=-1, keepdim=True)
+                
+                logits = (image_features @ category_embeddings.T) / 0.07
+            
+            # Appliquer softmax pour obtenir les probabilités
+            probs = torch.softmax(logits, dim=-1).cpu().numpy()
+        return probs, outputs.image_embeds.cpu().numpy(), outputs.text_embeds.cpu().numpy()
+    
+    def classify(self, pixel_values, keywords_texts):
+        """Probabilités des catégories pour un batch (pixels normalisés, mots-clés joints par ', ')"""
+        return self.forward_batch(pixel_values, keywords_texts)[0]
+    
+    def get_embedding_index(self):
+        """Index d'embeddings du catalogue, chargé à la première utilisation"""
+        if self.embedding_index is None:
+            # python azure_ml_api/embedding_index.py pour le créer
+            self.embedding_index = EmbeddingIndex()
+        return self.embedding_index
+    
+    def score_batch(self, pixel_values, keywords_texts):
+        """Scores par catégorie selon le mode de classification : [(category_scores, méthode)]"""
+        metrics.BATCH_SIZE.observe(len(keywords_texts))
+        head_probs, image_embeds, text_embeds = self.forward_batch(pixel_values, keywords_texts)
+        results = []
+        for probs, image_embed, text_embed in zip(head_probs, image_embeds, text_embeds):
+            head_scores = {category: float(prob) for category, prob in zip(self.categories, probs)}
+            # hybrid : la recherche kNN est sautée quand la tête est assez confiante
+            if self.classification_mode == 'head' or (
+                    self.classification_mode == 'hybrid' and max(head_scores.values()) >= self.head_confidence_threshold):
+                results.append((head_scores, 'head'))
+                continue
+            with span('knn'):
+                neighbours = self.get_embedding_index().labelled_neighbours(image_embed, text_embed, self.knn_k)
+                knn_scores = vote(neighbours, self.knn_weighting)
+            # Aucun voisin étiqueté (index non étiqueté) : scores de la tête
+            results.append((knn_scores, 'knn') if knn_scores else (head_scores, 'head'))
+        return results
+    
+    def format_prediction(self, category_scores, keywords, method='head'):
+        """Résultat de prédiction à partir des scores par catégorie d'un produit"""
+        predicted_category = max(category_scores, key=category_scores.get)
+        return {
+            'predicted_category': predicted_category,
+            'confidence': float(category_scores[predicted_category]),
+            'category_scores': category_scores,
+            'keywords': keywords,
+            'method': method
         }
-        
-        # Clean and tokenize text
-        text = re.sub(r'[^\w\s]', ' ', text.lower())
-        words = text.split()
-        
-        # Filter out stopwords and short words
-        keywords = [word for word in words if len(word) > 2 and word not in stopwords]
-        
-        # Count and return top keywords
-        word_counts = Counter(keywords)
-        return [word for word, count in word_counts.most_common(top_n)]
     
     def predict_category(self, image, text_description):
         """Prédire la catégorie d'un produit"""
         try:
             # Extraire les mots-clés
-            keywords = self.extract_keywords(text_description)
-            keywords_text = ", ".join(keywords)
+            with span('extract_keywords'):
+                keywords = self.extract_keywords(text_description)
             
             # Prétraiter l'image
-            if image.mode != 'RGB':
-                image = image.convert('RGB')
+            with span('preprocess_image'):
+                image = self.prepare_image(image)
+                image_inputs = self.processor(images=image, return_tensors="pt").to(self.device)
             
-            # Redimensionner l'image si nécessaire
-            max_size = 224
-            if max(image.size) > max_size:
-                ratio = max_size / max(image.size)
-                new_size = (int(image.size[0] * ratio), int(image.size[1] * ratio))
-                image = image.resize(new_size, Image.LANCZOS)
-            
-            # Prétraiter les entrées
-            image_inputs = self.processor(images=image, return_tensors="pt").to(self.device)
-            text_inputs = self.tokenizer(keywords_text, return_tensors="pt", padding=True, truncation=True, max_length=77).to(self.device)
-            
-            # Prédiction
-            with torch.no_grad():
-                if hasattr(self.model, 'classifier'):
-                    # Modèle fine-tuné avec classification head
-                    outputs = self.model(
-                        pixel_values=image_inputs.pixel_values,
-                        input_ids=text_inputs.input_ids,
-                        attention_mask=text_inputs.attention_mask
-                    )
-                    logits = outputs.logits
-                else:
-                    # Modèle de base CLIP
-                    outputs = self.model(
-                        pixel_values=image_inputs.pixel_values,
-                        input_ids=text_inputs.input_ids,
-                        attention_mask=text_inputs.attention_mask
-                    )
-                    # Calculer les similarités avec les catégories
-                    image_features = outputs.image_embeds
-                    text_features = outputs.text_embeds
-                    
-                    # Créer des embeddings pour chaque catégorie
-                    category_embeddings = []
-                    for category in self.categories:
-                        cat_inputs = self.tokenizer(category, return_tensors="pt", padding=True, truncation=True, max_length=77).to(self.device)
-                        cat_outputs = self.model.get_text_features(**cat_inputs)
-                        category_embeddings.append(cat_outputs)
-                    
-                    category_embeddings = torch.cat(category_embeddings, dim=0)
-                    
-                    # Calculer les similarités
-                    image_features = image_features / image_features.norm(dim=-1, keepdim=True)
-                    category_embeddings = category_embeddings / category_embeddings.norm(dim=-1, keepdim=True)
-                    
-                    logits = (image_features @ category_embeddings.T) / 0.07
-                
-                # Appliquer softmax pour obtenir les probabilités
-                probs = torch.softmax(logits, dim=-1).cpu().numpy()[0]
-                
-                # Obtenir la prédiction
-                predicted_idx = np.argmax(probs)
-                predicted_category = self.categories[predicted_idx]
-                confidence = probs[predicted_idx]
-                
-                # Créer les scores de catégories
-                category_scores = {category: float(prob) for category, prob in zip(self.categories, probs)}
-                
-                return {
-                    'predicted_category': predicted_category,
-                    'confidence': float(confidence),
-                    'category_scores': category_scores,
-                    'keywords': keywords
-                }
+            # Prédiction (tête, kNN ou hybride selon CLASSIFICATION_MODE)
+            category_scores, method = self.score_batch(image_inputs.pixel_values, [", ".join(keywords)])[0]
+            return self.format_prediction(category_scores, keywords, method)
                 
         except Exception as e:
             logger.error(f"❌ Erreur lors de la prédiction: {str(e)}")
             raise e
     
+    def predict_pixel_batch(self, pixels, text_descriptions):
+        """Prédire un batch d'images déjà prétraitées (uint8 N×3×224×224, ex. PixelStore)"""
+        keywords_list = self.extract_keywords_batch(text_descriptions)
+        pixel_values = normalize_pixels(pixels, clip_image_processor(self.processor), self.device)
+        scored = self.score_batch(pixel_values, [", ".join(keywords) for keywords in keywords_list])
+        return [self.format_prediction(scores, keywords, method)
+                for (scores, method), keywords in zip(scored, keywords_list)]
+    
+    def add_labelled(self, image, text_description, label, uniq_id=None):
+        """Ajouter un produit étiqueté à l'index kNN (nouvelle catégorie possible, sans réentraînement)"""
+        keywords = self.extract_keywords(text_description)
+        image_inputs = self.processor(images=self.prepare_image(image), return_tensors="pt").to(self.device)
+        _, image_embeds, text_embeds = self.forward_batch(image_inputs.pixel_values, [", ".join(keywords)])
+        uniq_id = uniq_id or uuid.uuid4().hex
+        self.get_embedding_index().add_items([uniq_id], image_embeds, text_embeds, [label])
+        return uniq_id
+    
+    def backbone(self):
+        """Modèle CLIP sous-jacent (celui du modèle fine-tuné ou le modèle de base)"""
+        return self.model.clip if hasattr(self.model, 'clip') else self.model
+    
+    def embed_pixel_batch(self, pixels, text_descriptions):
+        """Embeddings image et texte normalisés d'un batch uint8 N×3×224×224 (numpy float32)"""
+        keywords_texts = [", ".join(keywords) for keywords in self.extract_keywords_batch(text_descriptions)]
+        pixel_values = normalize_pixels(pixels, clip_image_processor(self.processor), self.device)
+        text_inputs = self.tokenize_keywords(keywords_texts)
+        with torch.no_grad():
+            outputs = self.backbone()(
+                pixel_values=pixel_values,
+                input_ids=text_inputs['input_ids'],
+                attention_mask=text_inputs['attention_mask']
+            )
+        return outputs.image_embeds.cpu().numpy(), outputs.text_embeds.cpu().numpy()
+    
+    def embed_image(self, image):
+        """Embedding normalisé d'une image PIL"""
+        image_inputs = self.processor(images=self.prepare_image(image), return_tensors="pt").to(self.device)
+        with torch.no_grad():
+            features = self.backbone().get_image_features(pixel_values=image_inputs.pixel_values)
+        features = features / features.norm(dim=-1, keepdim=True)
+        return features[0].cpu().numpy()
+    
+    def embed_text(self, text_description):
+        """Embedding normalisé des mots-clés d'une description"""
+        text_inputs = self.tokenize_keywords([", ".join(self.extract_keywords(text_description))])
+        with torch.no_grad():
+            features = self.backbone().get_text_features(**text_inputs)
+        features = features / features.norm(dim=-1, keepdim=True)
+        return features[0].cpu().numpy()
+    
+    def find_similar(self, image=None, text=None, k=5):
+        """Produits du catalogue les plus proches d'une image et/ou d'une description"""
+        if image is None and text is None:
+            raise ValueError("Une image ou un texte est nécessaire")
+        index = self.get_embedding_index()
+        
+        if image is not None and text is not None:
+            results = index.search_combined(self.embed_image(image), self.embed_text(text), k)
+        elif image is not None:
+            results = index.search(self.embed_image(image), k, modality='image')
+        else:
+            results = index.search(self.embed_text(text), k, modality='text')
+        return [{'uniq_id': uniq_id, 'score': score} for uniq_id, score in results]
+    
     def generate_attention_heatmap(self, image, text_description, resolution=50):
         """Générer une heatmap d'attention comme dans le notebook"""
         try:
             # Extraire les mots-clés
-            keywords = self.extract_keywords(text_description)
+            with span('extract_keywords'):
+                keywords = self.extract_keywords(text_description)
             
             if not keywords:
                 return None
@@ -415,9 +465,9 @@ class CLIPClassifierFinetuned:
                         batch_positions.append((x_pos, y_pos))
                 
                 if batch_patches:
-                    with torch.no_grad():
+                    with span('patch_features'), torch.no_grad():
                         inputs = self.processor(images=batch_patches, return_tensors="pt").pixel_values.to(self.device)
-                        features = self.model.get_image_features(pixel_values=inputs)
+                        features = self.backbone().get_image_features(pixel_values=inputs)
                         patch_features.append(features)
                     positions.extend(batch_positions)
             
@@ -428,9 +478,9 @@ class CLIPClassifierFinetuned:
             patch_features = patch_features / patch_features.norm(dim=-1, keepdim=True)
             
             # Calculer les similarités avec les mots-clés
-            with torch.no_grad():
-                text_inputs = self.tokenizer(keywords, return_tensors="pt", padding=True, truncation=True, max_length=77).to(self.device)
-                text_features = self.model.get_text_features(**text_inputs)
+            with span('text_features'), torch.no_grad():
+                text_inputs = self.tokenize_keywords(keywords)
+                text_features = self.backbone().get_text_features(**text_inputs)
                 text_features = text_features / text_features.norm(dim=-1, keepdim=True)
                 attention_scores = (patch_features @ text_features.T).cpu().numpy()
             
@@ -441,13 +491,14 @@ class CLIPClassifierFinetuned:
                 np.linspace(0, img_height, img_height)
             )
             
-            smooth_heatmap = griddata(
-                points, 
-                attention_scores.mean(axis=1), 
-                (grid_x, grid_y), 
-                method='cubic', 
-                fill_value=0
-            )
+            with span('griddata'):
+                smooth_heatmap = griddata(
+                    points, 
+                    attention_scores.mean(axis=1), 
+                    (grid_x, grid_y), 
+                    method='cubic', 
+                    fill_value=0
+                )
             
             # Normaliser la heatmap
             smooth_heatmap = (smooth_heatmap - smooth_heatmap.min()) / (smooth_heatmap.max() - smooth_heatmap.min() + 1e-8)
@@ -466,41 +517,100 @@ class CLIPClassifierFinetuned:
 # Instance globale du classificateur
 classifier = None
 
+# Renvoyer les durées par étape dans chaque réponse (sinon seulement sur demande)
+RETURN_TIMINGS = os.getenv('SCORING_TIMINGS', 'false').lower() == 'true'
+
+def collect_cache_metrics():
+    """Recopier les statistiques du cache de tokenisation dans les métriques"""
+    if classifier is not None:
+        stats = classifier.token_cache.stats()
+        metrics.CACHE_HITS.set_total(stats['hits'], cache='tokens')
+        metrics.CACHE_MISSES.set_total(stats['misses'], cache='tokens')
+
+metrics.REGISTRY.register_collector(collect_cache_metrics)
+
 def init():
     """Initialiser le modèle"""
     global classifier
+    start = time.perf_counter()
     classifier = CLIPClassifierFinetuned()
+    metrics.MODEL_LOAD_SECONDS.set(time.perf_counter() - start)
 
 def run(raw_data):
     """Fonction principale pour l'inférence"""
+    # Un seul identifiant par requête : la capture et le profil peuvent être rapprochés
+    request_id = profiling.current_request_id()
+    with request_timings() as timings:
+        response = score_request(raw_data, timings, request_id)
+        with span('serialize'):
+            body = json.dumps(response)
+    logger.info(f"⏱️ Requête {response['status']} en {timings.summary()}")
+    record_request_metrics(response['status'], timings)
+    # Échantillon des requêtes pour le rejeu (SCORING_CAPTURE_RATE, voir capture.py)
+    capture.maybe_capture(raw_data, response['status'], timings, request_id=request_id)
+    return body
+
+def record_request_metrics(status, timings):
+    """Compteur par statut et histogrammes de durée (requête et étapes)"""
+    metrics.REQUESTS.inc(status=status)
+    metrics.REQUEST_SECONDS.observe(timings.total_ns / 1e9, status=status)
+    for stage, ns in timings.spans.items():
+        metrics.STAGE_SECONDS.observe(ns / 1e9, stage=stage)
+
+def score_request(raw_data, timings, request_id=None):
+    """Traiter une requête de scoring, renvoie la réponse (dict)"""
     try:
         # Parser les données d'entrée
-        data = json.loads(raw_data)
+        with span('parse_json'):
+            data = json.loads(raw_data)
+        
+        # Profilage échantillonné ou demandé (voir profiling.py)
+        with profiling.maybe_profile(request_id) as profile:
+            response = predict_request(data, timings)
+        # Pas d'identifiant si les fichiers du profil n'ont pas pu être écrits
+        if profile.files:
+            response['profile_id'] = profile.name
+        return response
         
-        # Décoder l'image
+    except Exception as e:
+        logger.error(f"❌ Erreur lors de l'inférence: {str(e)}")
+        return {
+            'status': 'error',
+            'error': str(e)
+        }
+
+def predict_request(data, timings):
+    """Prédiction et heatmap pour une requête décodée"""
+    try:
+        # Décoder l'image (chargement des pixels forcé pour mesurer le décodage JPEG)
         image_base64 = data.get('image', '')
         if not image_base64:
-            return json.dumps({
+            return {
                 'status': 'error',
                 'error': 'Image manquante'
-            })
+            }
         
-        image_bytes = base64.b64decode(image_base64)
-        image = Image.open(io.BytesIO(image_bytes))
+        with span('decode_base64'):
+            image_bytes = base64.b64decode(image_base64)
+        with span('open_image'):
+            image = Image.open(io.BytesIO(image_bytes))
+            image.load()
         
         # Obtenir la description textuelle
         text_description = data.get('text', '')
         if not text_description:
-            return json.dumps({
+            return {
                 'status': 'error',
                 'error': 'Description textuelle manquante'
-            })
+            }
         
         # Prédiction
-        result = classifier.predict_category(image, text_description)
+        with span('predict_category'):
+            result = classifier.predict_category(image, text_description)
         
         # Générer la heatmap d'attention
-        heatmap_result = classifier.generate_attention_heatmap(image, text_description)
+        with span('attention_heatmap'):
+            heatmap_result = classifier.generate_attention_heatmap(image, text_description)
         
         # Préparer la réponse
         response = {
@@ -508,22 +618,29 @@ def run(raw_data):
             'predicted_category': result['predicted_category'],
             'confidence': result['confidence'],
             'category_scores': result['category_scores'],
-            'keywords': result['keywords']
+            'keywords': result['keywords'],
+            'method': result['method']
         }
         
         # Ajouter la heatmap si disponible
         if heatmap_result:
-            response['attention_heatmap'] = {
-                'heatmap': heatmap_result['heatmap'].tolist(),
-                'keywords': heatmap_result['keywords'],
-                'attention_scores': heatmap_result['attention_scores'].tolist()
-            }
+            with span('serialize'):
+                response['attention_heatmap'] = {
+                    'heatmap': heatmap_result['heatmap'].tolist(),
+                    'keywords': heatmap_result['keywords'],
+                    'attention_scores': heatmap_result['attention_scores'].tolist()
+                }
         
-        return json.dumps(response)
+        # Durées par étape dans la réponse (SCORING_TIMINGS=true ou "timings": true dans la requête),
+        # arrêtées avant la sérialisation JSON finale qui n'apparaît que dans les logs
+        if RETURN_TIMINGS or data.get('timings'):
+            response['timings'] = timings.as_ms()
+        
+        return response
         
     except Exception as e:
         logger.error(f"❌ Erreur lors de l'inférence: {str(e)}")
-        return json.dumps({
+        return {
             'status': 'error',
             'error': str(e)
-        })
+        }
@@ -0,0 +1,420 @@
+#!/usr/bin/env python3
+"""
+Nettoyage de texte et extraction de mots-clés (logique du notebook)
+
+Partagé par le script de scoring et par le calcul des fréquences de mots-clés
+(build_keyword_frequencies.py) pour que les deux produisent les mêmes mots-clés.
+clean_text_batch et extract_keywords_batch traitent une colonne entière
+(Series ou liste) : chaque texte distinct n'est traité qu'une fois, et les
+gros volumes sont répartis sur un pool de processus.
+
+Les règles de CLEAN_TEXT_RULES s'appliquent dans l'ordre, en deux passes. Les
+règles littérales (\\bmot\\b, alternatives de mots, mots séparés par \\s*)
+sont regroupées en étapes : chaque étape est un trie de mots qui fait tous
+ses remplacements en un seul parcours gauche-droite du texte découpé en
+mots, au lieu d'une recherche par expression régulière. Les autres règles
+(nombres, unités, ponctuation) restent des expressions régulières, à leur
+place dans l'ordre. Une règle littérale n'est ajoutée à l'étape courante que
+si elle ne peut pas interagir avec les règles déjà regroupées (mots communs,
+mot produit par un remplacement précédent) : le résultat est identique à
+l'application règle par règle (clean_text_regex), vérifié sur tout le
+catalogue par test_text_processing.py.
+"""
+
+import os
+import re
+from functools import partial
+from collections import Counter
+from multiprocessing import Pool
+import pandas as pd
+
+CLEAN_TEXT_RULES = [
+    # Transformation des motifs comme iphone4s en iphone s
+    (r'([a-zA-Z]+)(\d+)([a-zA-Z])', r'\1 \3'),
+    # Abréviations d'indice solaire
+    (r'\bpa\+{1,3}\b', 'sun protection factor'),
+    # Symboles indésirables
+    (r'[@*/±&%#]', ' '),  # Supprime @, *, /, ±, &, %, #
+    # Codes alphanumériques non pertinents (ex. ms004pktbl, r&m0179)
+    (r'\b[A-Z0-9]+[-_][A-Z0-9]+\b', ' '),
+    # Nombres seuls
+    (r'\b\d+\b', ' '),
+    # Ponctuation spécifique
+    (r'\(', ' ( '),
+    (r'\)', ' ) '),
+    (r'\.', ' . '),
+    (r'\!', ' ! '),
+    (r'\?', ' ? '),
+    (r'\:', ' : '),
+    (r'\,', ', '),
+    # Motifs spécifiques du domaine
+    (r'\b(\d+)\s*[-~to]?\s*(\d+)\s*(m|mth|mths|month|months?)\b', 'month'),
+    (r'\bnewborn\s*[-~to]?\s*(\d+)\s*(m|mth|months?)\b', 'month'),
+    (r'\b(nb|newborn|baby|bb|bby|babie|babies)\b', 'baby'),
+    (r'\b(diaper|diapr|nappy)\b', 'diaper'),
+    (r'\b(stroller|pram|buggy)\b', 'stroller'),
+    (r'\b(bpa\s*free|non\s*bpa)\b', 'bisphenol a free'),
+    (r'\b(\d+)\s*(oz|ounce)\b', 'ounce'),
+    (r'\b(rtx\s*\d+)\b', 'ray tracing graphics'),
+    (r'\b(gtx\s*\d+)\b', 'geforce graphics'),
+    (r'\bnvidia\b', 'nvidia'),
+    (r'\b(amd\s*radeon\s*rx\s*\d+)\b', 'amd radeon graphics'),
+    (r'\b(intel\s*(core|xeon)\s*[i\d-]+)\b', 'intel processor'),
+    (r'\b(amd\s*ryzen\s*[\d]+)\b', 'amd ryzen processor'),
+    (r'\bssd\b', 'solid state drive'),
+    (r'\bhdd\b', 'hard disk drive'),
+    (r'\bwifi\s*([0-9])\b', 'wi-fi standard'),
+    (r'\bbluetooth\s*(\d\.\d)\b', 'bluetooth version'),
+    (r'\bethernet\b', 'ethernet'),
+    (r'\bfhd\b', 'full high definition'),
+    (r'\buhd\b', 'ultra high definition'),
+    (r'\bqhd\b', 'quad high definition'),
+    (r'\boled\b', 'organic light emitting diode'),
+    (r'\bips\b', 'in-plane switching'),
+    (r'\bram\b', 'random access memory'),
+    (r'\bcpu\b', 'central processing unit'),
+    (r'\bgpu\b', 'graphics processing unit'),
+    (r'\bhdmi\b', 'high definition multimedia interface'),
+    (r'\busb\s*([a-z0-9]*)\b', 'universal serial bus'),
+    (r'\brgb\b', 'red green blue'),
+    (r'\bfridge\b', 'refrigerator'),
+    (r'\bwashing\s*machine\b', 'clothes washer'),
+    (r'\bdishwasher\b', 'dish washing machine'),
+    (r'\boven\b', 'cooking oven'),
+    (r'\bmicrowave\b', 'microwave oven'),
+    (r'\bhoover\b', 'vacuum cleaner'),
+    (r'\btumble\s*dryer\b', 'clothes dryer'),
+    (r'\b(a\+\++)\b', 'energy efficiency class'),
+    (r'\b(\d+)\s*btu\b', 'british thermal unit'),
+    (r'\bpoly\b', 'polyester'),
+    (r'\bacrylic\b', 'acrylic fiber'),
+    (r'\bnylon\b', 'nylon fiber'),
+    (r'\bspandex\b', 'spandex fiber'),
+    (r'\blycra\b', 'lycra fiber'),
+    (r'\bpvc\b', 'polyvinyl chloride'),
+    (r'\bvinyl\b', 'vinyl material'),
+    (r'\bstainless\s*steel\b', 'stainless steel'),
+    (r'\baluminum\b', 'aluminum metal'),
+    (r'\bplexiglass\b', 'acrylic glass'),
+    (r'\bpu\s*leather\b', 'polyurethane leather'),
+    (r'\bsynthetic\s*leather\b', 'synthetic leather'),
+    (r'\bfaux\s*leather\b', 'faux leather'),
+    (r'\bwaterproof\b', 'water resistant'),
+    (r'\bbreathable\b', 'air permeable'),
+    (r'\bwrinkle-free\b', 'wrinkle resistant'),
+    (r'\bSPF\b', 'sun protection factor'),
+    (r'\bUV\b', 'ultraviolet'),
+    (r'\bBB\s*cream\b', 'blemish balm cream'),
+    (r'\bCC\s*cream\b', 'color correcting cream'),
+    (r'\bHA\b', 'hyaluronic acid'),
+    (r'\bAHA\b', 'alpha hydroxy acid'),
+    (r'\bBHA\b', 'beta hydroxy acid'),
+    (r'\bPHA\b', 'polyhydroxy acid'),
+    (r'\bNMF\b', 'natural moisturizing factor'),
+    (r'\bEGF\b', 'epidermal growth factor'),
+    (r'\bVit\s*C\b', 'vitamin c'),
+    (r'\bVit\s*E\b', 'vitamin e'),
+    (r'\bVit\s*B3\b', 'niacinamide vitamin b3'),
+    (r'\bVit\s*B5\b', 'panthenol vitamin b5'),
+    (r'\bSOD\b', 'superoxide dismutase'),
+    (r'\bQ10\b', 'coenzyme q10'),
+    (r'\bFoam\s*cl\b', 'foam cleanser'),
+    (r'\bMic\s*H2O\b', 'micellar water'),
+    (r'\bToner\b', 'skin toner'),
+    (r'\bEssence\b', 'skin essence'),
+    (r'\bAmpoule\b', 'concentrated serum'),
+    (r'\bCF\b', 'cruelty free'),
+    (r'\bPF\b', 'paraben free'),
+    (r'\bSF\b', 'sulfate free'),
+    (r'\bGF\b', 'gluten free'),
+    (r'\bHF\b', 'hypoallergenic formula'),
+    (r'\bNT\b', 'non-comedogenic tested'),
+    (r'\bAM\b', 'morning'),
+    (r'\bPM\b', 'night'),
+    (r'\bBID\b', 'twice daily'),
+    (r'\bQD\b', 'once daily'),
+    (r'\bAIR\b', 'airless pump bottle'),
+    (r'\bD-C\b', 'dropper container'),
+    (r'\bT-C\b', 'tube container'),
+    (r'\bPDO\b', 'polydioxanone'),
+    (r'\bPCL\b', 'polycaprolactone'),
+    (r'\bPLLA\b', 'poly-l-lactic acid'),
+    (r'\bHIFU\b', 'high-intensity focused ultrasound'),
+    (r'\b(\d+)\s*fl\s*oz\b', 'fluid ounce'),
+    (r'\bpH\s*bal\b', 'ph balanced'),
+    (r'\b(\d+)\s*(gb|tb|mb|go|to|mo)\b', 'byte'),
+    (r'\boctet\b', 'byte'),
+    (r'\b(\d+)\s*y\b', 'year'),
+    (r'\b(\d+)\s*mth\b', 'month'),
+    (r'\b(\d+)\s*d\b', 'day'),
+    (r'\b(\d+)\s*h\b', 'hour'),
+    (r'\b(\d+)\s*min\b', 'minute'),
+    (r'\b(\d+)\s*rpm\b', 'revolution per minute'),
+    (r'\b(\d+)\s*(mw|cw|kw)\b', 'watt'),
+    (r'\b(\d+)\s*(ma|ca|ka)\b', 'ampere'),
+    (r'\b(\d+)\s*(mv|cv|kv)\b', 'volt'),
+    (r'\b(\d+)\s*(mm|cm|m|km)\b', 'meter'),
+    (r'\binch\b', 'meter'),
+    (r'\b(\d+)\s*(ml|cl|dl|l|oz|gal)\b', 'liter'),
+    (r'\b(gallon|ounce)\b', 'liter'),
+    (r'\b(\d+)\s*(mg|cg|dg|g|kg|lb)\b', 'gram'),
+    (r'\bpound\b', 'gram'),
+    (r'\b(\d+)\s*(°c|°f)\b', 'celsius'),
+    (r'\bfahrenheit\b', 'celsius'),
+    (r'\bflipkart\.com\b', ''),
+    (r'\bapprox\.?\b', 'approximately'),
+    (r'\bw/o\b', 'without'),
+    (r'\bw/\b', 'with'),
+    (r'\bant-\b', 'anti'),
+    (r'\byes\b', ''),
+    (r'\bno\b', ''),
+    (r'\bna\b', ''),
+    (r'\brs\.?\b', ''),
+    # Normaliser les espaces
+    (r'\s+', ' '),
+]
+
+# Motifs compilés une seule fois (insensibles à la casse comme dans le notebook)
+CLEAN_TEXT_PATTERNS = [(re.compile(pattern, re.IGNORECASE), replacement) for pattern, replacement in CLEAN_TEXT_RULES]
+
+# Règle littérale : \bmot\b, \b(mot|mot)\b, mots séparés par \s* (ex. washing\s*machine)
+_LITERAL_WORD = r'[A-Za-z0-9]+'
+_LITERAL_SEQUENCE = rf'{_LITERAL_WORD}(?:\\s\*{_LITERAL_WORD})*'
+LITERAL_RULE_PATTERN = re.compile(
+    rf'\\b(?:{_LITERAL_SEQUENCE}|\({_LITERAL_SEQUENCE}(?:\|{_LITERAL_SEQUENCE})*\))\\b'
+)
+
+# Découpage en mots (\w+, comme les \b des motifs) : indices impairs = mots, pairs = séparateurs
+WORD_SPLIT_PATTERN = re.compile(r'(\w+)')
+
+# Lettres non ASCII égales à i, s ou k pour re.IGNORECASE
+IGNORECASE_FOLD = str.maketrans({'ı': 'i', 'İ': 'i', 'ſ': 's', 'K': 'k'})
+
+
+def literal_keys(pattern, replacement):
+    """
+    Séquences de mots reconnues par une règle littérale, None si la règle
+    doit rester une expression régulière. \\s* accepte aussi zéro espace :
+    'washing\\s*machine' donne ('washing', 'machine') et ('washingmachine',).
+    """
+    if not LITERAL_RULE_PATTERN.fullmatch(pattern) or '\\' in replacement:
+        return None
+    keys = set()
+    for alternative in pattern[2:-2].strip('()').split('|'):
+        words = alternative.lower().split(r'\s*')
+        # Chaque \s* : mots séparés par des espaces ou accolés
+        for joins in range(2 ** (len(words) - 1)):
+            key = [words[0]]
+            for position, word in enumerate(words[1:]):
+                if joins >> position & 1:
+                    key[-1] += word
+                else:
+                    key.append(word)
+            keys.add(tuple(key))
+    # L'alternative retenue par re dépendrait de l'ordre (première, pas la plus longue)
+    if any(key != other and other[:len(key)] == key for key in keys for other in keys):
+        return None
+    return sorted(keys)
+
+
+class TokenRewriter:
+    """Trie de séquences de mots : remplacements littéraux en un seul parcours (texte en minuscules)"""
+
+    def __init__(self):
+        # Noeud : {mot: noeud enfant, None: remplacement si une séquence se termine ici}
+        self.trie = {}
+        self.first_words = ()
+        self.key_words = set()
+        self.output_words = set()
+        self.removes_words = False
+
+    def can_add(self, keys):
+        """La règle donne-t-elle le même résultat regroupée qu'appliquée après les précédentes ?"""
+        words = {word for key in keys for word in key}
+        if words & (self.key_words | self.output_words):
+            return False
+        # Un mot supprimé rapproche ses voisins, qui pourraient former une séquence
+        return not (self.removes_words and any(len(key) > 1 for key in keys))
+
+    def add(self, keys, replacement):
+        for key in keys:
+            node = self.trie
+            for word in key:
+                node = node.setdefault(word, {})
+            node[None] = replacement
+            self.key_words.update(key)
+        self.first_words = tuple(self.trie)
+        output_words = WORD_SPLIT_PATTERN.findall(replacement)
+        self.output_words.update(output_words)
+        self.removes_words = self.removes_words or not output_words
+
+    def rewrite(self, text):
+        # Le découpage en mots coûte plus que la recherche : l'éviter quand aucune séquence
+        # ne peut commencer dans le texte (sous-chaîne absente, sauf lettres à replier)
+        if not any(word in text for word in self.first_words) and 'ı' not in text and 'ſ' not in text:
+            return text
+        parts = WORD_SPLIT_PATTERN.split(text)
+        trie = self.trie
+        count = len(parts)
+        changed = False
+        i = 1
+        while i < count:
+            word = parts[i]
+            node = trie.get(word if word.isascii() else word.lower().translate(IGNORECASE_FOLD))
+            if node is None:
+                i += 2
+                continue
+            # Séquence la plus longue à partir de ce mot (mots séparés par des espaces)
+            match = (i, node[None]) if None in node else None
+            j = i
+            while j + 2 < count and parts[j + 1].isspace():
+                word = parts[j + 2]
+                node = node.get(word if word.isascii() else word.lower().translate(IGNORECASE_FOLD))
+                if node is None:
+                    break
+                j += 2
+                if None in node:
+                    match = (j, node[None])
+            if match is None:
+                i += 2
+                continue
+            end, replacement = match
+            parts[i] = replacement
+            for position in range(i + 1, end + 1):
+                parts[position] = ''
+            changed = True
+            i = end + 2
+        return ''.join(parts) if changed else text
+
+
+def build_stages(rules):
+    """Étapes de nettoyage : expressions régulières et groupes de règles littérales, dans l'ordre"""
+    stages = []
+    rewriter = None
+    for pattern, replacement in rules:
+        keys = literal_keys(pattern, replacement)
+        if keys is None:
+            rewriter = None
+            stages.append(partial(re.compile(pattern, re.IGNORECASE).sub, replacement))
+            continue
+        if rewriter is None or not rewriter.can_add(keys):
+            rewriter = TokenRewriter()
+            stages.append(rewriter.rewrite)
+        rewriter.add(keys, replacement)
+    return stages
+
+
+CLEAN_TEXT_STAGES = build_stages(CLEAN_TEXT_RULES)
+
+STOPWORDS = {
+    'a', 'an', 'and', 'are', 'as', 'at', 'be', 'by', 'for', 'from',
+    'has', 'he', 'in', 'is', 'it', 'its', 'of', 'on', 'that', 'the',
+    'to', 'was', 'will', 'with', 'this', 'these', 'they', 'them',
+    'their', 'there', 'then', 'than', 'or', 'but', 'if', 'when',
+    'where', 'why', 'how', 'all', 'any', 'both', 'each', 'few',
+    'more', 'most', 'other', 'some', 'such', 'no', 'nor', 'not',
+    'only', 'own', 'same', 'so', 'than', 'too', 'very', 'can',
+    'could', 'should', 'would', 'may', 'might', 'must', 'shall'
+}
+
+NON_WORD_PATTERN = re.compile(r'[^\w\s]')
+
+# Textes distincts à partir desquels un traitement par lot utilise un pool de processus
+# quand le nombre de workers n'est pas imposé (workers=None)
+BATCH_PARALLEL_MIN_TEXTS = 2000
+BATCH_CHUNK_SIZE = 250
+
+
+def clean_text(text):
+    """Nettoyer le texte comme dans le notebook"""
+    if not isinstance(text, str):
+        return ""
+    text = text.lower()
+    # Appliquer les règles deux fois pour un remplacement complet
+    for _ in range(2):
+        for stage in CLEAN_TEXT_STAGES:
+            text = stage(text)
+    return text.strip()
+
+
+def clean_text_regex(text):
+    """Référence : les règles appliquées une à une par expressions régulières"""
+    if not isinstance(text, str):
+        return ""
+    text = text.lower()
+    for _ in range(2):
+        for pattern, replacement in CLEAN_TEXT_PATTERNS:
+            text = pattern.sub(replacement, text)
+    return text.strip()
+
+
+def extract_keywords(text, top_n=15):
+    """Extraire les mots-clés comme dans le notebook"""
+    if not text:
+        return []
+
+    text = clean_text(text)
+
+    # Tokenisation simple sans spaCy
+    text = NON_WORD_PATTERN.sub(' ', text.lower())
+    words = text.split()
+
+    # Filtrer les mots vides et les mots courts
+    keywords = [word for word in words if len(word) > 2 and word not in STOPWORDS]
+
+    # Mots-clés les plus fréquents
+    word_counts = Counter(keywords)
+    return [word for word, count in word_counts.most_common(top_n)]
+
+
+def _clean_chunk(texts):
+    return [clean_text(text) for text in texts]
+
+
+def _keywords_chunk(args):
+    texts, top_n = args
+    return [extract_keywords(text, top_n) for text in texts]
+
+
+def _map_distinct(texts, chunk_function, extra_args=(), workers=None):
+    """
+    Appliquer chunk_function aux textes distincts d'une colonne, par blocs,
+    et renvoyer les résultats alignés sur l'entrée (Series de même index ou liste)
+    """
+    values = texts.tolist() if isinstance(texts, pd.Series) else list(texts)
+    # Valeurs manquantes (NaN, None) : même résultat que le texte vide
+    values = [value if isinstance(value, str) else '' for value in values]
+    distinct = list(dict.fromkeys(values))
+    chunks = [distinct[start:start + BATCH_CHUNK_SIZE] for start in range(0, len(distinct), BATCH_CHUNK_SIZE)]
+    tasks = [(chunk, *extra_args) if extra_args else chunk for chunk in chunks]
+
+    # workers explicite : pool dès qu'il y a plusieurs blocs ; sinon seulement pour les gros volumes
+    parallel = len(tasks) > 1 and (workers > 1 if workers else len(distinct) >= BATCH_PARALLEL_MIN_TEXTS)
+    workers = workers or os.cpu_count() or 1
+    if parallel and workers > 1:
+        with Pool(processes=min(workers, len(tasks))) as pool:
+            chunk_results = pool.map(chunk_function, tasks)
+    else:
+        chunk_results = [chunk_function(task) for task in tasks]
+
+    results = dict(zip(distinct, (result for chunk in chunk_results for result in chunk)))
+    aligned = [results[value] for value in values]
+    if isinstance(texts, pd.Series):
+        return pd.Series(aligned, index=texts.index, name=texts.name, dtype=object)
+    return aligned
+
+
+def clean_text_batch(texts, workers=None):
+    """Nettoyer une colonne de textes (Series ou liste), résultat de même forme"""
+    return _map_distinct(texts, _clean_chunk, workers=workers)
+
+
+def extract_keywords_batch(texts, top_n=15, workers=None):
+    """
+    Mots-clés de chaque texte d'une colonne (Series ou liste) : liste de
+    listes, ou Series de listes de même index. workers=None : pool de tous
+    les CPU à partir de BATCH_PARALLEL_MIN_TEXTS textes distincts ; workers=N
+    impose N processus ; workers=1 reste dans le processus courant (ex.
+    script de scoring).
+    """
+    return _map_distinct(texts, _keywords_chunk, (top_n,), workers)
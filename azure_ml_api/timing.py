@@ -0,0 +1,90 @@
+#!/usr/bin/env python3
+"""
+Chronométrage par étape des requêtes de scoring
+
+Une requête ouvre un contexte `request_timings()` ; le code de scoring délimite
+ses étapes avec `span('nom')`. Les étapes imbriquées sont nommées par leur
+chemin ('predict_category/forward') et les durées d'une même étape sont
+cumulées (ex. plusieurs batches de patches de la heatmap).
+
+Le coût est celui de deux appels à time.perf_counter_ns() et d'une mise à jour
+de dictionnaire par étape ; hors contexte de requête, span() ne fait rien.
+Le contexte est propre à chaque thread.
+
+    with request_timings() as timings:
+        with span('decode_base64'):
+            ...
+    timings.as_ms()  # {'decode_base64': 0.21, 'total': 0.25}
+"""
+
+import time
+import threading
+from contextlib import contextmanager, nullcontext
+
+_local = threading.local()
+_NO_SPAN = nullcontext()
+
+
+class Timings:
+    """Durées par étape d'une requête (nanosecondes)"""
+
+    def __init__(self):
+        self.start_ns = time.perf_counter_ns()
+        self.end_ns = None
+        self.spans = {}
+        self._stack = []
+
+    @contextmanager
+    def span(self, name):
+        """Mesurer une étape (cumulée si elle se répète)"""
+        self._stack.append(name)
+        path = '/'.join(self._stack)
+        start = time.perf_counter_ns()
+        try:
+            yield
+        finally:
+            self.spans[path] = self.spans.get(path, 0) + time.perf_counter_ns() - start
+            self._stack.pop()
+
+    def stop(self):
+        """Figer la durée totale"""
+        if self.end_ns is None:
+            self.end_ns = time.perf_counter_ns()
+
+    @property
+    def total_ns(self):
+        return (self.end_ns or time.perf_counter_ns()) - self.start_ns
+
+    def as_ms(self):
+        """Durées en millisecondes, dans l'ordre de première apparition, plus le total"""
+        timings = {path: round(ns / 1e6, 3) for path, ns in self.spans.items()}
+        timings['total'] = round(self.total_ns / 1e6, 3)
+        return timings
+
+    def summary(self):
+        """Ligne de log des étapes de premier niveau"""
+        stages = ' '.join(f"{path}={ns / 1e6:.1f}ms" for path, ns in self.spans.items() if '/' not in path)
+        return f"{self.total_ns / 1e6:.1f}ms ({stages})"
+
+
+def current_timings():
+    """Chronométrage de la requête en cours dans ce thread (None hors requête)"""
+    return getattr(_local, 'timings', None)
+
+
+@contextmanager
+def request_timings():
+    """Ouvrir le chronométrage d'une requête pour le thread courant"""
+    previous = current_timings()
+    timings = _local.timings = Timings()
+    try:
+        yield timings
+    finally:
+        timings.stop()
+        _local.timings = previous
+
+
+def span(name):
+    """Mesurer une étape de la requête en cours (sans effet hors requête)"""
+    timings = current_timings()
+    return timings.span(name) if timings is not None else _NO_SPAN
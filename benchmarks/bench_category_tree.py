@@ -0,0 +1,99 @@
+#!/usr/bin/env python3
+"""
+Benchmark du parsing de product_category_tree : anciennes versions des pages
+(ast.literal_eval + split dans des apply) contre le parseur vectorisé de
+azure_ml_api/category_tree.py (tous les niveaux, colonnes catégorielles)
+
+Usage :
+    python benchmarks/bench_category_tree.py [--repeat 5] [--scale 10]
+"""
+
+import os
+import sys
+import ast
+import time
+import argparse
+import pandas as pd
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(ROOT)
+from product_data import parse_category_tree_column
+
+CSV_PATH = os.path.join(ROOT, 'produits_original.csv')
+
+
+def parse_apply_accueil(category_trees):
+    """Ancienne version d'accueil.py (extract_categories)"""
+    def extract_categories(category_tree):
+        if pd.isna(category_tree):
+            return None, None
+        try:
+            categories = ast.literal_eval(category_tree)
+            if isinstance(categories, list) and len(categories) > 0:
+                full_path = categories[0]
+                parts = full_path.split(' >> ')
+                main_category = parts[0] if len(parts) > 0 else None
+                sub_categories = ' >> '.join(parts[1:]) if len(parts) > 1 else None
+                return main_category, sub_categories
+        except:
+            pass
+        return None, None
+
+    category_data = category_trees.apply(extract_categories)
+    return pd.DataFrame({
+        'main_category': [x[0] for x in category_data],
+        'sub_categories': [x[1] for x in category_data]
+    }, index=category_trees.index)
+
+
+def parse_apply_eda(category_trees):
+    """Ancienne version de pages/1_eda.py (lambdas successives)"""
+    categories = category_trees.apply(lambda x: ast.literal_eval(x) if isinstance(x, str) else x)
+    return pd.DataFrame({
+        'main_category': categories.apply(lambda x: x[0].split(' >> ')[0] if x and len(x) > 0 else 'Unknown'),
+        'sub_categories': categories.apply(lambda x: x[0].split(' >> ')[1] if x and len(x) > 0 and ' >> ' in x[0] else 'Unknown')
+    }, index=category_trees.index)
+
+
+def best_times(funcs, data, repeat):
+    """Meilleur temps de chaque fonction, exécutions entrelacées (même bruit machine pour toutes)"""
+    timings = {name: [] for name, _ in funcs}
+    for _ in range(repeat):
+        for name, func in funcs:
+            start = time.perf_counter()
+            func(data)
+            timings[name].append(time.perf_counter() - start)
+    return [(name, min(timings[name])) for name, _ in funcs]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark du parsing de l'arbre de catégories")
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--scale', type=int, default=1, help="Dupliquer le catalogue N fois")
+    args = parser.parse_args()
+
+    category_trees = pd.read_csv(CSV_PATH)['product_category_tree']
+    category_trees = pd.concat([category_trees] * args.scale, ignore_index=True)
+
+    # Vérifier que le parseur vectorisé reproduit la sémantique de la page EDA
+    expected = parse_apply_eda(category_trees)
+    actual = parse_category_tree_column(category_trees)
+    for column in ('main_category', 'sub_categories'):
+        mismatches = (actual[column].astype(object) != expected[column]).sum()
+        status = "✅" if mismatches == 0 else "❌"
+        print(f"{status} {column}: {mismatches} différence(s) sur {len(category_trees)} lignes")
+
+    print(f"\n📊 Parsing de {len(category_trees)} lignes (meilleur de {args.repeat})")
+    results = best_times([
+        ("apply accueil.py", parse_apply_accueil),
+        ("apply 1_eda.py", parse_apply_eda),
+        ("vectorisé", parse_category_tree_column),
+    ], category_trees, args.repeat)
+    reference = results[1][1]
+    for name, seconds in results:
+        print(f"   - {name:<18} {seconds * 1000:8.2f} ms  (x{reference / seconds:.1f} vs 1_eda.py)")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,28 @@
+"""
+Micro-benchmarks du client Azure ML côté application : encodage base64 de
+l'image envoyée à l'endpoint et prédiction de démonstration.
+"""
+
+import os
+from unittest import mock
+import pytest
+from azure_client import AzureMLClient
+
+
+@pytest.fixture(scope='module')
+def client():
+    """Client en mode démonstration (aucun appel réseau)"""
+    with mock.patch.dict(os.environ, {'USE_LOCAL_MODEL': 'true'}):
+        return AzureMLClient()
+
+
+@pytest.mark.parametrize('size', ['original', 'model'])
+def test_encode_image_to_base64(benchmark, client, catalogue_image, model_image, size):
+    image = catalogue_image if size == 'original' else model_image
+    encoded = benchmark(client.encode_image_to_base64, image)
+    assert encoded
+
+
+def test_predict_local(benchmark, client, model_image, descriptions):
+    result = benchmark(lambda: [client._predict_local(model_image, text) for text in descriptions])
+    assert all(prediction['success'] for prediction in result)
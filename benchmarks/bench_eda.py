@@ -0,0 +1,49 @@
+"""
+Micro-benchmarks des chargements de données de la page EDA : jeu de données
+Parquet, reconstruction depuis le CSV, arbre de catégories, index des images
+et fréquences de mots-clés.
+"""
+
+import os
+import pandas as pd
+import pytest
+from conftest import ROOT, CSV_PATH, IMAGE_FOLDER
+import product_data
+from image_index import load_image_index
+
+DATASET_PATH = os.path.join(ROOT, product_data.DATASET_PATH)
+KEYWORD_FREQ_PATH = os.path.join(ROOT, 'keyword_frequencies.csv')
+
+
+def test_load_products_parquet(benchmark):
+    if product_data.is_dataset_stale(DATASET_PATH, CSV_PATH, IMAGE_FOLDER):
+        pytest.skip("produits.parquet absent ou périmé (python product_data.py)")
+    df = benchmark(product_data.load_products, DATASET_PATH, CSV_PATH, IMAGE_FOLDER)
+    assert len(df)
+
+
+def test_build_product_frame(benchmark):
+    """Chemin sans cache : CSV, catégories et index des images"""
+    df = benchmark.pedantic(product_data.build_product_frame, args=(CSV_PATH, IMAGE_FOLDER),
+                            rounds=5, warmup_rounds=1)
+    assert len(df)
+
+
+def test_parse_category_tree_column(benchmark):
+    category_trees = pd.read_csv(CSV_PATH, usecols=['product_category_tree'])['product_category_tree']
+    parsed = benchmark(product_data.parse_category_tree_column, category_trees)
+    assert len(parsed) == len(category_trees)
+
+
+def test_load_image_index(benchmark):
+    """Index des images à jour (lecture du fichier d'index et stat des fichiers)"""
+    load_image_index(IMAGE_FOLDER)
+    index = benchmark(load_image_index, IMAGE_FOLDER)
+    assert index
+
+
+def test_load_keyword_frequencies(benchmark):
+    if not os.path.exists(KEYWORD_FREQ_PATH):
+        pytest.skip("keyword_frequencies.csv absent (python build_keyword_frequencies.py --output keyword_frequencies.csv)")
+    frequencies = benchmark(pd.read_csv, KEYWORD_FREQ_PATH)
+    assert len(frequencies)
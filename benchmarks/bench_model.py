@@ -0,0 +1,55 @@
+"""
+Micro-benchmarks du modèle : prédiction unitaire et carte d'attention à
+plusieurs résolutions, avec le modèle de base et avec un checkpoint fine-tuné
+(tête de classification). Ignorés si torch/transformers ne sont pas installés.
+"""
+
+import os
+import pytest
+
+torch = pytest.importorskip('torch')
+pytest.importorskip('transformers')
+
+HEATMAP_RESOLUTIONS = [20, 50, 100]
+
+
+@pytest.fixture(scope='module')
+def finetuned_checkpoint(tmp_path_factory):
+    """Checkpoint .pth au format du modèle fine-tuné (CLIP pré-entraîné + tête)"""
+    from score_finetuned import CLIPForClassification
+    from transformers import CLIPConfig
+    config = CLIPConfig.from_pretrained("openai/clip-vit-base-patch32")
+    model = CLIPForClassification(config, num_labels=7, pretrained=True)
+    path = os.path.join(tmp_path_factory.mktemp('checkpoint'), 'new_clip_product_classifier.pth')
+    torch.save(model.state_dict(), path)
+    return path
+
+
+@pytest.fixture(scope='module', params=['base', 'finetuned'])
+def classifier(request, tmp_path_factory):
+    from score_finetuned import CLIPClassifierFinetuned
+    if request.param == 'finetuned':
+        model_path = request.getfixturevalue('finetuned_checkpoint')
+    else:
+        model_path = os.path.join(tmp_path_factory.mktemp('no_checkpoint'), 'absent.pth')
+    with pytest.MonkeyPatch.context() as monkeypatch:
+        monkeypatch.setenv('FINETUNED_MODEL_PATH', model_path)
+        classifier = CLIPClassifierFinetuned()
+    # Le checkpoint doit être réellement chargé (sinon repli silencieux sur le modèle de base)
+    assert (classifier.checkpoint_path is not None) == (request.param == 'finetuned')
+    assert hasattr(classifier.model, 'classifier') == (request.param == 'finetuned')
+    return classifier
+
+
+def test_predict_category(benchmark, classifier, model_image, descriptions):
+    result = benchmark.pedantic(classifier.predict_category, args=(model_image, descriptions[0]),
+                                rounds=10, warmup_rounds=1)
+    assert result['predicted_category'] in classifier.categories
+
+
+@pytest.mark.parametrize('resolution', HEATMAP_RESOLUTIONS)
+def test_generate_attention_heatmap(benchmark, classifier, model_image, descriptions, resolution):
+    heatmap = benchmark.pedantic(classifier.generate_attention_heatmap,
+                                 args=(model_image, descriptions[0], resolution),
+                                 rounds=5, warmup_rounds=1)
+    assert heatmap is not None
@@ -0,0 +1,61 @@
+"""
+Micro-benchmarks du prétraitement de texte : les trois copies de clean_text
+(module partagé du scoring, avec et sans regroupement des règles littérales,
+page de prédiction, script d'analyse) et l'extraction de mots-clés, sur les
+descriptions fixes de l'échantillon.
+"""
+
+import os
+import pytest
+from conftest import ROOT, load_functions
+import text_processing
+
+PAGE_FUNCTIONS = load_functions(
+    os.path.join(ROOT, 'pages', '2_prediction.py'),
+    ['clean_text', 'extract_keywords_fallback', 'extract_keywords']
+)
+ANALYSIS_FUNCTIONS = load_functions(
+    os.path.join(ROOT, 'analyze_differences.py'),
+    ['clean_text', 'extract_keywords_fallback']
+)
+
+CLEAN_TEXT = {
+    'text_processing': text_processing.clean_text,
+    'text_processing_regex': text_processing.clean_text_regex,
+    'page_prediction': PAGE_FUNCTIONS['clean_text'],
+    'analyze_differences': ANALYSIS_FUNCTIONS['clean_text'],
+}
+
+
+@pytest.mark.parametrize('source', list(CLEAN_TEXT))
+def test_clean_text(benchmark, descriptions, source):
+    clean_text = CLEAN_TEXT[source]
+    cleaned = benchmark(lambda: [clean_text(text) for text in descriptions])
+    assert len(cleaned) == len(descriptions)
+
+
+def test_extract_keywords_scoring(benchmark, descriptions):
+    """Version du scoring (score_finetuned délègue à text_processing)"""
+    keywords = benchmark(lambda: [text_processing.extract_keywords(text) for text in descriptions])
+    assert any(keywords)
+
+
+def test_extract_keywords_batch(benchmark, descriptions):
+    """Version par lot (textes distincts une fois, sans pool sous le seuil)"""
+    keywords = benchmark(lambda: text_processing.extract_keywords_batch(descriptions))
+    assert keywords == [text_processing.extract_keywords(text) for text in descriptions]
+
+
+def test_extract_keywords_page(benchmark, descriptions):
+    """Version de la page de prédiction, sans spaCy (nlp=None)"""
+    extract_keywords = PAGE_FUNCTIONS['extract_keywords']
+    keywords = benchmark(lambda: [extract_keywords(text, None) for text in descriptions])
+    assert any(keywords)
+
+
+@pytest.mark.parametrize('source', ['page_prediction', 'analyze_differences'])
+def test_extract_keywords_fallback(benchmark, descriptions, source):
+    functions = PAGE_FUNCTIONS if source == 'page_prediction' else ANALYSIS_FUNCTIONS
+    extract_keywords_fallback = functions['extract_keywords_fallback']
+    keywords = benchmark(lambda: [extract_keywords_fallback(text) for text in descriptions])
+    assert any(keywords)
@@ -0,0 +1,93 @@
+"""
+Fixtures communes des micro-benchmarks (pytest-benchmark)
+
+Les entrées sont fixes : les premiers produits de produits_original.csv
+(triés par uniq_id) ayant une image, pour que deux exécutions mesurent
+exactement le même travail.
+"""
+
+import os
+import re
+import ast
+import sys
+import glob
+from collections import Counter
+import pandas as pd
+import pytest
+from PIL import Image
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(ROOT)
+sys.path.append(os.path.join(ROOT, 'azure_ml_api'))
+
+CSV_PATH = os.path.join(ROOT, 'produits_original.csv')
+IMAGE_FOLDER = os.path.join(ROOT, 'Images')
+SAMPLE_SIZE = 100
+
+# Historique des résultats, quel que soit le répertoire de lancement
+STORAGE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '.benchmarks')
+DEFAULT_STORAGE = 'file://./.benchmarks'
+
+
+def pytest_configure(config):
+    """Stockage de l'historique et comparaison seulement si une exécution précédente existe"""
+    if not hasattr(config.option, 'benchmark_storage'):
+        return
+    if config.option.benchmark_storage == DEFAULT_STORAGE:
+        config.option.benchmark_storage = 'file://' + STORAGE_DIR
+    has_history = glob.glob(os.path.join(STORAGE_DIR, '*', '*.json'))
+    if config.option.benchmark_storage == 'file://' + STORAGE_DIR and not has_history:
+        config.option.benchmark_compare = False
+        config.option.benchmark_compare_fail = None
+
+
+def load_functions(path, names, namespace=None):
+    """
+    Charger des fonctions d'un script sans l'exécuter (pages Streamlit, scripts d'analyse)
+
+    Seules les définitions demandées sont compilées, y compris les fonctions
+    imbriquées ; le reste du module (appels st.*, chargement de données) est ignoré.
+    """
+    with open(path, encoding='utf-8') as f:
+        tree = ast.parse(f.read(), filename=path)
+    found = {}
+    for node in ast.walk(tree):
+        if isinstance(node, ast.FunctionDef) and node.name in names and node.name not in found:
+            found[node.name] = node
+    missing = set(names) - set(found)
+    if missing:
+        raise LookupError(f"Fonction(s) absente(s) de {path}: {', '.join(sorted(missing))}")
+    module = ast.Module(body=[found[name] for name in names], type_ignores=[])
+    scope = {'re': re, 'Counter': Counter, 'pd': pd}
+    scope.update(namespace or {})
+    exec(compile(module, path, 'exec'), scope)
+    return {name: scope[name] for name in names}
+
+
+@pytest.fixture(scope='session')
+def products():
+    """Échantillon fixe de produits avec image"""
+    df = pd.read_csv(CSV_PATH).sort_values('uniq_id')
+    df = df[[os.path.exists(os.path.join(IMAGE_FOLDER, name)) for name in df['image']]]
+    return df.head(SAMPLE_SIZE).reset_index(drop=True)
+
+
+@pytest.fixture(scope='session')
+def descriptions(products):
+    """Descriptions de l'échantillon"""
+    return products['description'].fillna('').tolist()
+
+
+@pytest.fixture(scope='session')
+def catalogue_image(products):
+    """Image originale du premier produit de l'échantillon (pixels chargés)"""
+    with Image.open(os.path.join(IMAGE_FOLDER, products['image'][0])) as img:
+        return img.convert('RGB')
+
+
+@pytest.fixture(scope='session')
+def model_image(catalogue_image):
+    """Même image ramenée à 224 px, taille vue par le modèle"""
+    image = catalogue_image.copy()
+    image.thumbnail((224, 224), Image.LANCZOS)
+    return image
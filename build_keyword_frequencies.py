@@ -0,0 +1,192 @@
+#!/usr/bin/env python3
+"""
+Calcul des fréquences de mots-clés du catalogue
+
+Les descriptions sont lues par blocs depuis le CSV et chaque bloc est traité
+dès sa lecture, en parallèle (pool de processus, au plus deux blocs en
+attente par worker), avec le même clean_text/extract_keywords que le script
+de scoring (extract_keywords_batch : textes répétés d'un bloc traités une
+fois). Chaque bloc renvoie un Counter des mots-clés de ses produits,
+ajouté au total. La fréquence d'un mot-clé est le nombre de produits dont il
+fait partie des mots-clés extraits. Les spécifications sont analysées sans
+leur balisage ("key"=>, "value"=>) et le nom du site (Flipkart.com) est
+retiré des descriptions.
+
+Le résultat est écrit dans keyword_frequencies_build.csv : le fichier
+keyword_frequencies.csv lu par la page EDA n'est remplacé que sur demande
+(--output keyword_frequencies.csv).
+
+Un fichier d'état garde les uniq_id déjà comptés : les exécutions suivantes ne
+traitent que les nouveaux produits et les ajoutent aux fréquences existantes.
+
+Usage :
+    python build_keyword_frequencies.py           # mise à jour incrémentale
+    python build_keyword_frequencies.py --full    # recalcul complet
+"""
+
+import os
+import re
+import sys
+import json
+import hashlib
+import logging
+import argparse
+from collections import Counter, deque
+from multiprocessing import Pool
+import pandas as pd
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), 'azure_ml_api'))
+from text_processing import CLEAN_TEXT_RULES, extract_keywords_batch
+
+logger = logging.getLogger(__name__)
+
+CSV_PATH = 'produits_original.csv'
+OUTPUT_PATH = 'keyword_frequencies_build.csv'
+STATE_PATH = '.keyword_frequencies_state.json'
+CHUNK_SIZE = 200
+TOP_N = 15
+TEXT_COLUMNS = ['description', 'product_specifications']
+
+# Balisage des spécifications ({"product_specification"=>[{"key"=>"Brand", "value"=>"..."}]})
+# et nom du site répété dans les descriptions (la règle flipkart.com de clean_text ne s'applique
+# qu'après la séparation des points, elle ne le retire jamais)
+SPEC_MARKUP_PATTERN = re.compile(r'"(?:product_specification|key|value)"=>|\bflipkart\.com\b', re.IGNORECASE)
+
+
+def rules_fingerprint(top_n=TOP_N):
+    """Empreinte des règles de nettoyage et du texte analysé : un changement impose un recalcul complet"""
+    payload = json.dumps([CLEAN_TEXT_RULES, TEXT_COLUMNS, SPEC_MARKUP_PATTERN.pattern, top_n], ensure_ascii=False)
+    return hashlib.sha1(payload.encode('utf-8')).hexdigest()
+
+
+def product_text(row):
+    """Texte analysé pour un produit : description + noms et valeurs des spécifications, sans balisage"""
+    return " ".join(SPEC_MARKUP_PATTERN.sub(' ', row[column]) for column in TEXT_COLUMNS
+                    if isinstance(row.get(column), str))
+
+
+def count_chunk(args):
+    """Compter les mots-clés d'un bloc de textes (exécuté dans un worker)"""
+    texts, top_n = args
+    counts = Counter()
+    # Le pool est celui de build_keyword_frequencies : pas de pool imbriqué
+    for keywords in extract_keywords_batch(texts, top_n, workers=1):
+        counts.update(keywords)
+    return counts
+
+
+def iter_new_chunks(csv_path, processed_ids, chunk_size=CHUNK_SIZE):
+    """Lire le CSV par blocs et ne garder que les produits pas encore comptés"""
+    columns = ['uniq_id'] + TEXT_COLUMNS
+    for chunk in pd.read_csv(csv_path, usecols=columns, chunksize=chunk_size):
+        chunk = chunk[~chunk['uniq_id'].isin(processed_ids)].drop_duplicates('uniq_id')
+        if chunk.empty:
+            continue
+        records = chunk.to_dict('records')
+        yield [record['uniq_id'] for record in records], [product_text(record) for record in records]
+
+
+def load_state(state_path, output_path, fingerprint):
+    """Charger l'état précédent (uniq_id traités + fréquences), vide s'il est inutilisable"""
+    try:
+        with open(state_path, encoding='utf-8') as f:
+            state = json.load(f)
+    except (OSError, ValueError):
+        return set(), Counter()
+
+    if state.get('fingerprint') != fingerprint:
+        logger.info("🔄 Règles de nettoyage modifiées, recalcul complet")
+        return set(), Counter()
+
+    try:
+        previous = pd.read_csv(output_path)
+    except (OSError, ValueError, pd.errors.EmptyDataError):
+        logger.info(f"🔄 {output_path} illisible, recalcul complet")
+        return set(), Counter()
+
+    counts = Counter(dict(zip(previous['Mot Clé'], previous['Fréquence'].astype(int))))
+    return set(state.get('processed_ids', [])), counts
+
+
+def save_results(counts, processed_ids, output_path, state_path, fingerprint):
+    """Écrire le CSV des fréquences puis l'état (écritures atomiques)"""
+    ranked = sorted(counts.items(), key=lambda item: (-item[1], item[0]))
+    frequencies = pd.DataFrame(ranked, columns=['Mot Clé', 'Fréquence'])
+
+    tmp_output = f"{output_path}.{os.getpid()}.tmp"
+    frequencies.to_csv(tmp_output, index=False)
+    os.replace(tmp_output, output_path)
+
+    tmp_state = f"{state_path}.{os.getpid()}.tmp"
+    with open(tmp_state, 'w', encoding='utf-8') as f:
+        json.dump({'fingerprint': fingerprint, 'processed_ids': sorted(processed_ids)}, f)
+    os.replace(tmp_state, state_path)
+    return frequencies
+
+
+def build_keyword_frequencies(csv_path=CSV_PATH, output_path=OUTPUT_PATH, state_path=STATE_PATH,
+                              chunk_size=CHUNK_SIZE, workers=None, top_n=TOP_N, full=False):
+    """Mettre à jour (ou recalculer) les fréquences de mots-clés, renvoie (DataFrame, nb de nouveaux produits)"""
+    fingerprint = rules_fingerprint(top_n)
+    if full:
+        processed_ids, counts = set(), Counter()
+    else:
+        processed_ids, counts = load_state(state_path, output_path, fingerprint)
+
+    workers = workers or os.cpu_count() or 1
+    new_ids = set()
+    chunks = iter_new_chunks(csv_path, processed_ids, chunk_size)
+    if workers > 1:
+        # Blocs envoyés au fil de la lecture, au plus deux en attente par worker (mémoire bornée)
+        with Pool(processes=workers) as pool:
+            pending = deque()
+            for ids, texts in chunks:
+                new_ids.update(ids)
+                pending.append(pool.apply_async(count_chunk, ((texts, top_n),)))
+                while len(pending) >= 2 * workers:
+                    counts.update(pending.popleft().get())
+            while pending:
+                counts.update(pending.popleft().get())
+    else:
+        for ids, texts in chunks:
+            new_ids.update(ids)
+            counts.update(count_chunk((texts, top_n)))
+
+    new_products = len(new_ids)
+    if new_products == 0 and processed_ids:
+        logger.info("✅ Aucun nouveau produit, fréquences déjà à jour")
+        return pd.read_csv(output_path), 0
+    processed_ids.update(new_ids)
+
+    frequencies = save_results(counts, processed_ids, output_path, state_path, fingerprint)
+    logger.info(f"✅ {new_products} produit(s) traité(s), {len(frequencies)} mots-clés dans {output_path}")
+    return frequencies, new_products
+
+
+def main():
+    """Point d'entrée en ligne de commande"""
+    logging.basicConfig(level=logging.INFO)
+    parser = argparse.ArgumentParser(description="Calculer les fréquences de mots-clés du catalogue")
+    parser.add_argument('--csv', default=CSV_PATH, help="CSV des produits")
+    parser.add_argument('--output', default=OUTPUT_PATH, help="CSV des fréquences à écrire")
+    parser.add_argument('--state', default=STATE_PATH, help="Fichier d'état pour la mise à jour incrémentale")
+    parser.add_argument('--chunk-size', type=int, default=CHUNK_SIZE, help="Produits par bloc")
+    parser.add_argument('--workers', type=int, default=None, help="Processus de calcul (par défaut : nombre de CPU)")
+    parser.add_argument('--top-n', type=int, default=TOP_N, help="Mots-clés retenus par produit")
+    parser.add_argument('--full', action='store_true', help="Ignorer l'état et tout recalculer")
+    args = parser.parse_args()
+
+    if not os.path.exists(args.csv):
+        print(f"❌ Fichier non trouvé: {args.csv}")
+        return 1
+
+    frequencies, new_products = build_keyword_frequencies(
+        args.csv, args.output, args.state, args.chunk_size, args.workers, args.top_n, args.full
+    )
+    print(f"✅ {new_products} nouveau(x) produit(s), {len(frequencies)} mots-clés dans {args.output}")
+    print(frequencies.head(20).to_string(index=False))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
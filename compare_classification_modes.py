@@ -0,0 +1,163 @@
+#!/usr/bin/env python3
+"""
+Comparaison des modes de classification : tête linéaire, kNN et hybride
+
+Les produits de produits_original.csv sont séparés en apprentissage / test
+(stratifié par catégorie principale, graine fixe). Seuls les produits
+d'apprentissage restent étiquetés dans l'index d'embeddings : le vote kNN ne
+voit jamais les produits de test. Chaque mode est évalué sur les mêmes
+batches de test (exactitude, latence par batch et par produit).
+
+Prérequis : python azure_ml_api/embedding_index.py (et de préférence
+python azure_ml_api/pixel_store.py pour éviter le décodage des JPEG).
+
+Usage :
+    python compare_classification_modes.py --test-size 0.2 --batch-size 16
+"""
+
+import os
+import sys
+import json
+import time
+import argparse
+import numpy as np
+import pandas as pd
+from sklearn.model_selection import train_test_split
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), 'azure_ml_api'))
+
+MODES = ['head', 'knn', 'hybrid']
+
+
+def load_split(csv_path, image_folder, test_size, seed):
+    """Produits étiquetés avec image, séparés en apprentissage / test"""
+    from embedding_index import product_text
+    from category_tree import main_categories
+    products = pd.read_csv(csv_path).drop_duplicates('uniq_id')
+    products['label'] = main_categories(products['product_category_tree'])
+    products = products[products['label'].notna()]
+    products = products[[isinstance(name, str) and os.path.exists(os.path.join(image_folder, name))
+                         for name in products['image']]]
+    products['text'] = [product_text(record) for record in products.to_dict('records')]
+    train, test = train_test_split(products, test_size=test_size, random_state=seed, stratify=products['label'])
+    return train, test
+
+
+def load_pixels(classifier, records, image_folder, pixel_store):
+    """Pixels uint8 d'un batch : stockage prétraité si possible, sinon décodage des JPEG"""
+    from pixel_store import clip_image_processor, load_image, preprocess_uint8
+    ids = [record['uniq_id'] for record in records]
+    if pixel_store is not None and all(item_id in pixel_store for item_id in ids):
+        return pixel_store.get_batch(ids)
+    images = [load_image(os.path.join(image_folder, record['image'])) for record in records]
+    return preprocess_uint8(images, clip_image_processor(classifier.processor))
+
+
+def evaluate_mode(classifier, mode, batches):
+    """Exactitude et latences d'un mode sur des batches (pixels, textes, labels)"""
+    classifier.classification_mode = mode
+    correct = 0
+    total = 0
+    knn_used = 0
+    latencies = []
+    for pixels, texts, labels in batches:
+        start = time.perf_counter()
+        predictions = classifier.predict_pixel_batch(pixels, texts)
+        latencies.append(time.perf_counter() - start)
+        for prediction, label in zip(predictions, labels):
+            correct += prediction['predicted_category'] == label
+            knn_used += prediction['method'] == 'knn'
+            total += 1
+    latencies = np.array(latencies) * 1000
+    return {
+        'mode': mode,
+        'accuracy': correct / total if total else 0.0,
+        'products': total,
+        'knn_share': knn_used / total if total else 0.0,
+        'batch_ms_p50': float(np.percentile(latencies, 50)),
+        'batch_ms_p95': float(np.percentile(latencies, 95)),
+        'product_ms': float(latencies.sum() / total) if total else 0.0
+    }
+
+
+def main():
+    """Fonction principale"""
+    parser = argparse.ArgumentParser(description="Comparer la tête linéaire et le vote kNN sur un jeu de test")
+    parser.add_argument('--csv', default='produits_original.csv')
+    parser.add_argument('--images', default='Images')
+    parser.add_argument('--index', default=os.getenv('EMBEDDING_INDEX_PATH', 'embeddings/catalogue'))
+    parser.add_argument('--pixel-store', default=os.getenv('PIXEL_STORE_PATH', 'pixel_store/catalogue'))
+    parser.add_argument('--test-size', type=float, default=0.2)
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--batch-size', type=int, default=16)
+    parser.add_argument('--k', type=int, default=None, help="Voisins du vote (par défaut KNN_K)")
+    parser.add_argument('--weighting', choices=['weighted', 'majority'], default=None)
+    parser.add_argument('--threshold', type=float, default=None, help="Confiance de la tête en mode hybride")
+    parser.add_argument('--output', help="Fichier JSON des résultats")
+    args = parser.parse_args()
+
+    print("🚀 Comparaison des modes de classification")
+    print("=" * 60)
+
+    from score_finetuned import CLIPClassifierFinetuned
+    from embedding_index import EmbeddingIndex
+    from pixel_store import PixelStore, store_files
+
+    try:
+        index = EmbeddingIndex(args.index)
+    except FileNotFoundError:
+        print(f"❌ Index d'embeddings non trouvé: {args.index} (python azure_ml_api/embedding_index.py)")
+        return 1
+
+    train, test = load_split(args.csv, args.images, args.test_size, args.seed)
+    print(f"📊 {len(train)} produits d'apprentissage, {len(test)} produits de test")
+
+    # Seuls les produits d'apprentissage votent
+    index.set_labels(dict(zip(train['uniq_id'], train['label'])))
+
+    classifier = CLIPClassifierFinetuned()
+    classifier.embedding_index = index
+    if args.k:
+        classifier.knn_k = args.k
+    if args.weighting:
+        classifier.knn_weighting = args.weighting
+    if args.threshold is not None:
+        classifier.head_confidence_threshold = args.threshold
+
+    pixel_store = PixelStore(args.pixel_store) if os.path.exists(store_files(args.pixel_store)[1]) else None
+    records = test.to_dict('records')
+    batches = []
+    for start in range(0, len(records), args.batch_size):
+        batch = records[start:start + args.batch_size]
+        pixels = np.ascontiguousarray(load_pixels(classifier, batch, args.images, pixel_store))
+        batches.append((pixels, [record['text'] for record in batch], [record['label'] for record in batch]))
+
+    # Chauffe (allocation des buffers, chargement paresseux)
+    classifier.predict_pixel_batch(batches[0][0][:1], batches[0][1][:1])
+
+    results = [evaluate_mode(classifier, mode, batches) for mode in MODES]
+
+    print("\n" + "=" * 60)
+    print(f"{'Mode':>8} {'Exactitude':>11} {'kNN':>6} {'p50 batch':>10} {'p95 batch':>10} {'ms/produit':>11}")
+    for result in results:
+        print(f"{result['mode']:>8} {result['accuracy']:>11.1%} {result['knn_share']:>6.0%} "
+              f"{result['batch_ms_p50']:>8.1f}ms {result['batch_ms_p95']:>8.1f}ms {result['product_ms']:>11.2f}")
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump({
+                'test_size': args.test_size,
+                'seed': args.seed,
+                'batch_size': args.batch_size,
+                'knn_k': classifier.knn_k,
+                'knn_weighting': classifier.knn_weighting,
+                'head_confidence_threshold': classifier.head_confidence_threshold,
+                'results': results
+            }, f, indent=2)
+        print(f"\n✅ Résultats écrits dans {args.output}")
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,283 @@
+#!/usr/bin/env python3
+"""
+Évaluation hors ligne du classificateur sur le catalogue
+
+Chaque produit de produits_original.csv (avec son image dans Images/) est
+prédit un par un par CLIPClassifierFinetuned.predict_category, et
+optionnellement par score.CLIPClassifier.predict (modèle zero-shot). Le
+rapport contient :
+- l'exactitude globale et par catégorie, la matrice de confusion ;
+- les latences p50/p95/p99 d'une prédiction unitaire ;
+- le débit (produits/s) en batch pour plusieurs tailles de batch ;
+- le pic de mémoire résidente (RSS) du processus.
+
+Le rapport JSON est écrit avec des clés triées et des valeurs arrondies pour
+pouvoir être comparé entre deux exécutions (diff).
+
+Usage :
+    python evaluate.py --limit 200 --batch-sizes 1,8,32 --output reports/evaluation.json
+    python evaluate.py --models finetuned,zero-shot
+"""
+
+import os
+import sys
+import json
+import time
+import argparse
+import platform
+import resource
+import subprocess
+import numpy as np
+import pandas as pd
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), 'azure_ml_api'))
+
+MODELS = ['finetuned', 'zero-shot']
+DEFAULT_BATCH_SIZES = '1,8,32'
+THROUGHPUT_ROUNDS = 3
+
+
+def load_products(csv_path, image_folder, limit=None, seed=42):
+    """Produits étiquetés ayant une image, échantillon reproductible si limit est donné"""
+    from embedding_index import product_text
+    from category_tree import main_categories
+    products = pd.read_csv(csv_path).drop_duplicates('uniq_id')
+    products['label'] = main_categories(products['product_category_tree'])
+    products = products[products['label'].notna()]
+    products = products[[isinstance(name, str) and os.path.exists(os.path.join(image_folder, name))
+                         for name in products['image']]]
+    if limit and limit < len(products):
+        products = products.sample(n=limit, random_state=seed)
+    products = products.sort_values('uniq_id')
+    products['text'] = [product_text(record) for record in products.to_dict('records')]
+    return products[['uniq_id', 'image', 'label', 'text']].to_dict('records')
+
+
+def peak_rss_mb():
+    """Pic de mémoire résidente du processus (Mo)"""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss est en octets sous macOS, en kilo-octets sous Linux
+    return peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024
+
+
+def latency_summary(latencies_s):
+    """Percentiles de latence en millisecondes"""
+    latencies = np.array(latencies_s) * 1000
+    if len(latencies) == 0:
+        return {}
+    return {
+        'count': int(len(latencies)),
+        'mean_ms': round(float(latencies.mean()), 2),
+        'p50_ms': round(float(np.percentile(latencies, 50)), 2),
+        'p95_ms': round(float(np.percentile(latencies, 95)), 2),
+        'p99_ms': round(float(np.percentile(latencies, 99)), 2),
+        'max_ms': round(float(latencies.max()), 2)
+    }
+
+
+def accuracy_report(labels, predictions, categories):
+    """Exactitude globale, par catégorie et matrice de confusion {vraie: {prédite: n}}"""
+    confusion = {true: {pred: 0 for pred in categories} for true in categories}
+    for true, pred in zip(labels, predictions):
+        if true in confusion and pred in confusion[true]:
+            confusion[true][pred] += 1
+    per_category = {}
+    for category in categories:
+        total = sum(confusion[category].values())
+        predicted = sum(confusion[true][category] for true in categories)
+        correct = confusion[category][category]
+        per_category[category] = {
+            'support': total,
+            'recall': round(correct / total, 4) if total else None,
+            'precision': round(correct / predicted, 4) if predicted else None
+        }
+    correct = sum(true == pred for true, pred in zip(labels, predictions))
+    return {
+        'accuracy': round(correct / len(labels), 4) if labels else None,
+        'per_category': per_category,
+        'confusion': confusion
+    }
+
+
+def open_image(image_folder, record):
+    """Charger l'image d'un produit (pixels décodés hors de la mesure de latence)"""
+    from PIL import Image
+    with Image.open(os.path.join(image_folder, record['image'])) as img:
+        img.load()
+        return img
+
+
+def evaluate_single(predict, records, image_folder, categories):
+    """Prédictions unitaires : exactitude et latences"""
+    labels, predictions, latencies, errors = [], [], [], 0
+    for i, record in enumerate(records, 1):
+        image = open_image(image_folder, record)
+        start = time.perf_counter()
+        try:
+            predicted = predict(image, record['text'])
+        except Exception as e:
+            print(f"⚠️ Prédiction impossible pour {record['uniq_id']}: {str(e)}")
+            errors += 1
+            continue
+        latencies.append(time.perf_counter() - start)
+        labels.append(record['label'])
+        predictions.append(predicted)
+        if i % 50 == 0:
+            print(f"🔄 {i}/{len(records)} produits évalués")
+    report = accuracy_report(labels, predictions, categories)
+    report['errors'] = errors
+    report['latency'] = latency_summary(latencies)
+    return report
+
+
+def evaluate_throughput(classifier, records, image_folder, batch_sizes):
+    """Débit de predict_pixel_batch pour plusieurs tailles de batch (images déjà prétraitées)"""
+    from pixel_store import clip_image_processor, load_image, preprocess_uint8
+    images = [load_image(os.path.join(image_folder, record['image'])) for record in records]
+    kept = [(image, record['text']) for image, record in zip(images, records) if image is not None]
+    pixels = preprocess_uint8([image for image, _ in kept], clip_image_processor(classifier.processor))
+    texts = [text for _, text in kept]
+
+    results = {}
+    for batch_size in batch_sizes:
+        # Chauffe pour cette forme de batch
+        classifier.predict_pixel_batch(pixels[:batch_size], texts[:batch_size])
+        batch_latencies = []
+        processed = 0
+        start = time.perf_counter()
+        for _ in range(THROUGHPUT_ROUNDS):
+            for offset in range(0, len(texts), batch_size):
+                batch_start = time.perf_counter()
+                classifier.predict_pixel_batch(pixels[offset:offset + batch_size], texts[offset:offset + batch_size])
+                batch_latencies.append(time.perf_counter() - batch_start)
+                processed += len(texts[offset:offset + batch_size])
+        elapsed = time.perf_counter() - start
+        results[str(batch_size)] = {
+            'products_per_s': round(processed / elapsed, 2) if elapsed else None,
+            'batch_latency': latency_summary(batch_latencies)
+        }
+        print(f"⚡ batch {batch_size}: {results[str(batch_size)]['products_per_s']} produits/s")
+    return results
+
+
+def evaluate_finetuned(records, image_folder, batch_sizes):
+    """Évaluer CLIPClassifierFinetuned (tête de classification ou mode CLASSIFICATION_MODE)"""
+    from score_finetuned import CLIPClassifierFinetuned
+    start = time.perf_counter()
+    classifier = CLIPClassifierFinetuned()
+    load_time = time.perf_counter() - start
+
+    def predict(image, text):
+        return classifier.predict_category(image, text)['predicted_category']
+
+    report = evaluate_single(predict, records, image_folder, classifier.categories)
+    report['model_load_s'] = round(load_time, 2)
+    report['checkpoint'] = classifier.checkpoint_path
+    report['classification_mode'] = classifier.classification_mode
+    if batch_sizes:
+        report['throughput'] = evaluate_throughput(classifier, records, image_folder, batch_sizes)
+    report['token_cache'] = classifier.token_cache.stats()
+    return report
+
+
+def evaluate_zero_shot(records, image_folder):
+    """Évaluer score.CLIPClassifier (pas d'API batch : prédictions unitaires seulement)"""
+    from score import CLIPClassifier
+    start = time.perf_counter()
+    classifier = CLIPClassifier()
+    load_time = time.perf_counter() - start
+
+    def predict(image, text):
+        result = classifier.predict(image, text)
+        if not result['success']:
+            raise RuntimeError(result['error'])
+        return result['predicted_category']
+
+    report = evaluate_single(predict, records, image_folder, classifier.categories)
+    report['model_load_s'] = round(load_time, 2)
+    return report
+
+
+def git_revision():
+    """Commit courant (None hors d'un dépôt git)"""
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'],
+                                       stderr=subprocess.DEVNULL, text=True).strip()
+    except Exception:
+        return None
+
+
+def print_summary(name, report):
+    """Afficher le résumé d'un modèle"""
+    latency = report.get('latency', {})
+    print(f"\n📊 {name}")
+    print(f"   Exactitude : {report['accuracy']:.1%}" if report['accuracy'] is not None else "   Exactitude : n/a")
+    if latency:
+        print(f"   Latence    : p50 {latency['p50_ms']} ms, p95 {latency['p95_ms']} ms, p99 {latency['p99_ms']} ms")
+    for category, scores in report['per_category'].items():
+        recall = f"{scores['recall']:.1%}" if scores['recall'] is not None else "n/a"
+        print(f"   {category:<30} rappel {recall:>7} ({scores['support']} produits)")
+
+
+def main():
+    """Fonction principale"""
+    parser = argparse.ArgumentParser(description="Évaluer le classificateur sur le catalogue (exactitude et latence)")
+    parser.add_argument('--csv', default='produits_original.csv')
+    parser.add_argument('--images', default='Images')
+    parser.add_argument('--models', default='finetuned', help=f"Modèles évalués, parmi {','.join(MODELS)}")
+    parser.add_argument('--limit', type=int, default=None, help="Nombre de produits (échantillon reproductible)")
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--batch-sizes', default=DEFAULT_BATCH_SIZES,
+                        help="Tailles de batch pour le débit (vide pour ne pas le mesurer)")
+    parser.add_argument('--output', default='reports/evaluation.json', help="Rapport JSON")
+    args = parser.parse_args()
+
+    models = [name.strip() for name in args.models.split(',') if name.strip()]
+    unknown = [name for name in models if name not in MODELS]
+    if unknown:
+        print(f"❌ Modèle(s) inconnu(s): {', '.join(unknown)}")
+        return 1
+    batch_sizes = [int(size) for size in args.batch_sizes.split(',') if size.strip()]
+
+    print("🚀 Évaluation hors ligne du classificateur")
+    print("=" * 60)
+    records = load_products(args.csv, args.images, args.limit, args.seed)
+    if not records:
+        print(f"❌ Aucun produit avec image dans {args.csv} / {args.images}")
+        return 1
+    print(f"📦 {len(records)} produits évalués")
+
+    report = {
+        'run': {
+            'git_revision': git_revision(),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'csv': args.csv,
+            'products': len(records),
+            'seed': args.seed,
+            'limit': args.limit,
+            'batch_sizes': batch_sizes
+        },
+        'models': {}
+    }
+    for name in models:
+        if name == 'finetuned':
+            report['models'][name] = evaluate_finetuned(records, args.images, batch_sizes)
+        else:
+            report['models'][name] = evaluate_zero_shot(records, args.images)
+        print_summary(name, report['models'][name])
+    report['run']['peak_rss_mb'] = round(peak_rss_mb(), 1)
+    print(f"\n💾 Pic de mémoire résidente : {report['run']['peak_rss_mb']} Mo")
+
+    os.makedirs(os.path.dirname(args.output) or '.', exist_ok=True)
+    tmp_path = f"{args.output}.{os.getpid()}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(report, f, indent=2, sort_keys=True, ensure_ascii=False)
+        f.write('\n')
+    os.replace(tmp_path, args.output)
+    print(f"✅ Rapport écrit dans {args.output}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,125 @@
+#!/usr/bin/env python3
+"""
+Index des métadonnées des images produits (dimensions)
+
+Seuls les en-têtes des fichiers sont lus (pas de décodage des pixels), en
+parallèle sur un pool de threads. Le résultat est enregistré dans le dossier
+de cache voisin des images (Images.cache/), indexé par nom de fichier et date
+de modification : les démarrages suivants relisent l'index au lieu d'ouvrir
+les 1000+ images. Rien n'est écrit dans le dossier des images lui-même.
+"""
+
+import os
+import json
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from PIL import Image
+
+logger = logging.getLogger(__name__)
+
+INDEX_FILENAME = 'image_index.json'
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png')
+MAX_WORKERS = 8
+
+
+def cache_dir(image_folder='Images'):
+    """Dossier des fichiers dérivés des images, à côté du dossier (Images -> Images.cache)"""
+    return os.path.normpath(image_folder) + '.cache'
+
+
+def read_image_header(image_path):
+    """Lire les dimensions d'une image depuis son en-tête"""
+    try:
+        # Image.open ne lit que l'en-tête, les pixels ne sont décodés qu'à la demande
+        with Image.open(image_path) as img:
+            width, height = img.size
+        return {'width': width, 'height': height}
+    except Exception:
+        return {'width': 0, 'height': 0}
+
+
+def load_sidecar(index_path):
+    """Charger un index JSON existant ({} si absent ou illisible)"""
+    try:
+        with open(index_path, encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def save_sidecar(index_path, index):
+    """Enregistrer un index JSON (écriture atomique, dossier créé si besoin)"""
+    tmp_path = f"{index_path}.{os.getpid()}.tmp"
+    try:
+        os.makedirs(os.path.dirname(index_path) or '.', exist_ok=True)
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(index, f)
+        os.replace(tmp_path, index_path)
+    except OSError as e:
+        logger.warning(f"⚠️ Impossible d'enregistrer l'index des images: {str(e)}")
+
+
+def load_image_index(image_folder='Images', max_workers=MAX_WORKERS):
+    """Obtenir {nom de fichier: {mtime, width, height}} pour toutes les images du dossier"""
+    if not os.path.isdir(image_folder):
+        return {}
+
+    index_path = os.path.join(cache_dir(image_folder), INDEX_FILENAME)
+    cached = load_sidecar(index_path)
+
+    index = {}
+    to_scan = []
+    with os.scandir(image_folder) as entries:
+        for entry in entries:
+            if not entry.name.lower().endswith(IMAGE_EXTENSIONS) or not entry.is_file():
+                continue
+            mtime = entry.stat().st_mtime
+            previous = cached.get(entry.name)
+            if previous and previous.get('mtime') == mtime:
+                index[entry.name] = previous
+            else:
+                to_scan.append((entry.name, mtime))
+
+    if to_scan:
+        paths = [os.path.join(image_folder, name) for name, _ in to_scan]
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            headers = executor.map(read_image_header, paths)
+        for (name, mtime), header in zip(to_scan, headers):
+            index[name] = {'mtime': mtime, **header}
+        logger.info(f"🔄 {len(to_scan)} image(s) indexée(s) dans {image_folder}")
+
+    # Réécrire l'index si des images ont été ajoutées, modifiées ou supprimées
+    if to_scan or len(index) != len(cached):
+        save_sidecar(index_path, index)
+
+    return index
+
+
+def latest_image_mtime(image_folder='Images'):
+    """Date de modification la plus récente parmi les images et le dossier (0 si absent)
+
+    Le dossier change lors d'un ajout ou d'une suppression, pas quand une image
+    existante est réécrite : la date de chaque fichier est donc aussi prise en
+    compte. Index et miniatures sont écrits dans cache_dir(), hors du dossier,
+    pour ne pas modifier sa date.
+    """
+    if not os.path.isdir(image_folder):
+        return 0.0
+    latest = os.path.getmtime(image_folder)
+    with os.scandir(image_folder) as entries:
+        for entry in entries:
+            if entry.name.lower().endswith(IMAGE_EXTENSIONS) and entry.is_file():
+                latest = max(latest, entry.stat().st_mtime)
+    return latest
+
+
+def lookup_images(filenames, image_folder='Images', max_workers=MAX_WORKERS):
+    """Métadonnées pour une liste de noms de fichiers (None si absent ou non renseigné)"""
+    index = load_image_index(image_folder, max_workers)
+    results = []
+    for name in filenames:
+        if isinstance(name, str) and name in index:
+            results.append(index[name])
+        else:
+            results.append(None)
+    return results
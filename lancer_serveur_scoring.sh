@@ -0,0 +1,24 @@
+#!/bin/bash
+
+# Script pour lancer le serveur de scoring local (remplace l'endpoint Azure ML en développement)
+echo "🚀 Lancement du serveur de scoring local"
+echo "========================================"
+
+PORT=${SCORING_PORT:-5001}
+WORKERS=${SCORING_WORKERS:-1}
+
+# Activer l'environnement virtuel
+echo "🔧 Activation de l'environnement virtuel..."
+source clip_cloud_env/bin/activate
+
+# Emplacement du modèle fine-tuné (le .safetensors voisin est prioritaire)
+export FINETUNED_MODEL_PATH=${FINETUNED_MODEL_PATH:-new_clip_product_classifier.pth}
+
+echo "🔄 Chargement du modèle et démarrage de $WORKERS worker(s)..."
+echo ""
+echo "🔗 Pour utiliser ce serveur depuis l'application :"
+echo "   export AZURE_ML_ENDPOINT_URL=http://localhost:$PORT/score"
+echo ""
+echo "🛑 Pour arrêter le serveur : Ctrl+C"
+
+python azure_ml_api/local_server.py --port "$PORT" --workers "$WORKERS"
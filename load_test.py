@@ -0,0 +1,264 @@
+#!/usr/bin/env python3
+"""
+Test de charge du service de scoring par rejeu d'un fichier JSONL
+
+Chaque ligne du fichier ({"request_id", "title", "body"}, format de
+requests.jsonl et des captures du service) devient une requête POST /score :
+- body objet avec "image" et "text" : envoyé tel quel ;
+- body objet sans image (ou capture en mode hash, où image et texte sont des
+  empreintes) : image de test par défaut, texte du body ou à défaut le titre ;
+- body texte : utilisé comme description, avec l'image de test par défaut.
+
+Deux modes de charge :
+- open : arrivées de Poisson à --rate requêtes/s, indépendantes des réponses
+  (la latence est mesurée depuis l'instant d'envoi prévu, file d'attente
+  côté client comprise) ;
+- closed : --concurrency clients qui enchaînent les requêtes ; plusieurs
+  niveaux peuvent être donnés (1,2,4,8).
+
+Le rapport donne le débit, les percentiles de latence et le taux d'erreur de
+chaque palier.
+
+Usage :
+    python load_test.py --endpoint http://localhost:5001/score --mode closed --concurrency 1,2,4 --requests 100
+    python load_test.py --mode open --rate 2,4,8 --duration 60 --output reports/load_test.json
+"""
+
+import os
+import io
+import sys
+import json
+import time
+import base64
+import random
+import argparse
+import threading
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+import requests
+from PIL import Image
+
+DEFAULT_ENDPOINT = os.getenv('AZURE_ML_ENDPOINT_URL', 'http://localhost:5001/score')
+DEFAULT_IMAGE = 'Images/1120bc768623572513df956172ffefeb.jpg'
+DEFAULT_TIMEOUT = 60
+
+
+def encode_image(path):
+    """Image en base64, ramenée à 224 px et encodée en JPEG comme par l'application"""
+    with Image.open(path) as img:
+        img = img.convert('RGB')
+        img.thumbnail((224, 224), Image.LANCZOS)
+        buffer = io.BytesIO()
+        img.save(buffer, format='JPEG', quality=85)
+    return base64.b64encode(buffer.getvalue()).decode('utf-8')
+
+
+def load_payloads(path, default_image):
+    """Corps JSON des requêtes à rejouer, dans l'ordre du fichier"""
+    payloads = []
+    with open(path, encoding='utf-8') as f:
+        for line_number, line in enumerate(f, 1):
+            if not line.strip():
+                continue
+            try:
+                record = json.loads(line)
+            except ValueError:
+                print(f"⚠️ Ligne {line_number} ignorée (JSON invalide)")
+                continue
+            body = record.get('body')
+            is_text = {name: isinstance(body, dict) and isinstance(body.get(name), str) and bool(body[name])
+                       for name in ('image', 'text')}
+            if is_text['image'] and is_text['text']:
+                payload = body
+            elif isinstance(body, dict):
+                payload = {'image': default_image, 'text': body['text'] if is_text['text'] else record.get('title', '')}
+            else:
+                payload = {'image': default_image, 'text': str(body or record.get('title', ''))}
+            payloads.append(json.dumps(payload))
+    return payloads
+
+
+class Sender:
+    """Envoi des requêtes (une session HTTP par thread si keep-alive)"""
+
+    def __init__(self, endpoint, api_key=None, timeout=DEFAULT_TIMEOUT, keep_alive=False):
+        self.endpoint = endpoint
+        self.timeout = timeout
+        self.keep_alive = keep_alive
+        self.headers = {'Content-Type': 'application/json'}
+        if api_key:
+            self.headers['Authorization'] = f'Bearer {api_key}'
+        if not keep_alive:
+            # Une connexion par requête, comme le serveur local (qui ferme après chaque réponse)
+            self.headers['Connection'] = 'close'
+        self._local = threading.local()
+
+    def _session(self):
+        if not hasattr(self._local, 'session'):
+            self._local.session = requests.Session()
+        return self._local.session
+
+    def send(self, payload, scheduled=None):
+        """Envoyer une requête, renvoie (latence en s depuis l'envoi prévu, statut)"""
+        start = scheduled if scheduled is not None else time.perf_counter()
+        try:
+            if self.keep_alive:
+                response = self._session().post(self.endpoint, data=payload, headers=self.headers, timeout=self.timeout)
+            else:
+                response = requests.post(self.endpoint, data=payload, headers=self.headers, timeout=self.timeout)
+            status = str(response.status_code)
+            if response.status_code == 200:
+                try:
+                    if response.json().get('status') != 'success':
+                        status = 'api_error'
+                except ValueError:
+                    status = 'invalid_json'
+        except requests.exceptions.Timeout:
+            status = 'timeout'
+        except requests.exceptions.RequestException:
+            status = 'connection_error'
+        return time.perf_counter() - start, status
+
+
+def summarize(label, results, elapsed):
+    """Débit, percentiles de latence et erreurs d'un palier"""
+    latencies = np.array([latency for latency, _ in results]) * 1000
+    statuses = Counter(status for _, status in results)
+    errors = sum(count for status, count in statuses.items() if status != '200')
+    summary = {
+        'level': label,
+        'requests': len(results),
+        'duration_s': round(elapsed, 2),
+        'throughput_rps': round(len(results) / elapsed, 2) if elapsed else None,
+        'error_rate': round(errors / len(results), 4) if results else None,
+        'statuses': dict(statuses)
+    }
+    if len(latencies):
+        for name, q in (('p50', 50), ('p90', 90), ('p95', 95), ('p99', 99)):
+            summary[f'{name}_ms'] = round(float(np.percentile(latencies, q)), 1)
+        summary['max_ms'] = round(float(latencies.max()), 1)
+    return summary
+
+
+def run_closed(sender, payloads, concurrency, count=None, duration=None):
+    """N clients en boucle fermée : chacun envoie la requête suivante dès la réponse reçue"""
+    results = []
+    lock = threading.Lock()
+    position = iter(range(10 ** 12))
+    deadline = time.perf_counter() + duration if duration else None
+
+    def client():
+        while True:
+            with lock:
+                i = next(position)
+            if (count is not None and i >= count) or (deadline and time.perf_counter() >= deadline):
+                return
+            result = sender.send(payloads[i % len(payloads)])
+            with lock:
+                results.append(result)
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        for _ in range(concurrency):
+            executor.submit(client)
+    return results, time.perf_counter() - start
+
+
+def run_open(sender, payloads, rate, count=None, duration=None, max_in_flight=256, seed=42):
+    """Arrivées de Poisson à `rate` requêtes/s, sans attendre les réponses"""
+    rng = random.Random(seed)
+    futures = []
+    start = time.perf_counter()
+    scheduled = start
+    with ThreadPoolExecutor(max_workers=max_in_flight) as executor:
+        i = 0
+        while (count is None or i < count) and (not duration or scheduled - start < duration):
+            delay = scheduled - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            futures.append(executor.submit(sender.send, payloads[i % len(payloads)], scheduled))
+            scheduled += rng.expovariate(rate)
+            i += 1
+        results = [future.result() for future in futures]
+    return results, time.perf_counter() - start
+
+
+def print_summary(summary, unit):
+    latency = (f"p50 {summary['p50_ms']} ms, p95 {summary['p95_ms']} ms, p99 {summary['p99_ms']} ms"
+               if 'p50_ms' in summary else "aucune réponse")
+    status = "✅" if summary['error_rate'] == 0 else "⚠️"
+    print(f"{status} {unit} {summary['level']:>6} : {summary['throughput_rps']:>7} req/s, {latency}, "
+          f"erreurs {summary['error_rate']:.1%}")
+
+
+def parse_levels(value, cast):
+    return [cast(level) for level in value.split(',') if level.strip()]
+
+
+def main():
+    """Fonction principale"""
+    parser = argparse.ArgumentParser(description="Rejouer un fichier JSONL de requêtes contre l'endpoint de scoring")
+    parser.add_argument('--endpoint', default=DEFAULT_ENDPOINT, help="URL de /score (Azure ML ou serveur local)")
+    parser.add_argument('--api-key', default=os.getenv('AZURE_ML_API_KEY'))
+    parser.add_argument('--file', default='requests.jsonl', help="Requêtes à rejouer (JSONL)")
+    parser.add_argument('--image', default=DEFAULT_IMAGE, help="Image des requêtes qui n'en ont pas")
+    parser.add_argument('--mode', choices=['closed', 'open'], default='closed')
+    parser.add_argument('--concurrency', default='1,2,4', help="Niveaux de concurrence (mode closed)")
+    parser.add_argument('--rate', default='1,2,4', help="Débits d'arrivée en req/s (mode open)")
+    parser.add_argument('--requests', type=int, default=None, help="Requêtes par palier (par défaut : tout le fichier)")
+    parser.add_argument('--duration', type=float, default=None, help="Durée d'un palier en secondes")
+    parser.add_argument('--max-in-flight', type=int, default=256, help="Requêtes simultanées maximales (mode open)")
+    parser.add_argument('--timeout', type=float, default=DEFAULT_TIMEOUT)
+    parser.add_argument('--keep-alive', action='store_true', help="Connexions persistantes (une par thread client, endpoint Azure ML ; le serveur local ferme après chaque réponse)")
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--output', help="Rapport JSON")
+    args = parser.parse_args()
+
+    if not os.path.exists(args.file):
+        print(f"❌ Fichier non trouvé: {args.file}")
+        return 1
+    if not os.path.exists(args.image):
+        print(f"❌ Image par défaut non trouvée: {args.image}")
+        return 1
+
+    payloads = load_payloads(args.file, encode_image(args.image))
+    if not payloads:
+        print(f"❌ Aucune requête dans {args.file}")
+        return 1
+    count = args.requests if args.requests is not None else (None if args.duration else len(payloads))
+
+    print(f"🚀 Test de charge ({args.mode}) sur {args.endpoint}")
+    print(f"📦 {len(payloads)} requêtes chargées depuis {args.file}")
+    print("=" * 60)
+
+    sender = Sender(args.endpoint, args.api_key, args.timeout, args.keep_alive)
+    summaries = []
+    if args.mode == 'closed':
+        for concurrency in parse_levels(args.concurrency, int):
+            results, elapsed = run_closed(sender, payloads, concurrency, count, args.duration)
+            summaries.append(summarize(concurrency, results, elapsed))
+            print_summary(summaries[-1], "concurrence")
+    else:
+        for rate in parse_levels(args.rate, float):
+            results, elapsed = run_open(sender, payloads, rate, count, args.duration, args.max_in_flight, args.seed)
+            summaries.append(summarize(rate, results, elapsed))
+            print_summary(summaries[-1], "débit")
+
+    if args.output:
+        os.makedirs(os.path.dirname(args.output) or '.', exist_ok=True)
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump({
+                'endpoint': args.endpoint,
+                'file': args.file,
+                'mode': args.mode,
+                'keep_alive': args.keep_alive,
+                'levels': summaries
+            }, f, indent=2)
+        print(f"\n✅ Rapport écrit dans {args.output}")
+
+    return 0 if all(summary['error_rate'] == 0 for summary in summaries) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
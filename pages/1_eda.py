@@ -6,7 +6,8 @@ try:
 except ImportError:
     WordCloud = None
 import matplotlib.pyplot as plt
-from PIL import Image
+import plotly.io as pio
+import io
 import os
 try:
     import torch
@@ -21,53 +22,23 @@ import sys
 import os
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 from accessibility import init_accessibility_state, render_accessibility_sidebar, apply_accessibility_styles
+from product_data import get_products, CSV_PATH, DATASET_PATH, IMAGE_FOLDER
+from image_index import latest_image_mtime
+from thumbnails import get_thumbnail, DISPLAY
 
 # Initialiser l'état d'accessibilité
 init_accessibility_state()
 
 # Charger les données si elles ne sont pas disponibles
 if 'df' not in st.session_state:
-    @st.cache_data
     def load_and_process_data():
-        """Charge et traite les données des produits"""
+        """Charge les données des produits depuis le jeu de données précalculé"""
         try:
-            # Charger les données
-            df = pd.read_csv('produits_original.csv')
-            
-            # Traiter les catégories (structure différente dans produits_demo.csv)
-            import ast
-            df['categories'] = df['product_category_tree'].apply(lambda x: ast.literal_eval(x) if isinstance(x, str) else x)
-            # Extraire seulement la catégorie principale (avant le premier >>)
-            df['main_category'] = df['categories'].apply(lambda x: x[0].split(' >> ')[0] if x and len(x) > 0 else 'Unknown')
-            df['sub_categories'] = df['categories'].apply(lambda x: x[0].split(' >> ')[1] if x and len(x) > 0 and ' >> ' in x[0] else 'Unknown')
-            
-            # Ajouter des informations sur les images (colonne 'image' dans produits_original.csv)
-            df['image_exists'] = df['image'].apply(lambda x: os.path.exists(f"Images/{x}") if pd.notna(x) else False)
-            df['image_pixels'] = df['image'].apply(lambda x: get_image_pixels(f"Images/{x}") if pd.notna(x) and os.path.exists(f"Images/{x}") else 0)
-            df['aspect_ratio'] = df['image'].apply(lambda x: get_aspect_ratio(f"Images/{x}") if pd.notna(x) and os.path.exists(f"Images/{x}") else 0)
-            
-            return df
+            return get_products()
         except Exception as e:
             st.error(f"❌ Erreur lors du chargement des données: {str(e)}")
             return pd.DataFrame()
     
-    def get_image_pixels(image_path):
-        """Obtient le nombre de pixels d'une image"""
-        try:
-            with Image.open(image_path) as img:
-                return img.width * img.height
-        except:
-            return 0
-    
-    def get_aspect_ratio(image_path):
-        """Obtient le ratio d'aspect d'une image"""
-        try:
-            with Image.open(image_path) as img:
-                return img.width / img.height
-        except:
-            return 0
-    
-    import ast
     with st.spinner("🔄 Chargement des données..."):
         st.session_state.df = load_and_process_data()
 
@@ -93,16 +64,267 @@ if missing_columns:
 ACCESSIBLE_COLORS = ['#1f77b4', '#ff7f0e', '#2ca02c', '#d62728', '#9467bd', 
                     '#8c564b', '#e377c2', '#7f7f7f', '#bcbd22', '#17becf']
 
-# Configuration des couleurs selon le mode d'accessibilité
-if st.session_state.accessibility.get('color_blind', False):
-    PLOTLY_COLORS = px.colors.qualitative.Safe  # Accessible palette for color-blind users
-elif st.session_state.accessibility.get('high_contrast', False):
-    # Palette optimisée pour le mode contraste élevé (couleurs vives sur fond sombre)
-    PLOTLY_COLORS = ['#FF6B6B', '#4ECDC4', '#45B7D1', '#96CEB4', '#FFEAA7', 
-                     '#DDA0DD', '#98D8C8', '#F7DC6F', '#BB8FCE', '#85C1E9',
-                     '#F8C471', '#82E0AA', '#F1948A', '#85C1E9', '#D7BDE2']
-else:
-    PLOTLY_COLORS = ACCESSIBLE_COLORS
+# Palette optimisée pour le mode contraste élevé (couleurs vives sur fond sombre)
+HIGH_CONTRAST_COLORS = ['#FF6B6B', '#4ECDC4', '#45B7D1', '#96CEB4', '#FFEAA7', 
+                        '#DDA0DD', '#98D8C8', '#F7DC6F', '#BB8FCE', '#85C1E9',
+                        '#F8C471', '#82E0AA', '#F1948A', '#85C1E9', '#D7BDE2']
+
+# Options d'accessibilité qui changent le rendu des graphiques
+ACCESSIBILITY_OPTIONS = ('high_contrast', 'color_blind', 'large_text')
+
+
+def accessibility_mode():
+    """Combinaison courante des options d'accessibilité (clé du cache de rendu)"""
+    return tuple(bool(st.session_state.accessibility.get(option, False)) for option in ACCESSIBILITY_OPTIONS)
+
+
+def data_version(*paths):
+    """Version des données : date de modification de chaque fichier source"""
+    return tuple(os.path.getmtime(path) if os.path.exists(path) else None for path in paths)
+
+
+def plotly_colors(high_contrast, color_blind):
+    """Palette des graphiques selon le mode d'accessibilité"""
+    if color_blind:
+        return px.colors.qualitative.Safe  # Accessible palette for color-blind users
+    if high_contrast:
+        return HIGH_CONTRAST_COLORS
+    return ACCESSIBLE_COLORS
+
+
+# Les rendus ci-dessous sont mis en cache (mémoire et disque) par version des
+# données et mode d'accessibilité : cocher une option ne recalcule que la
+# première fois chaque combinaison. Les DataFrames préfixés par _ ne sont pas
+# hachés, la version des fichiers sources sert de clé.
+
+@st.cache_data(persist="disk", max_entries=32, show_spinner=False)
+def render_product_charts(version, mode, _df):
+    """Graphiques des catégories et des images, au format JSON Plotly"""
+    high_contrast, color_blind, large_text = mode
+    colors = plotly_colors(high_contrast, color_blind)
+    bg_color = '#000000' if high_contrast else '#FFFFFF'
+    text_color = '#FFFFFF' if high_contrast else '#000000'
+    charts = {'categories': None, 'sub_categories': None, 'images': None}
+
+    category_count = _df['main_category'].value_counts()
+    if not category_count.empty:
+        # Graphique accessible avec couleurs contrastées
+        fig1 = px.bar(category_count, x=category_count.index, y=category_count.values, 
+                      title="Nombre de Produits par Catégorie Principale",
+                      color=category_count.index,
+                      color_discrete_sequence=colors[:len(category_count)])
+        
+        fig1.update_layout(
+            xaxis_title="Catégories",
+            yaxis_title="Nombre de produits",
+            plot_bgcolor=bg_color,
+            paper_bgcolor=bg_color,
+            font=dict(size=14 if not large_text else 18, color=text_color),
+            legend_title="Catégories",
+            legend=dict(font=dict(color=text_color)),
+            margin=dict(l=50, r=50, t=50, b=100),  # Ensure enough space for rotated labels
+            hoverlabel=dict(
+                bgcolor="white",
+                font_size=14 if not large_text else 16,
+                font_family="Arial, sans-serif",
+                font_color="black",
+                bordercolor="black"
+            )
+        )
+        fig1.update_xaxes(
+            tickangle=45,
+            tickfont=dict(color=text_color, size=14 if not large_text else 16)
+        )
+        fig1.update_yaxes(
+            tickfont=dict(color=text_color, size=14 if not large_text else 16)
+        )
+        charts['categories'] = fig1.to_json()
+
+    subcat_count = _df['sub_categories'].value_counts().head(20)
+    if not subcat_count.empty:
+        # Graphique en camembert avec couleurs accessibles
+        fig2 = px.pie(subcat_count, values=subcat_count.values, names=subcat_count.index, 
+                      title="Top 20 Branches de Catégories",
+                      color_discrete_sequence=colors)
+        fig2.update_traces(
+            textposition='inside',
+            textinfo='percent+label',
+            hovertemplate='<b>%{label}</b><br>Valeur: %{value}<br>Pourcentage: %{percent}',
+            textfont=dict(color=text_color, size=14 if not large_text else 16)
+        )
+        fig2.update_layout(
+            uniformtext_minsize=12 if not large_text else 16,
+            uniformtext_mode='hide',
+            legend=dict(orientation="v", yanchor="top", y=1, xanchor="left", x=1.02, font=dict(color=text_color, size=10)),
+            plot_bgcolor=bg_color,
+            paper_bgcolor=bg_color,
+            font=dict(color=text_color),
+            margin=dict(r=200),  # Ajouter une marge à droite pour la légende
+            hoverlabel=dict(
+                bgcolor="white",
+                font_size=14 if not large_text else 16,
+                font_family="Arial, sans-serif",
+                font_color="black",
+                bordercolor="black"
+            )
+        )
+        charts['sub_categories'] = fig2.to_json()
+
+    valid_image_df = _df[_df['image_pixels'] > 0][['image_pixels', 'aspect_ratio']]
+    if not valid_image_df.empty:
+        # Scatter plot accessible
+        fig5 = px.scatter(valid_image_df, x='aspect_ratio', y='image_pixels', 
+                          color=_df.loc[valid_image_df.index, 'main_category'],
+                          title="Ratio Hauteur/Largeur vs Nombre de Pixels (Images Valides)",
+                          color_discrete_sequence=colors,
+                          labels={'aspect_ratio': 'Ratio Hauteur/Largeur', 'image_pixels': 'Nombre de Pixels'})
+        fig5.update_layout(
+            plot_bgcolor=bg_color,
+            paper_bgcolor=bg_color,
+            font=dict(size=12 if not large_text else 16, color=text_color),
+            legend_title="Catégories principales",
+            legend=dict(font=dict(color=text_color)),
+            hoverlabel=dict(
+                bgcolor="white",
+                font_size=14 if not large_text else 16,
+                font_family="Arial, sans-serif",
+                font_color="black",
+                bordercolor="black"
+            )
+        )
+        fig5.update_traces(
+            marker=dict(size=8, opacity=0.7),
+            selector=dict(mode='markers')
+        )
+        fig5.update_xaxes(
+            tickfont=dict(color=text_color, size=12 if not large_text else 16)
+        )
+        fig5.update_yaxes(
+            tickfont=dict(color=text_color, size=12 if not large_text else 16)
+        )
+        charts['images'] = fig5.to_json()
+
+    return charts
+
+
+def render_wordcloud_png(top_keywords, high_contrast, color_blind, large_text):
+    """Nuage de mots avec contraste amélioré, rendu en PNG"""
+    # Choisir la palette en fonction du mode d'accessibilité
+    if color_blind:
+        colormap = 'viridis'
+    elif high_contrast:
+        colormap = 'hot'
+    else:
+        colormap = 'plasma'
+    
+    wordcloud = WordCloud(
+        width=800, 
+        height=400, 
+        background_color='black' if high_contrast else 'white',
+        colormap=colormap,
+        contour_color='white' if high_contrast else 'black',
+        contour_width=1
+    ).generate_from_frequencies(top_keywords)
+    
+    fig = plt.figure(figsize=(10, 5))
+    plt.imshow(wordcloud, interpolation='bilinear')
+    plt.axis('off')
+    plt.title("Nuage de Mots des Mots-Clés les Plus Fréquents", 
+             fontsize=16 if not large_text else 20, 
+             pad=20,
+             color='white' if high_contrast else 'black')
+    
+    # Appliquer le fond sombre en mode contraste élevé
+    if high_contrast:
+        plt.gca().set_facecolor('black')
+        fig.set_facecolor('black')
+    
+    buffer = io.BytesIO()
+    fig.savefig(buffer, format='png', bbox_inches='tight')
+    plt.close(fig)
+    return buffer.getvalue()
+
+
+@st.cache_data(persist="disk", max_entries=32, show_spinner=False)
+def render_keyword_charts(version, mode, _keyword_freq_df):
+    """Graphiques des mots-clés (JSON Plotly) et nuage de mots (PNG)"""
+    high_contrast, color_blind, large_text = mode
+    colors = plotly_colors(high_contrast, color_blind)
+    bg_color = '#000000' if high_contrast else '#FFFFFF'
+    text_color = '#FFFFFF' if high_contrast else '#000000'
+
+    # Graphique barre accessible
+    fig3 = px.bar(_keyword_freq_df.head(50), x='Mot Clé', y='Fréquence', 
+                  title="Fréquence des Mots-Clés (Top 50)",
+                  color='Fréquence',
+                  color_continuous_scale='viridis' if color_blind 
+                  else 'plasma' if high_contrast 
+                  else 'Blues')
+    fig3.update_layout(
+        xaxis_title="Mots-clés",
+        yaxis_title="Fréquence",
+        xaxis_tickangle=45,
+        plot_bgcolor=bg_color,
+        paper_bgcolor=bg_color,
+        font=dict(size=14 if not large_text else 18, color=text_color),
+        showlegend=False,
+        hoverlabel=dict(
+            bgcolor="white" if high_contrast else "rgba(255,255,255,0.8)",
+            font_size=14 if not large_text else 16,
+            font_family="Arial, sans-serif",
+            font_color="black" if high_contrast else "black"
+        )
+    )
+    fig3.update_xaxes(
+        tickfont=dict(color=text_color, size=14 if not large_text else 16)
+    )
+    fig3.update_yaxes(
+        tickfont=dict(color=text_color, size=14 if not large_text else 16)
+    )
+
+    # Graphique camembert accessible
+    fig4 = px.pie(_keyword_freq_df.head(20), values='Fréquence', names='Mot Clé', 
+                  title="Top 20 Mots-Clés par Fréquence",
+                  color_discrete_sequence=colors)
+    fig4.update_traces(
+        textposition='inside',
+        textinfo='percent+label',
+        hovertemplate='<b>%{label}</b><br>Fréquence: %{value}<br>Pourcentage: %{percent}',
+        textfont=dict(color=text_color, size=14 if not large_text else 16)
+    )
+    fig4.update_layout(
+        plot_bgcolor=bg_color,
+        paper_bgcolor=bg_color,
+        font=dict(color=text_color),
+        legend=dict(font=dict(color=text_color)),
+        hoverlabel=dict(
+            bgcolor="white" if high_contrast else "rgba(255,255,255,0.8)",
+            font_size=14 if not large_text else 16,
+            font_family="Arial, sans-serif",
+            font_color="black" if high_contrast else "black"
+        )
+    )
+
+    # Le calcul de la disposition du nuage de mots prend plusieurs secondes
+    top_keywords = dict(_keyword_freq_df.head(50)[['Mot Clé', 'Fréquence']].values)
+    wordcloud_png = None
+    if top_keywords and WordCloud is not None:
+        wordcloud_png = render_wordcloud_png(top_keywords, high_contrast, color_blind, large_text)
+
+    return {'bar': fig3.to_json(), 'pie': fig4.to_json(), 'wordcloud': wordcloud_png}
+
+
+@st.cache_data(show_spinner=False)
+def load_keyword_frequencies(version):
+    """Lire les fréquences de mots-clés (relu seulement si le fichier change)"""
+    return pd.read_csv(KEYWORD_FREQ_PATH)
+
+
+mode = accessibility_mode()
+high_contrast, color_blind, large_text = mode
+# Images : date du fichier le plus récent (réécrire une image ne change pas la date du dossier)
+products_version = data_version(DATASET_PATH, CSV_PATH) + (latest_image_mtime(IMAGE_FOLDER),)
+product_charts = render_product_charts(products_version, mode, df)
 
 # Données structurées
 st.subheader("Données Structurées")
@@ -132,41 +354,7 @@ if category_count.empty:
     st.warning("⚠️ Aucune catégorie principale trouvée dans le DataFrame.")
 else:
     st.dataframe(category_count)
-
-    # Graphique accessible avec couleurs contrastées
-    bg_color = '#000000' if st.session_state.accessibility.get('high_contrast', False) else '#FFFFFF'
-    text_color = '#FFFFFF' if st.session_state.accessibility.get('high_contrast', False) else '#000000'
-    
-    fig1 = px.bar(category_count, x=category_count.index, y=category_count.values, 
-                  title="Nombre de Produits par Catégorie Principale",
-                  color=category_count.index,
-                  color_discrete_sequence=PLOTLY_COLORS[:len(category_count)])
-    
-    fig1.update_layout(
-        xaxis_title="Catégories",
-        yaxis_title="Nombre de produits",
-        plot_bgcolor=bg_color,
-        paper_bgcolor=bg_color,
-        font=dict(size=14 if not st.session_state.accessibility.get('large_text', False) else 18, color=text_color),
-        legend_title="Catégories",
-        legend=dict(font=dict(color=text_color)),
-        margin=dict(l=50, r=50, t=50, b=100),  # Ensure enough space for rotated labels
-        hoverlabel=dict(
-            bgcolor="white",
-            font_size=14 if not st.session_state.accessibility.get('large_text', False) else 16,
-            font_family="Arial, sans-serif",
-            font_color="black",
-            bordercolor="black"
-        )
-    )
-    fig1.update_xaxes(
-        tickangle=45,
-        tickfont=dict(color=text_color, size=14 if not st.session_state.accessibility.get('large_text', False) else 16)
-    )
-    fig1.update_yaxes(
-        tickfont=dict(color=text_color, size=14 if not st.session_state.accessibility.get('large_text', False) else 16)
-    )
-    st.plotly_chart(fig1, use_container_width=True, aria_label="Graphique du nombre de produits par catégorie principale")
+    st.plotly_chart(pio.from_json(product_charts['categories']), use_container_width=True, aria_label="Graphique du nombre de produits par catégorie principale")
 
     # Alternative textuelle pour les utilisateurs de lecteurs d'écran
     st.write("**Données textuelles du graphique :**")
@@ -179,39 +367,12 @@ if subcat_count.empty:
     st.warning("⚠️ Aucune sous-catégorie trouvée dans le DataFrame.")
 else:
     st.dataframe(subcat_count)
-
-    # Graphique en camembert avec couleurs accessibles
-    fig2 = px.pie(subcat_count, values=subcat_count.values, names=subcat_count.index, 
-                  title="Top 20 Branches de Catégories",
-                  color_discrete_sequence=PLOTLY_COLORS)
-    fig2.update_traces(
-        textposition='inside',
-        textinfo='percent+label',
-        hovertemplate='<b>%{label}</b><br>Valeur: %{value}<br>Pourcentage: %{percent}',
-        textfont=dict(color=text_color, size=14 if not st.session_state.accessibility.get('large_text', False) else 16)
-    )
-    fig2.update_layout(
-        uniformtext_minsize=12 if not st.session_state.accessibility.get('large_text', False) else 16,
-        uniformtext_mode='hide',
-        legend=dict(orientation="v", yanchor="top", y=1, xanchor="left", x=1.02, font=dict(color=text_color, size=10)),
-        plot_bgcolor=bg_color,
-        paper_bgcolor=bg_color,
-        font=dict(color=text_color),
-        margin=dict(r=200),  # Ajouter une marge à droite pour la légende
-        hoverlabel=dict(
-            bgcolor="white",
-            font_size=14 if not st.session_state.accessibility.get('large_text', False) else 16,
-            font_family="Arial, sans-serif",
-            font_color="black",
-            bordercolor="black"
-        )
-    )
-    st.plotly_chart(fig2, use_container_width=True, aria_label="Graphique en camembert des top 20 branches de catégories")
+    st.plotly_chart(pio.from_json(product_charts['sub_categories']), use_container_width=True, aria_label="Graphique en camembert des top 20 branches de catégories")
 
 # Données textuelles non structurées
 st.subheader("Données Textuelles Non Structurées")
 try:
-    keyword_freq_df = pd.read_csv(KEYWORD_FREQ_PATH)
+    keyword_freq_df = load_keyword_frequencies(data_version(KEYWORD_FREQ_PATH))
     if keyword_freq_df.empty or 'Mot Clé' not in keyword_freq_df.columns or 'Fréquence' not in keyword_freq_df.columns:
         st.error(f"❌ Le fichier {KEYWORD_FREQ_PATH} est vide ou ne contient pas les colonnes attendues ('Mot Clé', 'Fréquence').")
     else:
@@ -223,7 +384,7 @@ try:
         csv = keyword_freq_df.to_csv(index=False).encode('utf-8')
         
         # Empêcher le bouton de téléchargement de changer en mode contraste élevé
-        if st.session_state.accessibility.get('high_contrast', False):
+        if high_contrast:
             st.markdown("""
             <style>
             /* Garder les styles par défaut du bouton de téléchargement */
@@ -265,94 +426,13 @@ try:
                 key="download_keywords_csv"
             )
         
-        # Graphique barre accessible
-        fig3 = px.bar(keyword_freq_df.head(50), x='Mot Clé', y='Fréquence', 
-                      title="Fréquence des Mots-Clés (Top 50)",
-                      color='Fréquence',
-                      color_continuous_scale='viridis' if st.session_state.accessibility.get('color_blind', False) 
-                      else 'plasma' if st.session_state.accessibility.get('high_contrast', False) 
-                      else 'Blues')
-        fig3.update_layout(
-            xaxis_title="Mots-clés",
-            yaxis_title="Fréquence",
-            xaxis_tickangle=45,
-            plot_bgcolor=bg_color,
-            paper_bgcolor=bg_color,
-            font=dict(size=14 if not st.session_state.accessibility.get('large_text', False) else 18, color=text_color),
-            showlegend=False,
-            hoverlabel=dict(
-                bgcolor="white" if st.session_state.accessibility.get('high_contrast', False) else "rgba(255,255,255,0.8)",
-                font_size=14 if not st.session_state.accessibility.get('large_text', False) else 16,
-                font_family="Arial, sans-serif",
-                font_color="black" if st.session_state.accessibility.get('high_contrast', False) else "black"
-            )
-        )
-        fig3.update_xaxes(
-            tickfont=dict(color=text_color, size=14 if not st.session_state.accessibility.get('large_text', False) else 16)
-        )
-        fig3.update_yaxes(
-            tickfont=dict(color=text_color, size=14 if not st.session_state.accessibility.get('large_text', False) else 16)
-        )
-        st.plotly_chart(fig3, use_container_width=True, aria_label="Graphique en barres des fréquences des mots-clés (Top 50)")
+        keyword_charts = render_keyword_charts(data_version(KEYWORD_FREQ_PATH), mode, keyword_freq_df)
+        st.plotly_chart(pio.from_json(keyword_charts['bar']), use_container_width=True, aria_label="Graphique en barres des fréquences des mots-clés (Top 50)")
+        st.plotly_chart(pio.from_json(keyword_charts['pie']), use_container_width=True, aria_label="Graphique en camembert des top 20 mots-clés par fréquence")
 
-        # Graphique camembert accessible
-        fig4 = px.pie(keyword_freq_df.head(20), values='Fréquence', names='Mot Clé', 
-                      title="Top 20 Mots-Clés par Fréquence",
-                      color_discrete_sequence=PLOTLY_COLORS)
-        fig4.update_traces(
-            textposition='inside',
-            textinfo='percent+label',
-            hovertemplate='<b>%{label}</b><br>Fréquence: %{value}<br>Pourcentage: %{percent}',
-            textfont=dict(color=text_color, size=14 if not st.session_state.accessibility.get('large_text', False) else 16)
-        )
-        fig4.update_layout(
-            plot_bgcolor=bg_color,
-            paper_bgcolor=bg_color,
-            font=dict(color=text_color),
-            legend=dict(font=dict(color=text_color)),
-            hoverlabel=dict(
-                bgcolor="white" if st.session_state.accessibility.get('high_contrast', False) else "rgba(255,255,255,0.8)",
-                font_size=14 if not st.session_state.accessibility.get('large_text', False) else 16,
-                font_family="Arial, sans-serif",
-                font_color="black" if st.session_state.accessibility.get('high_contrast', False) else "black"
-            )
-        )
-        st.plotly_chart(fig4, use_container_width=True, aria_label="Graphique en camembert des top 20 mots-clés par fréquence")
-
-        # Nuage de mots avec contraste amélioré
-        top_keywords = dict(keyword_freq_df.head(50)[['Mot Clé', 'Fréquence']].values)
-        if top_keywords:
-            # Choisir la palette en fonction du mode d'accessibilité
-            if st.session_state.accessibility.get('color_blind', False):
-                colormap = 'viridis'
-            elif st.session_state.accessibility.get('high_contrast', False):
-                colormap = 'hot'
-            else:
-                colormap = 'plasma'
-            
-            wordcloud = WordCloud(
-                width=800, 
-                height=400, 
-                background_color='black' if st.session_state.accessibility.get('high_contrast', False) else 'white',
-                colormap=colormap,
-                contour_color='white' if st.session_state.accessibility.get('high_contrast', False) else 'black',
-                contour_width=1
-            ).generate_from_frequencies(top_keywords)
-            
-            plt.figure(figsize=(10, 5))
-            plt.imshow(wordcloud, interpolation='bilinear')
-            plt.axis('off')
-            plt.title("Nuage de Mots des Mots-Clés les Plus Fréquents", 
-                     fontsize=16 if not st.session_state.accessibility.get('large_text', False) else 20, 
-                     pad=20,
-                     color='white' if st.session_state.accessibility.get('high_contrast', False) else 'black')
-            
-            # Appliquer le fond sombre en mode contraste élevé
-            if st.session_state.accessibility.get('high_contrast', False):
-                plt.gca().set_facecolor('black')
-                plt.gcf().set_facecolor('black')
-            
-            st.pyplot(plt)
+        # Nuage de mots (image PNG en cache)
+        if keyword_charts['wordcloud']:
+            st.image(keyword_charts['wordcloud'], caption="Nuage de mots des mots-clés les plus fréquents")
         else:
             st.warning("⚠️ Aucun mot-clé disponible pour générer le nuage de mots.")
     
@@ -378,8 +458,7 @@ for category in df['main_category'].unique()[:3]:
             full_path = f"Images/{path}"
             if os.path.exists(full_path):
                 try:
-                    img = Image.open(full_path)
-                    st.image(img, caption=f"Exemple pour {category}", width=200)
+                    st.image(get_thumbnail(full_path, DISPLAY), caption=f"Exemple pour {category}", width=200)
                     # Texte alternatif pour les images
                     st.caption(f"Image d'exemple pour la catégorie {category}")
                 except Exception as e:
@@ -399,37 +478,8 @@ else:
     st.dataframe(valid_image_df.describe())
 
 # Scatter plot accessible
-if not valid_image_df.empty and 'aspect_ratio' in valid_image_df.columns and 'image_pixels' in valid_image_df.columns:
-    fig5 = px.scatter(valid_image_df, x='aspect_ratio', y='image_pixels', 
-                      color=df.loc[valid_image_df.index, 'main_category'],
-                      title="Ratio Hauteur/Largeur vs Nombre de Pixels (Images Valides)",
-                      color_discrete_sequence=PLOTLY_COLORS,
-                      labels={'aspect_ratio': 'Ratio Hauteur/Largeur', 'image_pixels': 'Nombre de Pixels'})
-    fig5.update_layout(
-        plot_bgcolor=bg_color,
-        paper_bgcolor=bg_color,
-        font=dict(size=12 if not st.session_state.accessibility.get('large_text', False) else 16, color=text_color),
-        legend_title="Catégories principales",
-        legend=dict(font=dict(color=text_color)),
-        hoverlabel=dict(
-            bgcolor="white",
-            font_size=14 if not st.session_state.accessibility.get('large_text', False) else 16,
-            font_family="Arial, sans-serif",
-            font_color="black",
-            bordercolor="black"
-        )
-    )
-    fig5.update_traces(
-        marker=dict(size=8, opacity=0.7),
-        selector=dict(mode='markers')
-    )
-    fig5.update_xaxes(
-        tickfont=dict(color=text_color, size=12 if not st.session_state.accessibility.get('large_text', False) else 16)
-    )
-    fig5.update_yaxes(
-        tickfont=dict(color=text_color, size=12 if not st.session_state.accessibility.get('large_text', False) else 16)
-    )
-    st.plotly_chart(fig5, use_container_width=True, aria_label="Nuage de points du ratio hauteur/largeur vs nombre de pixels")
+if product_charts['images'] is not None:
+    st.plotly_chart(pio.from_json(product_charts['images']), use_container_width=True, aria_label="Nuage de points du ratio hauteur/largeur vs nombre de pixels")
 else:
     st.warning("⚠️ Données insuffisantes pour afficher le nuage de points (aucune image valide avec aspect_ratio ou image_pixels).")
 
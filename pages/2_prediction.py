@@ -26,6 +26,8 @@ import sys
 import os
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 from accessibility import init_accessibility_state, render_accessibility_sidebar, apply_accessibility_styles
+from product_data import get_product_store
+from thumbnails import get_thumbnail, open_thumbnail, DISPLAY
 
 # Initialiser l'état d'accessibilité
 init_accessibility_state()
@@ -49,36 +51,37 @@ apply_accessibility_styles()
 nlp = None
 st.info("🔄 spaCy processing will be handled by Azure ML API")
 
+# Index des produits du catalogue (partagé entre les pages via st.cache_resource)
+product_store = get_product_store()
+
+def make_test_product(product):
+    """Construit les données de test à partir d'un produit du catalogue"""
+    image_filename = product['image']
+    image_path = f"Images/{image_filename}"
+    
+    # Vérifier si l'image existe
+    if not os.path.exists(image_path):
+        st.warning(f"⚠️ Image non trouvée: {image_path}")
+        return None
+    
+    return {
+        'name': product['product_name'],
+        'description': product['product_name'],  # Utiliser le nom comme description
+        'specifications': f"Prix: {product['retail_price']} INR, Catégorie: {product['product_category_tree']}",
+        'image_path': image_path,
+        'image_filename': image_filename
+    }
+
 # Fonction pour charger le produit de test par défaut
 def load_default_test_product():
     """Charge le produit de test par défaut (montre Escort)"""
     try:
-        # Charger les données
-        df = pd.read_csv('produits_original.csv')
-        
-        # Trouver le produit de test
+        # Trouver le produit de test (accès direct par uniq_id)
         test_product_id = "1120bc768623572513df956172ffefeb"
-        test_product = df[df['uniq_id'] == test_product_id]
+        product = product_store.get(test_product_id)
         
-        if not test_product.empty:
-            product = test_product.iloc[0]
-            
-            # Construire le chemin de l'image
-            image_filename = f"{test_product_id}.jpg"
-            image_path = f"Images/{image_filename}"
-            
-            # Vérifier si l'image existe
-            if os.path.exists(image_path):
-                return {
-                    'name': product['product_name'],
-                    'description': product['product_name'],  # Utiliser le nom comme description
-                    'specifications': f"Prix: {product['retail_price']} INR, Catégorie: {product['product_category_tree']}",
-                    'image_path': image_path,
-                    'image_filename': image_filename
-                }
-            else:
-                st.warning(f"⚠️ Image non trouvée: {image_path}")
-                return None
+        if product is not None:
+            return make_test_product(product)
         else:
             st.warning("⚠️ Produit de test non trouvé dans les données")
             return None
@@ -87,6 +90,15 @@ def load_default_test_product():
         st.error(f"❌ Erreur lors du chargement du produit de test: {str(e)}")
         return None
 
+def launch_test_prediction(test_product):
+    """Enregistre le produit de test dans la session et relance la page"""
+    st.session_state['test_prediction_launched'] = True
+    st.session_state['test_product_name'] = test_product['name']
+    st.session_state['test_description'] = test_product['description']
+    st.session_state['test_specifications'] = test_product['specifications']
+    st.session_state['test_image_path'] = test_product['image_path']
+    st.rerun()
+
 # Charger le produit de test par défaut
 default_product = load_default_test_product()
 
@@ -345,7 +357,7 @@ if default_product:
     
     with col2:
         if os.path.exists(default_product['image_path']):
-            st.image(default_product['image_path'], caption="Image du produit de test", width=200)
+            st.image(get_thumbnail(default_product['image_path'], DISPLAY), caption="Image du produit de test", width=200)
         else:
             st.warning("Image non trouvée")
     
@@ -366,6 +378,23 @@ if default_product:
         
         st.rerun()
 
+# Sélection d'un produit quelconque du catalogue
+st.subheader("Ou choisir un produit du catalogue")
+catalog_search = st.text_input("Rechercher un produit par nom", placeholder="Exemple : Escort",
+                               help="Début du nom du produit", key="catalog_search_input")
+if catalog_search:
+    matches = product_store.search_by_name(catalog_search, limit=20)
+    if matches:
+        product_names = {product['uniq_id']: product['product_name'] for product in matches}
+        selected_id = st.selectbox("Produit du catalogue", list(product_names), format_func=product_names.get,
+                                   key="catalog_product_select")
+        if st.button("🚀 Lancer la prédiction sur ce produit", key="catalog_prediction_btn"):
+            catalog_product = make_test_product(product_store.get(selected_id))
+            if catalog_product:
+                launch_test_prediction(catalog_product)
+    else:
+        st.caption("Aucun produit ne correspond à cette recherche.")
+
 st.divider()
 
 # Formulaire manuel
@@ -404,7 +433,7 @@ if st.session_state.get('test_prediction_launched', False):
     st.write(f"**Produit analysé:** {product_name}")
     
     if os.path.exists(uploaded_image):
-        st.image(uploaded_image, caption="Image du produit de test", width=200)
+        st.image(get_thumbnail(uploaded_image, DISPLAY), caption="Image du produit de test", width=200)
     else:
         st.error(f"❌ Image non trouvée: {uploaded_image}")
         st.stop()
@@ -440,8 +469,8 @@ if prediction_launched:
     with st.spinner("🔄 Prédiction en cours via Azure ML..."):
         # Gérer à la fois les fichiers uploadés et les chemins d'images
         if isinstance(uploaded_image, str):
-            # C'est un chemin d'image (produit de test)
-            image = Image.open(uploaded_image)
+            # C'est un chemin d'image (produit de test) : miniature 224 px du modèle
+            image = open_thumbnail(uploaded_image)
         else:
             # C'est un fichier uploadé
             image = Image.open(uploaded_image)
@@ -456,6 +485,8 @@ if prediction_launched:
         st.write(f"**Catégorie prédite :** {result['predicted_category']}")
         st.write(f"**Confiance :** {result['confidence']:.3f}")
         st.write(f"**Source :** {result['source']}")
+        if result.get('method') == 'knn':
+            st.write("**Méthode :** vote des produits les plus proches du catalogue (kNN)")
         
         # Afficher les scores de toutes les catégories
         st.subheader("Scores de Toutes les Catégories")
@@ -463,6 +494,24 @@ if prediction_launched:
         for category, score in result['category_scores'].items():
             category_data.append({"Catégorie": category, "Score": f"{score:.4f}"})
         st.table(category_data)
+
+        # Produits les plus proches dans le catalogue (index d'embeddings, mode inprocess)
+        if azure_client.use_inprocess:
+            similar_result = azure_client.find_similar(image, text_description, k=5)
+            if similar_result['success']:
+                st.subheader("Produits Similaires du Catalogue")
+                columns = st.columns(max(1, len(similar_result['similar'])))
+                for column, item in zip(columns, similar_result['similar']):
+                    product = product_store.get(item['uniq_id'])
+                    if product is None:
+                        continue
+                    with column:
+                        image_path = os.path.join('Images', product['image'])
+                        if os.path.exists(image_path):
+                            st.image(get_thumbnail(image_path, DISPLAY), width=120)
+                        st.caption(f"{product['product_name'][:60]} ({product['main_category']}, similarité {item['score']:.2f})")
+            else:
+                st.info(f"💡 {similar_result['error']}")
         
         # Graphique des scores
         st.subheader("Visualisation des Scores")
@@ -558,8 +607,8 @@ if prediction_launched:
             
             # Charger l'image
             if isinstance(uploaded_image, str):
-                # C'est un chemin d'image (produit de test)
-                image = Image.open(uploaded_image)
+                # C'est un chemin d'image (produit de test) : miniature 224 px du modèle
+                image = open_thumbnail(uploaded_image)
             else:
                 # C'est un fichier uploadé
                 image = Image.open(uploaded_image)
@@ -668,4 +717,37 @@ if prediction_launched:
         st.error(f"❌ Erreur lors de la prédiction: {result['error']}")
         st.info("💡 Vérifiez la configuration de l'API Azure ML ou utilisez le mode local.")
 
+def format_ms(value):
+    """Durée en ms, 'n/a' sans mesure (AZURE_ML_STATS_WINDOW=0 ou aucun échantillon)"""
+    return f"{value:.1f} ms" if value is not None else "n/a"
+
+
+# Diagnostics du service de prédiction (derniers appels, toutes sessions confondues)
+with st.expander("🩺 Diagnostics du service de prédiction"):
+    stats = azure_client.stats()
+    if not stats['total_calls']:
+        st.write("Aucun appel de prédiction pour le moment.")
+    else:
+        col1, col2, col3, col4 = st.columns(4)
+        col1.metric("Appels", stats['total_calls'])
+        col2.metric("Taux d'erreur", f"{stats['error_rate']:.0%}" if stats['window'] else "n/a")
+        col3.metric("Latence p50", format_ms(stats['p50_ms']))
+        col4.metric("Latence p95", format_ms(stats['p95_ms']))
+        st.caption(f"Sur les {stats['window']} derniers appels ({stats['total_errors']} erreur(s) au total)")
+        
+        if stats['mean_payload_bytes'] is not None:
+            st.write(f"**Taille moyenne des requêtes :** {stats['mean_payload_bytes'] / 1024:.0f} Ko")
+        if stats['http_statuses']:
+            st.write("**Statuts HTTP :** " + ", ".join(f"{status} × {count}" for status, count in sorted(stats['http_statuses'].items())))
+        if stats['retries']:
+            st.write(f"**Nouveaux essais :** {stats['retries']}")
+        if stats['error_types']:
+            st.write("**Erreurs :** " + ", ".join(f"{error_type} × {count}" for error_type, count in stats['error_types'].items()))
+        
+        last_call = stats['last_call']
+        if last_call is not None:
+            status = f"HTTP {last_call['status']}" if last_call['status'] is not None else last_call['source']
+            outcome = "✅ succès" if last_call['success'] else f"❌ {last_call['error_type']}"
+            st.write(f"**Dernier appel :** {outcome}, {format_ms(last_call['wall_ms'])} ({status})")
+
 st.markdown("</div>", unsafe_allow_html=True)
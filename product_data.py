@@ -0,0 +1,165 @@
+#!/usr/bin/env python3
+"""
+Jeu de données produits précalculé (format colonnes Parquet)
+
+Le CSV original est parsé une seule fois : catégories extraites de
+product_category_tree, métadonnées des images, types fixés. Le résultat est
+écrit dans produits.parquet, indexé par uniq_id, et relu par toutes les pages
+via get_products().
+
+Usage :
+    python product_data.py    # (re)construire produits.parquet
+"""
+
+import os
+import sys
+import bisect
+import logging
+import pandas as pd
+import streamlit as st
+from image_index import latest_image_mtime, lookup_images
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), 'azure_ml_api'))
+from category_tree import parse_category_tree_column
+
+logger = logging.getLogger(__name__)
+
+CSV_PATH = 'produits_original.csv'
+IMAGE_FOLDER = 'Images'
+DATASET_PATH = 'produits.parquet'
+
+
+def build_product_frame(csv_path=CSV_PATH, image_folder=IMAGE_FOLDER):
+    """Construire le DataFrame produits enrichi depuis le CSV"""
+    df = pd.read_csv(csv_path)
+
+    # Catégories : tous les niveaux de l'arbre en une passe vectorisée
+    categories = parse_category_tree_column(df['product_category_tree'])
+    df = pd.concat([df, categories], axis=1)
+    df = df[df['main_category'].notna()].copy()
+    for column in categories.columns:
+        df[column] = df[column].cat.remove_unused_categories()
+
+    # Métadonnées des images (en-têtes uniquement, via l'index des images)
+    image_meta = lookup_images(df['image'], image_folder)
+    df['image_path'] = [os.path.join(image_folder, name) if isinstance(name, str) else None for name in df['image']]
+    # Les images illisibles sont indexées avec une taille 0 : considérées comme absentes
+    df['image_exists'] = [meta is not None and meta['width'] > 0 for meta in image_meta]
+    df['image_width'] = [meta['width'] if meta else 0 for meta in image_meta]
+    df['image_height'] = [meta['height'] if meta else 0 for meta in image_meta]
+    df['image_pixels'] = df['image_width'] * df['image_height']
+    df['aspect_ratio'] = (df['image_height'] / df['image_width']).where(df['image_width'] > 0, 0.0)
+
+    # Types explicites pour un stockage en colonnes compact
+    df = df.astype({
+        'image_exists': 'bool',
+        'image_width': 'int32',
+        'image_height': 'int32',
+        'image_pixels': 'int64',
+        'aspect_ratio': 'float64'
+    })
+
+    return df.set_index('uniq_id')
+
+
+def build_product_dataset(csv_path=CSV_PATH, image_folder=IMAGE_FOLDER, output_path=DATASET_PATH):
+    """Écrire le jeu de données produits au format Parquet"""
+    df = build_product_frame(csv_path, image_folder)
+    df.to_parquet(output_path)
+    logger.info(f"✅ {len(df)} produits écrits dans {output_path}")
+    return df
+
+
+def is_dataset_stale(dataset_path=DATASET_PATH, csv_path=CSV_PATH, image_folder=IMAGE_FOLDER):
+    """Le fichier Parquet est-il absent ou plus ancien que ses sources ?"""
+    if not os.path.exists(dataset_path):
+        return True
+    dataset_mtime = os.path.getmtime(dataset_path)
+    if os.path.exists(csv_path) and os.path.getmtime(csv_path) > dataset_mtime:
+        return True
+    # Date des fichiers images : réécrire une image ne modifie pas la date du dossier
+    return latest_image_mtime(image_folder) > dataset_mtime
+
+
+def load_products(dataset_path=DATASET_PATH, csv_path=CSV_PATH, image_folder=IMAGE_FOLDER):
+    """Charger les produits depuis le Parquet, reconstruit si nécessaire"""
+    if not is_dataset_stale(dataset_path, csv_path, image_folder):
+        try:
+            return pd.read_parquet(dataset_path)
+        except Exception as e:
+            logger.warning(f"⚠️ Lecture de {dataset_path} impossible, reconstruction: {str(e)}")
+
+    try:
+        return build_product_dataset(csv_path, image_folder, dataset_path)
+    except ImportError:
+        # Pas de moteur Parquet (pyarrow) : on se contente du DataFrame en mémoire
+        logger.warning("⚠️ pyarrow non installé, jeu de données construit depuis le CSV sans cache")
+        return build_product_frame(csv_path, image_folder)
+
+
+class ProductStore:
+    """Recherche de produits en mémoire : accès direct par uniq_id/pid, préfixe de nom"""
+
+    def __init__(self, df):
+        self.records = df.reset_index().to_dict('records')
+        self.by_uniq_id = {record['uniq_id']: i for i, record in enumerate(self.records)}
+        self.by_pid = {record['pid']: i for i, record in enumerate(self.records) if isinstance(record.get('pid'), str)}
+        # Noms en minuscules triés pour la recherche par préfixe (bisect)
+        names = sorted(
+            (record['product_name'].lower(), i)
+            for i, record in enumerate(self.records)
+            if isinstance(record.get('product_name'), str)
+        )
+        self.name_keys = [name for name, _ in names]
+        self.name_positions = [i for _, i in names]
+
+    def __len__(self):
+        return len(self.records)
+
+    def get(self, uniq_id):
+        """Produit par uniq_id (None si inconnu)"""
+        position = self.by_uniq_id.get(uniq_id)
+        return self.records[position] if position is not None else None
+
+    def get_by_pid(self, pid):
+        """Produit par pid (None si inconnu)"""
+        position = self.by_pid.get(pid)
+        return self.records[position] if position is not None else None
+
+    def search_by_name(self, prefix, limit=20):
+        """Produits dont le nom commence par le préfixe (insensible à la casse)"""
+        prefix = prefix.strip().lower()
+        if not prefix:
+            return []
+        start = bisect.bisect_left(self.name_keys, prefix)
+        results = []
+        for j in range(start, len(self.name_keys)):
+            if not self.name_keys[j].startswith(prefix) or len(results) >= limit:
+                break
+            results.append(self.records[self.name_positions[j]])
+        return results
+
+
+@st.cache_data
+def get_products():
+    """Accès partagé aux produits pour toutes les pages Streamlit"""
+    return load_products()
+
+
+@st.cache_resource
+def get_product_store():
+    """Index produits partagé par toutes les pages et sessions"""
+    return ProductStore(load_products())
+
+
+def main():
+    """Construire le jeu de données en ligne de commande"""
+    logging.basicConfig(level=logging.INFO)
+    df = build_product_dataset()
+    print(f"✅ {len(df)} produits écrits dans {DATASET_PATH}")
+    print(df['main_category'].value_counts().to_string())
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
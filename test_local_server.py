@@ -0,0 +1,156 @@
+#!/usr/bin/env python3
+"""
+Test du serveur de scoring local multi-workers : mémoire totale et débit
+selon le nombre de workers
+"""
+
+import os
+import sys
+import json
+import time
+import base64
+import subprocess
+from concurrent.futures import ThreadPoolExecutor
+from PIL import Image
+import io
+import requests
+
+BASE_PORT = 5101
+WORKER_COUNTS = [1, 2, 4]
+REQUESTS_PER_RUN = 40
+STARTUP_TIMEOUT = 300
+
+def create_test_payload():
+    """Créer une requête de test (image + description)"""
+    img = Image.new('RGB', (224, 224), color='lightblue')
+    buffer = io.BytesIO()
+    img.save(buffer, format='JPEG')
+    return json.dumps({
+        "image": base64.b64encode(buffer.getvalue()).decode('utf-8'),
+        "text": "Une montre élégante pour homme en cuir noir avec bracelet en métal"
+    })
+
+def process_tree(pid):
+    """Lister le processus parent et ses workers"""
+    pids = [pid]
+    try:
+        with open(f"/proc/{pid}/task/{pid}/children") as f:
+            pids.extend(int(child) for child in f.read().split())
+    except OSError:
+        pass
+    return pids
+
+def memory_kb(pid, field):
+    """Lire une valeur mémoire (Rss ou Pss) d'un processus en kB"""
+    try:
+        with open(f"/proc/{pid}/smaps_rollup") as f:
+            for line in f:
+                if line.startswith(field + ':'):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    return 0
+
+def wait_until_ready(url, process):
+    """Attendre que le serveur réponde sur /health"""
+    deadline = time.time() + STARTUP_TIMEOUT
+    while time.time() < deadline:
+        if process.poll() is not None:
+            return False
+        try:
+            if requests.get(url, timeout=2).status_code == 200:
+                return True
+        except requests.exceptions.RequestException:
+            pass
+        time.sleep(1)
+    return False
+
+def measure(workers, port, payload):
+    """Démarrer le serveur avec N workers, mesurer mémoire et débit"""
+    print(f"\n🧪 Serveur avec {workers} worker(s)...")
+    process = subprocess.Popen(
+        [sys.executable, os.path.join('azure_ml_api', 'local_server.py'),
+         '--port', str(port), '--workers', str(workers)],
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL
+    )
+    try:
+        if not wait_until_ready(f"http://localhost:{port}/health", process):
+            print("❌ Le serveur n'a pas démarré")
+            return None
+
+        score_url = f"http://localhost:{port}/score"
+
+        def call(_):
+            response = requests.post(score_url, data=payload,
+                                     headers={'Content-Type': 'application/json'}, timeout=120)
+            return response.status_code == 200 and response.json().get('status') == 'success'
+
+        # Requête de chauffe
+        call(0)
+
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=workers * 2) as executor:
+            successes = sum(executor.map(call, range(REQUESTS_PER_RUN)))
+        elapsed = time.perf_counter() - start
+
+        pids = process_tree(process.pid)
+        result = {
+            'workers': workers,
+            'processes': len(pids),
+            'rss_mb': sum(memory_kb(pid, 'Rss') for pid in pids) / 1024,
+            'pss_mb': sum(memory_kb(pid, 'Pss') for pid in pids) / 1024,
+            'throughput': REQUESTS_PER_RUN / elapsed,
+            'success_rate': successes / REQUESTS_PER_RUN
+        }
+        print(f"✅ {result['throughput']:.2f} req/s, RSS {result['rss_mb']:.0f} Mo, "
+              f"PSS {result['pss_mb']:.0f} Mo ({result['processes']} processus)")
+        return result
+    finally:
+        process.terminate()
+        try:
+            process.wait(timeout=30)
+        except subprocess.TimeoutExpired:
+            process.kill()
+
+def main():
+    """Fonction principale"""
+    print("🚀 Test du serveur de scoring multi-workers")
+    print("=" * 60)
+
+    payload = create_test_payload()
+    results = []
+    for i, workers in enumerate(WORKER_COUNTS):
+        result = measure(workers, BASE_PORT + i, payload)
+        if result:
+            results.append(result)
+
+    print("\n" + "=" * 60)
+    print("📊 Résultats")
+    print("=" * 60)
+    print(f"{'Workers':>8} {'Req/s':>8} {'RSS (Mo)':>10} {'PSS (Mo)':>10} {'Succès':>8}")
+    for result in results:
+        print(f"{result['workers']:>8} {result['throughput']:>8.2f} {result['rss_mb']:>10.0f} "
+              f"{result['pss_mb']:>10.0f} {result['success_rate']:>8.0%}")
+
+    all_passed = len(results) == len(WORKER_COUNTS) and all(r['success_rate'] == 1.0 for r in results)
+    if all_passed and len(results) > 1:
+        # La mémoire proportionnelle (PSS) doit croître bien moins vite que le nombre de workers
+        base = results[0]
+        for result in results[1:]:
+            growth = result['pss_mb'] / base['pss_mb'] if base['pss_mb'] else 0
+            if growth >= result['workers'] / base['workers']:
+                print(f"⚠️ PSS x{growth:.1f} pour {result['workers']} workers : les poids ne semblent pas partagés")
+                all_passed = False
+
+    print("\n" + "=" * 60)
+    if all_passed:
+        print("🎉 Tous les tests sont passés!")
+    else:
+        print("⚠️ Certains tests ont échoué")
+
+    return all_passed
+
+if __name__ == "__main__":
+    success = main()
+    sys.exit(0 if success else 1)
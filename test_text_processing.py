@@ -0,0 +1,85 @@
+#!/usr/bin/env python3
+"""
+Test du nettoyage de texte par étapes (trie de mots) contre la référence
+
+clean_text regroupe les règles littérales en tries de mots ; le résultat doit
+rester identique à l'application règle par règle des expressions régulières
+(clean_text_regex) sur tout le catalogue : nom, description et
+spécifications de chaque produit.
+"""
+
+import os
+import sys
+import time
+from functools import lru_cache
+import pandas as pd
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), 'azure_ml_api'))
+from text_processing import CLEAN_TEXT_RULES, CLEAN_TEXT_STAGES, clean_text, clean_text_regex
+
+CSV_PATH = 'produits_original.csv'
+TEXT_COLUMNS = ['product_name', 'description', 'product_specifications']
+
+
+@lru_cache(maxsize=1)
+def load_texts():
+    """Textes du catalogue à nettoyer (lus une seule fois pour tous les tests)"""
+    df = pd.read_csv(CSV_PATH)
+    return [text for column in TEXT_COLUMNS for text in df[column].dropna() if isinstance(text, str)]
+
+
+def test_same_output():
+    """Même résultat que les expressions régulières appliquées une à une"""
+    texts = load_texts()
+    print("🧪 Comparaison avec clean_text_regex...")
+    differences = [text for text in texts if clean_text(text) != clean_text_regex(text)]
+    if differences:
+        print(f"❌ {len(differences)} textes différents sur {len(texts)}")
+        for text in differences[:3]:
+            print(f"   - {text[:80]!r}")
+            print(f"     trie  : {clean_text(text)[:80]!r}")
+            print(f"     regex : {clean_text_regex(text)[:80]!r}")
+        return False
+    print(f"✅ {len(texts)} textes identiques")
+    return True
+
+
+def test_speed():
+    """Durée du nettoyage du catalogue avec les deux implémentations"""
+    texts = load_texts()
+    print("\n🧪 Durée du nettoyage du catalogue...")
+    durations = {}
+    for name, function in (('regex', clean_text_regex), ('trie', clean_text)):
+        start = time.perf_counter()
+        for text in texts:
+            function(text)
+        durations[name] = time.perf_counter() - start
+        print(f"   - {name:<5} : {durations[name]:.2f} s ({durations[name] / len(texts) * 1000:.2f} ms/texte)")
+    print(f"✅ {len(CLEAN_TEXT_RULES)} règles en {len(CLEAN_TEXT_STAGES)} étapes, "
+          f"x{durations['regex'] / durations['trie']:.1f}")
+    return True
+
+
+def main():
+    """Fonction principale"""
+    print("🚀 Test du nettoyage de texte")
+    print("=" * 60)
+
+    if not os.path.exists(CSV_PATH):
+        print(f"❌ Fichier non trouvé: {CSV_PATH}")
+        return False
+
+    all_passed = test_same_output() and test_speed()
+
+    print("\n" + "=" * 60)
+    if all_passed:
+        print("🎉 Tous les tests sont passés!")
+    else:
+        print("⚠️ Certains tests ont échoué")
+
+    return all_passed
+
+
+if __name__ == "__main__":
+    success = main()
+    sys.exit(0 if success else 1)
@@ -0,0 +1,164 @@
+#!/usr/bin/env python3
+"""
+Cache de miniatures des images produits
+
+Les photos originales (plusieurs centaines de Ko, jusqu'à 2500 px) ne sont
+décodées et réduites qu'une fois. Deux variantes sont enregistrées dans
+Images.cache/thumbnails/, hors du dossier des images (voir image_index.cache_dir) :
+- 'display' : 200 px de large, la largeur d'affichage des pages Streamlit ;
+- 'model'   : 224 px sur le plus grand côté, le redimensionnement appliqué par
+  le script de scoring avant le processeur CLIP.
+
+Une miniature est régénérée dès que l'image source est plus récente. L'index
+(source mtime + dimensions) permet au calcul en lot de sauter les images à jour.
+
+Usage :
+    python thumbnails.py    # générer toutes les miniatures en parallèle
+"""
+
+import os
+import sys
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from PIL import Image
+from image_index import IMAGE_EXTENSIONS, MAX_WORKERS, cache_dir, load_sidecar, save_sidecar
+
+logger = logging.getLogger(__name__)
+
+THUMBNAIL_DIR = 'thumbnails'
+INDEX_FILENAME = 'index.json'
+THUMBNAIL_FORMAT = 'JPEG'
+THUMBNAIL_QUALITY = 90
+
+DISPLAY = 'display'
+MODEL = 'model'
+
+# Variante -> (taille, côté contraint)
+THUMBNAIL_VARIANTS = {
+    DISPLAY: (200, 'width'),
+    MODEL: (224, 'max'),
+}
+
+
+def target_size(width, height, variant):
+    """Dimensions de la miniature (jamais agrandie)"""
+    size, side = THUMBNAIL_VARIANTS[variant]
+    reference = width if side == 'width' else max(width, height)
+    if reference <= size:
+        return width, height
+    # Même arrondi que le script de scoring pour la variante 'model'
+    ratio = size / reference
+    return max(1, int(width * ratio)), max(1, int(height * ratio))
+
+
+def thumbnail_path(image_path, variant):
+    """Chemin de la miniature d'une image pour une variante"""
+    folder, name = os.path.split(image_path)
+    root, _ = os.path.splitext(name)
+    return os.path.join(cache_dir(folder or '.'), THUMBNAIL_DIR, variant, root + '.jpg')
+
+
+def is_fresh(image_path, variant):
+    """La miniature existe-t-elle et est-elle plus récente que la source ?"""
+    try:
+        return os.path.getmtime(thumbnail_path(image_path, variant)) >= os.path.getmtime(image_path)
+    except OSError:
+        return False
+
+
+def make_thumbnails(image_path, variants=tuple(THUMBNAIL_VARIANTS)):
+    """Décoder une image une seule fois et écrire ses miniatures, renvoie {variante: (largeur, hauteur)}"""
+    sizes = {}
+    with Image.open(image_path) as img:
+        if img.mode != 'RGB':
+            img = img.convert('RGB')
+        # Chaque variante est réduite depuis l'original (même résultat que le scoring)
+        for variant in variants:
+            size = target_size(*img.size, variant)
+            thumbnail = img if size == img.size else img.resize(size, Image.LANCZOS)
+            output_path = thumbnail_path(image_path, variant)
+            os.makedirs(os.path.dirname(output_path), exist_ok=True)
+            tmp_path = f"{output_path}.{os.getpid()}.tmp"
+            thumbnail.save(tmp_path, format=THUMBNAIL_FORMAT, quality=THUMBNAIL_QUALITY)
+            os.replace(tmp_path, output_path)
+            sizes[variant] = list(size)
+    return sizes
+
+
+def get_thumbnail(image_path, variant=DISPLAY):
+    """Chemin de la miniature (générée si absente ou périmée), l'original en cas d'échec"""
+    if is_fresh(image_path, variant):
+        return thumbnail_path(image_path, variant)
+    try:
+        make_thumbnails(image_path)
+        return thumbnail_path(image_path, variant)
+    except Exception as e:
+        logger.warning(f"⚠️ Miniature impossible pour {image_path}: {str(e)}")
+        return image_path
+
+
+def open_thumbnail(image_path, variant=MODEL):
+    """Ouvrir la miniature d'une image (PIL, pixels chargés)"""
+    with Image.open(get_thumbnail(image_path, variant)) as img:
+        img.load()
+        return img
+
+
+def build_thumbnails(image_folder='Images', max_workers=MAX_WORKERS):
+    """Générer en parallèle les miniatures manquantes ou périmées, renvoie l'index"""
+    if not os.path.isdir(image_folder):
+        return {}
+
+    index_path = os.path.join(cache_dir(image_folder), THUMBNAIL_DIR, INDEX_FILENAME)
+    cached = load_sidecar(index_path)
+
+    index = {}
+    to_build = []
+    with os.scandir(image_folder) as entries:
+        for entry in entries:
+            if not entry.name.lower().endswith(IMAGE_EXTENSIONS) or not entry.is_file():
+                continue
+            mtime = entry.stat().st_mtime
+            previous = cached.get(entry.name)
+            if (previous and previous.get('mtime') == mtime
+                    and all(is_fresh(entry.path, variant) for variant in THUMBNAIL_VARIANTS)):
+                index[entry.name] = previous
+            else:
+                to_build.append((entry.name, mtime))
+
+    def build(item):
+        name, mtime = item
+        try:
+            return name, {'mtime': mtime, 'sizes': make_thumbnails(os.path.join(image_folder, name))}
+        except Exception as e:
+            logger.warning(f"⚠️ Miniature impossible pour {name}: {str(e)}")
+            return name, None
+
+    if to_build:
+        # PIL libère le GIL pendant le décodage et le redimensionnement
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            for name, entry in executor.map(build, to_build):
+                if entry is not None:
+                    index[name] = entry
+        logger.info(f"🔄 {len(to_build)} image(s) réduite(s) dans {os.path.dirname(index_path)}")
+
+    if to_build or len(index) != len(cached):
+        save_sidecar(index_path, index)
+
+    return index
+
+
+def main():
+    """Générer les miniatures en ligne de commande"""
+    logging.basicConfig(level=logging.INFO)
+    image_folder = sys.argv[1] if len(sys.argv) > 1 else 'Images'
+    if not os.path.isdir(image_folder):
+        print(f"❌ Dossier non trouvé: {image_folder}")
+        return 1
+    index = build_thumbnails(image_folder)
+    print(f"✅ {len(index)} image(s) avec miniatures dans {os.path.join(cache_dir(image_folder), THUMBNAIL_DIR)}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())